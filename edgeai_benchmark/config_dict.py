@@ -113,7 +113,7 @@ class ConfigDict(dict):
     def _initialize(self):
         # include additional files and merge with this dict
         self.include_files = None
-        # execution pipeline type - currently only accuracy pipeline is defined
+        # execution pipeline type - 'accuracy' or 'latency'. a pipeline_config can also have its own pipeline_type
         self.pipeline_type = 'accuracy'
         # number of frames for inference
         self.num_frames = 10000 #50000
@@ -244,6 +244,79 @@ class ConfigDict(dict):
         self.run_dir_tree_depth = None
         # wehther to apply predifened presets based on target_device
         self.target_device_preset = True
+        # folder where the imported artifacts are cached, keyed by a hash of the model, runtime_options,
+        # calibration data and tools version. an import that matches a cached one is copied from here. None disables it.
+        self.artifacts_cache_path = None
+        # number of workers to read and preprocess the frames ahead of inference. 0 or None disables prefetch
+        self.prefetch_workers = 0
+        # type of the prefetch workers: 'thread' or 'process'
+        self.prefetch_mode = 'thread'
+        # max number of prefetched frames waiting for inference. None means 2*prefetch_workers
+        self.prefetch_queue_size = None
+        # folder where the preprocessed input and calibration tensors are cached, so that the pipelines with the same
+        # dataset and preprocess transforms do not decode and preprocess the frames again. None disables it.
+        self.preprocess_cache_path = None
+        # max number of pipelines with the same input_dataset, preprocess and num_frames that are run together,
+        # reading and preprocessing each frame once for all of them. None or 1 runs each pipeline separately.
+        self.multi_model_group_size = None
+        # number of frames given to the session in one call, for the runtimes and models that support a batch dimension.
+        # the other models (and flip_test) run with a batch size of 1.
+        self.infer_batch_size = 1
+        # number of worker processes that the frames of a pipeline are split across, each with its own session
+        # and its own set of cpus. the outputs are evaluated in the order of the frames. None or 1 disables it.
+        self.infer_shards = None
+        # number of cpus given to each of the parallel_processes - the processes get disjoint sets of cpus and their
+        # thread pools (onnxruntime, tflite, tvm, opencv, blas) are sized to match. 'auto' divides the cpus equally. None disables it.
+        self.parallel_cpus_per_process = None
+        # memory budget in MB for the parallel_processes - a task is started only if the projected resident memory
+        # of the running tasks and the new task fits in it, otherwise it waits. 'auto' uses 80% of the available memory. None disables it.
+        self.parallel_memory_budget = None
+        # wall clock limit in seconds for a task of the parallel_processes - a task that runs longer is killed
+        # (with the processes it has started) and is recorded as failed. None disables it.
+        self.parallel_task_timeout = None
+        # number of times a task of the parallel_processes that timed out or crashed (exit code, signal) is run again.
+        # a failure record (failure.yaml) is written into the run_dir of the task.
+        self.parallel_task_retries = 0
+        # store the raw outputs of the session (before postprocess) in the run_dir, so that the postprocess and the metric
+        # can be run again with run_rescore. True stores compressed chunks, 'uncompressed' stores memory mapped chunks.
+        self.capture_raw_outputs = False
+        # run the postprocess and the metric on the raw outputs stored by capture_raw_outputs, instead of import and inference.
+        # the runtime is not used - this is meant for changes in the postprocess or the metric.
+        self.run_rescore = False
+        # settings of the latency pipeline (pipeline_type 'latency') - these can also be given in a pipeline_config.
+        # the inputs are a few preprocessed frames of the input_dataset ('dataset') or random tensors ('synthetic').
+        self.latency_inputs = 'dataset'
+        # number of distinct input frames used in the latency pipeline - they are given to the session in turn
+        self.latency_input_frames = 1
+        # number of inferences run before the measurement starts - these are not measured at all
+        self.latency_warmup_iterations = 10
+        # number of measured inferences in each round, and the number of rounds
+        self.latency_iterations = 100
+        self.latency_repeats = 1
+        # stop the inference once the confidence interval of the metric is narrower than this half-width (in the units of the
+        # metric, for example 0.5 for accuracy_top1%). for classification and segmentation, with stream_metrics.
+        # the frames are run in a random order that is the same in every run. None disables it.
+        self.early_stop_halfwidth = None
+        # confidence level of the interval used for early stopping
+        self.early_stop_confidence = 0.95
+        # number of frames before early stopping is considered, and the interval (in frames) at which it is checked
+        self.early_stop_min_frames = 500
+        self.early_stop_check_interval = 100
+        # write a checkpoint of the inference progress (frames done, metric state, stats) into the run_dir every these many frames.
+        # an inference that did not complete (crash, out of memory, reboot) continues from the checkpoint when it is run again.
+        self.infer_checkpoint_interval = None
+        # number of initial frames that are not included in the latency percentiles, std and histogram
+        self.latency_warmup_frames = 0
+        # number of bins in the latency histogram written to result.yaml
+        self.latency_histogram_bins = 10
+        # write the per frame latency values into the run_dir: 'csv', 'npy' or None
+        self.latency_frames_format = None
+        # fold the outputs into the metric frame by frame, if the metric supports it (update/finalize)
+        # instead of holding all the outputs in memory till the end of inference
+        self.stream_metrics = True
+        # sqlite file in which the pipelines store their results, used by run_report.
+        # None means results.db in the folder above modelartifacts_path/target_device. False disables it.
+        self.results_db_file = None
 
     def _parse_include_files(self, include_files, include_base_path):
         input_dict = {}
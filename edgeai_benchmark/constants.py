@@ -45,6 +45,7 @@ NHWC = 'NHWC'
 PIPELINE_UNDEFINED = None
 PIPELINE_ACCURACY = 'accuracy'
 PIPELINE_COMPARE = 'compare'
+PIPELINE_LATENCY = 'latency'
 
 # frequency of the core C7x/MMA processor that accelerates Deep Learning Tasks
 # this constant is used to convert cycles to time : time = cycles / DSP_FREQ
@@ -26,6 +26,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import warnings
 
 from .image_cls import *
@@ -49,6 +50,8 @@ from .widerface_det import *
 from .robokit_seg import *
 from .kitti_2015 import *
 
+from .lazy_dataset import *
+
 try:
     from .kitti_lidar_det import KittiLidar3D
 except ImportError as e:
@@ -149,11 +152,61 @@ def _initialize_datasets(settings):
 
 
 def get_datasets(settings, download=False, dataset_list=None):
+    # the datasets are not constructed here - each entry is a LazyDataset that constructs the dataset
+    # on first use (and only once), so that the datasets of the models that are not selected are never loaded.
     dataset_cache = _initialize_datasets(settings)
-    dset_info_dict = get_dataset_info_dict(settings)
     dataset_list = dataset_list or get_dataset_categories(settings)
+    for dataset_category in dataset_cache.keys():
+        if check_dataset_load(settings, dataset_category) and (dataset_category in dataset_list):
+            dataset_pair = LazyDatasetPair(settings, dataset_category, download=download)
+            dataset_cache[dataset_category]['calibration_dataset'] = LazyDataset(dataset_pair, 'calibration_dataset')
+            dataset_cache[dataset_category]['input_dataset'] = LazyDataset(dataset_pair, 'input_dataset')
+        #
+    #
+    return dataset_cache
+
+
+# the datasets created in this process, when enabled - see enable_dataset_memo()
+_dataset_memo = None
+
+
+def enable_dataset_memo(enable=True):
+    # a long running process (see interfaces.BenchmarkDaemon) can keep the datasets that it has created,
+    # so that the annotations are parsed and the dataset folders are checked only once.
+    global _dataset_memo
+    _dataset_memo = ({} if _dataset_memo is None else _dataset_memo) if enable else None
+
+
+def _get_dataset_memo_key(settings, dataset_category):
+    # the settings that are used in _create_datasets()
+    dataset_type_dict = settings.dataset_type_dict if settings.dataset_type_dict is None else \
+        tuple(sorted(settings.dataset_type_dict.items()))
+    return (dataset_category, os.path.abspath(settings.datasets_path), settings.num_frames,
+            settings.calibration_frames, dataset_type_dict, bool(settings.experimental_models))
 
-    if check_dataset_load(settings, DATASET_CATEGORY_IMAGENET) and (DATASET_CATEGORY_IMAGENET in dataset_list):
+
+def create_datasets(settings, dataset_category, download=False):
+    if _dataset_memo is None:
+        return _create_datasets(settings, dataset_category, download=download)
+    #
+    memo_key = _get_dataset_memo_key(settings, dataset_category)
+    if memo_key not in _dataset_memo:
+        calibration_dataset, input_dataset = _create_datasets(settings, dataset_category, download=download)
+        # a dataset that could not be created is tried again next time
+        if input_dataset is None:
+            return calibration_dataset, input_dataset
+        #
+        _dataset_memo[memo_key] = (calibration_dataset, input_dataset)
+    #
+    # the users get their own copy, so that the dataset in the memo is not modified
+    calibration_dataset, input_dataset = _dataset_memo[memo_key]
+    return shared_copy(calibration_dataset), shared_copy(input_dataset)
+
+
+def _create_datasets(settings, dataset_category, download=False):
+    dset_info_dict = get_dataset_info_dict(settings)
+    calibration_dataset = input_dataset = None
+    if dataset_category == DATASET_CATEGORY_IMAGENET:
         dataset_variant = settings.dataset_type_dict[DATASET_CATEGORY_IMAGENET] if \
             settings.dataset_type_dict is not None else DATASET_CATEGORY_IMAGENET
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_IMAGENET} variant:{dataset_variant}"))
@@ -178,10 +231,10 @@ def get_datasets(settings, download=False, dataset_list=None):
         # what is provided is mechanism to select one of the imagenet variants
         # but only one is selected and assigned to the key imagenet
         # all the imagenet models will use this variant.
-        dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = ImageNetDataSetType(**imagenet_cls_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = ImageNetDataSetType(**imagenet_cls_val_cfg, download=False)
+        calibration_dataset = ImageNetDataSetType(**imagenet_cls_calib_cfg, download=download)
+        input_dataset = ImageNetDataSetType(**imagenet_cls_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_COCOKPTS) and (DATASET_CATEGORY_COCOKPTS in dataset_list):
+    if dataset_category == DATASET_CATEGORY_COCOKPTS:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCOKPTS} variant:{DATASET_CATEGORY_COCOKPTS}"))
         filter_imgs = True
         coco_kpts_calib_cfg = dict(
@@ -199,10 +252,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_COCOKPTS,
             filter_imgs=filter_imgs)
 
-        dataset_cache[DATASET_CATEGORY_COCOKPTS]['calibration_dataset'] = COCOKeypoints(**coco_kpts_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCOKPTS]['input_dataset'] = COCOKeypoints(**coco_kpts_val_cfg, download=False)
+        calibration_dataset = COCOKeypoints(**coco_kpts_calib_cfg, download=download)
+        input_dataset = COCOKeypoints(**coco_kpts_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_YCBV) and (DATASET_CATEGORY_YCBV in dataset_list):
+    if dataset_category == DATASET_CATEGORY_YCBV:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_YCBV} variant:{DATASET_CATEGORY_YCBV}"))
         filter_imgs = True
         ycbv_calib_cfg = dict(
@@ -220,10 +273,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_YCBV,
             filter_imgs=filter_imgs)
 
-        dataset_cache[DATASET_CATEGORY_YCBV]['calibration_dataset'] = YCBV(**ycbv_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_YCBV]['input_dataset'] = YCBV(**ycbv_val_cfg, download=False)
+        calibration_dataset = YCBV(**ycbv_calib_cfg, download=download)
+        input_dataset = YCBV(**ycbv_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_COCO) and (DATASET_CATEGORY_COCO in dataset_list):
+    if dataset_category == DATASET_CATEGORY_COCO:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCO} variant:{DATASET_CATEGORY_COCO}"))
         coco_det_calib_cfg = dict(
             path=f'{settings.datasets_path}/coco',
@@ -237,10 +290,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=False, # can be set to True as well, if needed
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCO)
-        dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = COCODetection(**coco_det_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = COCODetection(**coco_det_val_cfg, download=False)
+        calibration_dataset = COCODetection(**coco_det_calib_cfg, download=download)
+        input_dataset = COCODetection(**coco_det_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_WIDERFACE) and (DATASET_CATEGORY_WIDERFACE in dataset_list):
+    if dataset_category == DATASET_CATEGORY_WIDERFACE:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_WIDERFACE} variant:{DATASET_CATEGORY_WIDERFACE}"))
         widerface_det_calib_cfg = dict(
             path=f'{settings.datasets_path}/widerface',
@@ -254,10 +307,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=False, # can be set to True as well, if needed
             num_frames=min(settings.num_frames,3226),
             name=DATASET_CATEGORY_WIDERFACE)
-        dataset_cache[DATASET_CATEGORY_WIDERFACE]['calibration_dataset'] = WiderFaceDetection(**widerface_det_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_WIDERFACE]['input_dataset'] = WiderFaceDetection(**widerface_det_val_cfg, download=False)
+        calibration_dataset = WiderFaceDetection(**widerface_det_calib_cfg, download=download)
+        input_dataset = WiderFaceDetection(**widerface_det_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_COCOSEG21) and (DATASET_CATEGORY_COCOSEG21 in dataset_list):
+    if dataset_category == DATASET_CATEGORY_COCOSEG21:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCOSEG21} variant:{DATASET_CATEGORY_COCOSEG21}"))
         cocoseg21_calib_cfg = dict(
             path=f'{settings.datasets_path}/coco',
@@ -271,10 +324,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCOSEG21)
-        dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = COCOSegmentation(**cocoseg21_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = COCOSegmentation(**cocoseg21_val_cfg, download=False)
+        calibration_dataset = COCOSegmentation(**cocoseg21_calib_cfg, download=download)
+        input_dataset = COCOSegmentation(**cocoseg21_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_ADE20K) and (DATASET_CATEGORY_ADE20K in dataset_list):
+    if dataset_category == DATASET_CATEGORY_ADE20K:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_ADE20K} variant:{DATASET_CATEGORY_ADE20K}"))
         ade20k_seg_calib_cfg = dict(
             path=f'{settings.datasets_path}/ADEChallengeData2016',
@@ -288,10 +341,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 2000),
             name=DATASET_CATEGORY_ADE20K)
-        dataset_cache[DATASET_CATEGORY_ADE20K]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_ADE20K]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, download=False)
+        calibration_dataset = ADE20KSegmentation(**ade20k_seg_calib_cfg, download=download)
+        input_dataset = ADE20KSegmentation(**ade20k_seg_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_ADE20K32) and (DATASET_CATEGORY_ADE20K32 in dataset_list):
+    if dataset_category == DATASET_CATEGORY_ADE20K32:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_ADE20K32} variant:{DATASET_CATEGORY_ADE20K32}"))
         ade20k_seg_calib_cfg = dict(
             path=f'{settings.datasets_path}/ADEChallengeData2016',
@@ -305,10 +358,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 2000),
             name=DATASET_CATEGORY_ADE20K32)
-        dataset_cache[DATASET_CATEGORY_ADE20K32]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, num_classes=32, download=download)
-        dataset_cache[DATASET_CATEGORY_ADE20K32]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, num_classes=32, download=False)
+        calibration_dataset = ADE20KSegmentation(**ade20k_seg_calib_cfg, num_classes=32, download=download)
+        input_dataset = ADE20KSegmentation(**ade20k_seg_val_cfg, num_classes=32, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_VOC2012) and (DATASET_CATEGORY_VOC2012 in dataset_list):
+    if dataset_category == DATASET_CATEGORY_VOC2012:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_VOC2012} variant:{DATASET_CATEGORY_VOC2012}"))
         voc_seg_calib_cfg = dict(
             path=f'{settings.datasets_path}/VOCdevkit/VOC2012',
@@ -322,10 +375,10 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 1449),
             name=DATASET_CATEGORY_VOC2012)
-        dataset_cache[DATASET_CATEGORY_VOC2012]['calibration_dataset'] = VOC2012Segmentation(**voc_seg_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_VOC2012]['input_dataset'] = VOC2012Segmentation(**voc_seg_val_cfg, download=False)
+        calibration_dataset = VOC2012Segmentation(**voc_seg_calib_cfg, download=download)
+        input_dataset = VOC2012Segmentation(**voc_seg_val_cfg, download=False)
     #
-    if check_dataset_load(settings, DATASET_CATEGORY_NYUDEPTHV2) and (DATASET_CATEGORY_NYUDEPTHV2 in dataset_list):
+    if dataset_category == DATASET_CATEGORY_NYUDEPTHV2:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_NYUDEPTHV2} variant:{DATASET_CATEGORY_NYUDEPTHV2}"))
         filter_imgs = False
         nyudepthv2_calib_cfg = dict(
@@ -341,11 +394,11 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames, 654),
             name=DATASET_CATEGORY_NYUDEPTHV2)
 
-        dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'] = NYUDepthV2(**nyudepthv2_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'] = NYUDepthV2(**nyudepthv2_val_cfg, download=False)
+        calibration_dataset = NYUDepthV2(**nyudepthv2_calib_cfg, download=download)
+        input_dataset = NYUDepthV2(**nyudepthv2_val_cfg, download=False)
     #
 
-    if check_dataset_load(settings, DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD) and (DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD in dataset_list):
+    if dataset_category == DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD:
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD} variant:{DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD}"))
         dataset_calib_cfg = dict(
             path=f'{settings.datasets_path}/ti-robokit_semseg_zed1hd',
@@ -366,14 +419,14 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD
         )
 
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'] = RobokitSegmentation(**dataset_calib_cfg, download=True)
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'] = RobokitSegmentation(**dataset_val_cfg, download=True)
+        calibration_dataset = RobokitSegmentation(**dataset_calib_cfg, download=True)
+        input_dataset = RobokitSegmentation(**dataset_val_cfg, download=True)
     #
 
     # the following are datasets cannot be downloaded automatically
     # put it under the condition of experimental_models
     if settings.experimental_models:
-        if check_dataset_load(settings, DATASET_CATEGORY_CITYSCAPES) and (DATASET_CATEGORY_CITYSCAPES in dataset_list):
+        if dataset_category == DATASET_CATEGORY_CITYSCAPES:
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_CITYSCAPES} variant:{DATASET_CATEGORY_CITYSCAPES}"))
             cityscapes_seg_calib_cfg = dict(
                 path=f'{settings.datasets_path}/cityscapes',
@@ -387,10 +440,10 @@ def get_datasets(settings, download=False, dataset_list=None):
                 shuffle=True,
                 num_frames=min(settings.num_frames,500),
                 name=DATASET_CATEGORY_CITYSCAPES)
-            dataset_cache[DATASET_CATEGORY_CITYSCAPES]['calibration_dataset'] = CityscapesSegmentation(**cityscapes_seg_calib_cfg, download=False)
-            dataset_cache[DATASET_CATEGORY_CITYSCAPES]['input_dataset'] = CityscapesSegmentation(**cityscapes_seg_val_cfg, download=False)
+            calibration_dataset = CityscapesSegmentation(**cityscapes_seg_calib_cfg, download=False)
+            input_dataset = CityscapesSegmentation(**cityscapes_seg_val_cfg, download=False)
         #
-        if check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS in dataset_list):
+        if dataset_category == DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS:
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS} variant:{DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS}"))
             dataset_calib_cfg = dict(
                 path=f'{settings.datasets_path}/kitti_3dod/',
@@ -411,13 +464,13 @@ def get_datasets(settings, download=False, dataset_list=None):
                 num_frames=min(settings.num_frames, 3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS)
             try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
+                calibration_dataset = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
+                input_dataset = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
             except Exception as message:
                 print(f'KittiLidar3D dataset loader could not be created: {message}')
             #
         #
-        if check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS in dataset_list):
+        if dataset_category == DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS:
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS} variant:{DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS}"))
             dataset_calib_cfg = dict(
                 path=f'{settings.datasets_path}/kitti_3dod/',
@@ -438,14 +491,14 @@ def get_datasets(settings, download=False, dataset_list=None):
                 num_frames=min(settings.num_frames, 3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS)
             try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
+                calibration_dataset = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
+                input_dataset = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
             except Exception as message:
                 print(f'KittiLidar3D dataset loader could not be created: {message}')
             #
         #
 
-        if check_dataset_load(settings, DATASET_CATEGORY_KITTI_2015) and (DATASET_CATEGORY_KITTI_2015 in dataset_list):
+        if dataset_category == DATASET_CATEGORY_KITTI_2015:
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_KITTI_2015} variant:{DATASET_CATEGORY_KITTI_2015}"))
             dataset_calib_cfg = dict(
                 path=f'{settings.datasets_path}/kitti_2015/',
@@ -462,14 +515,14 @@ def get_datasets(settings, download=False, dataset_list=None):
                 max_disp=192,
                 num_frames=min(settings.num_frames, 50))
             try:
-                dataset_cache['kitti_2015']['calibration_dataset'] = Kitti2015(**dataset_calib_cfg, download=False)
-                dataset_cache['kitti_2015']['input_dataset'] = Kitti2015(**dataset_val_cfg, download=False)
+                calibration_dataset = Kitti2015(**dataset_calib_cfg, download=False)
+                input_dataset = Kitti2015(**dataset_val_cfg, download=False)
             except Exception as message:
                 print(f'Kitti 2015 dataset loader could not be created: {message}')
             #         
         #
     #
-    return dataset_cache
+    return calibration_dataset, input_dataset
 
 
 def initialize_datasets(settings):
@@ -483,6 +536,12 @@ def download_datasets(settings, download=True, dataset_list=None):
     # if the dataset folders are missing, it will be downloaded and extracted
     # set download='always' to force re-download the datasets
     settings.dataset_cache = get_datasets(settings, download=download, dataset_list=dataset_list)
+    # the datasets are created lazily by get_datasets() - create them now, so that they are downloaded
+    for dataset_category, dataset_entry in settings.dataset_cache.items():
+        for dataset_key, dataset in dataset_entry.items():
+            dataset_entry[dataset_key] = LazyDataset.resolve(dataset)
+        #
+    #
     return True
 
 
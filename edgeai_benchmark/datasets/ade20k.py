@@ -169,22 +169,29 @@ class ADE20KSegmentation(DatasetBase):
         return label_img
 
     def evaluate(self, predictions, **kwargs):
-        label_offset_target = kwargs.get('label_offset_target', 0)
-        label_offset_pred = kwargs.get('label_offset_pred', 0)
-        cmatrix = None
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img, label_offset_target=label_offset_target)
-            # reshape prediction is needed
-            output = predictions[n]+label_offset_pred
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes_)
+            self.update(predictions[n], n, **kwargs)
         #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        # accumulate the confusion matrix of one frame, so that the outputs need not be kept till the end
+        label_offset_target = kwargs.get('label_offset_target', 0)
+        label_offset_pred = kwargs.get('label_offset_pred', 0)
+        image_file, label_file = self.__getitem__(frame_index, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = self.encode_segmap(label_img, label_offset_target=label_offset_target)
+        # reshape prediction is needed
+        output = frame_output+label_offset_pred
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # compute metric
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes_)
+
+    def finalize(self, **kwargs):
+        cmatrix, self.metric_state = self.metric_state, None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
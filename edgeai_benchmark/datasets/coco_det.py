@@ -108,7 +108,6 @@ import os
 import random
 import json
 import shutil
-import tempfile
 import numpy as np
 from colorama import Fore
 from pycocotools.coco import COCO
@@ -245,12 +244,27 @@ class COCODetection(DatasetBase):
 
     def evaluate(self, predictions, **kwargs):
         label_offset = kwargs.get('label_offset_pred', 0)
-        #run_dir = kwargs.get('run_dir', None)
-        temp_dir_obj = tempfile.TemporaryDirectory()
-        temp_dir = temp_dir_obj.name
-        self.tempfiles.append(temp_dir_obj)
+        # the detections are given to pycocotools from memory - either as one table (fast path)
+        # or as a list of dicts (generic path). the results are the same.
+        detections_formatted = self._format_detections_table(predictions, label_offset=label_offset)
+        if detections_formatted is None:
+            detections_formatted = self._format_detections_list(predictions, label_offset=label_offset)
+        #
+        coco_ap = 0.0
+        coco_ap50 = 0.0
+        if len(detections_formatted) > 0:
+            cocoDet = self.coco_dataset.loadRes(detections_formatted)
+            cocoEval = COCOeval(self.coco_dataset, cocoDet, iouType='bbox')
+            cocoEval.evaluate()
+            cocoEval.accumulate()
+            cocoEval.summarize()
+            coco_ap = cocoEval.stats[0]
+            coco_ap50 = cocoEval.stats[1]
+        #
+        accuracy = {'accuracy_ap[.5:.95]%': coco_ap*100.0, 'accuracy_ap50%': coco_ap50*100.0}
+        return accuracy
 
-        #os.makedirs(run_dir, exist_ok=True)
+    def _format_detections_list(self, predictions, label_offset=0):
         detections_formatted_list = []
         for frame_idx, det_frame in enumerate(predictions):
             for det_id, det in enumerate(det_frame):
@@ -261,23 +275,88 @@ class COCODetection(DatasetBase):
                 #
             #
         #
-        coco_ap = 0.0
-        coco_ap50 = 0.0
-        if len(detections_formatted_list) > 0:
-            detection_file = os.path.join(temp_dir, 'detection_results.json')
-            with open(detection_file, 'w') as det_fp:
-                json.dump(detections_formatted_list, det_fp)
+        return detections_formatted_list
+
+    def _format_detections_table(self, predictions, label_offset=0):
+        # vectorized version of _format_detections_list() - produces an Nx7 table in the format accepted by
+        # COCO.loadRes(): [image_id, x, y, w, h, score, category_id]
+        # returns None if the predictions are not in the expected form, so that the generic path can be used.
+        if type(self)._format_detections is not COCODetection._format_detections or \
+                type(self)._detection_label_to_catid is not COCODetection._detection_label_to_catid:
+            return None
+        #
+        detections_table = []
+        for frame_idx, det_frame in enumerate(predictions):
+            if not (isinstance(det_frame, np.ndarray) and det_frame.ndim == 2 and
+                    np.issubdtype(det_frame.dtype, np.floating)):
+                return None
             #
-            cocoDet = self.coco_dataset.loadRes(detection_file)
-            cocoEval = COCOeval(self.coco_dataset, cocoDet, iouType='bbox')
-            cocoEval.evaluate()
-            cocoEval.accumulate()
-            cocoEval.summarize()
-            coco_ap = cocoEval.stats[0]
-            coco_ap50 = cocoEval.stats[1]
+            if det_frame.shape[0] == 0:
+                continue
+            #
+            if det_frame.shape[1] < 6:
+                return None
+            #
+            category_ids = self._detection_labels_to_catids(det_frame[:,4], label_offset)
+            if category_ids is None:
+                return None
+            #
+            # the width and height are computed in the dtype of the predictions - same as _xyxy2xywh()
+            frame_table = np.empty((det_frame.shape[0], 7), dtype=np.float64)
+            frame_table[:,0] = self.img_ids[frame_idx]
+            frame_table[:,1] = det_frame[:,0]
+            frame_table[:,2] = det_frame[:,1]
+            frame_table[:,3] = det_frame[:,2] - det_frame[:,0]
+            frame_table[:,4] = det_frame[:,3] - det_frame[:,1]
+            frame_table[:,5] = det_frame[:,5]
+            frame_table[:,6] = category_ids
+            # final coco categories start from 1
+            detections_table.append(frame_table[category_ids >= 1])
         #
-        accuracy = {'accuracy_ap[.5:.95]%': coco_ap*100.0, 'accuracy_ap50%': coco_ap50*100.0}
-        return accuracy
+        detections_table = np.concatenate(detections_table, axis=0) if len(detections_table) > 0 \
+            else np.zeros((0,7), dtype=np.float64)
+        return detections_table
+
+    def _detection_labels_to_catids(self, labels, label_offset):
+        # vectorized version of _detection_label_to_catid() using lookup tables
+        # returns None for values that the scalar version handles differently (inf, or nan without a dict)
+        if np.any(np.isinf(labels)):
+            return None
+        #
+        if isinstance(label_offset, dict):
+            catids = np.zeros(labels.shape, dtype=np.int64)
+            valid = ~np.isnan(labels)
+            if len(label_offset) == 0 or not np.any(valid):
+                return catids
+            #
+            keys = np.array([int(k) for k in label_offset.keys()], dtype=np.int64)
+            key_min, key_max = keys.min(), keys.max()
+            lut = np.zeros(key_max-key_min+1, dtype=np.int64)
+            lut_valid = np.zeros(key_max-key_min+1, dtype=bool)
+            lut[keys-key_min] = [int(v) for v in label_offset.values()]
+            lut_valid[keys-key_min] = True
+            label_ids = labels[valid].astype(np.int64)
+            in_range = (label_ids >= key_min) & (label_ids <= key_max)
+            lut_index = np.where(in_range, label_ids-key_min, 0)
+            found = in_range & lut_valid[lut_index]
+            catids[valid] = np.where(found, lut[lut_index], 0)
+            return catids
+        elif np.any(np.isnan(labels)):
+            return None
+        #
+        if isinstance(label_offset, (list,tuple)):
+            label_ids = labels.astype(np.int64)
+            assert np.all(label_ids < len(label_offset)), 'label_offset is a list/tuple, but its size is smaller than the detected label'
+            catids = np.array([int(v) for v in label_offset], dtype=np.int64)[label_ids]
+        elif isinstance(label_offset, numbers.Number):
+            catids = (labels + label_offset).astype(np.int64)
+        else:
+            label_ids = labels.astype(np.int64)
+            assert np.all(label_ids < len(self.cat_ids)), \
+                'the detected label could not be mapped to the 90 COCO categories using the default COCO.getCatIds()'
+            catids = np.array(self.cat_ids, dtype=np.int64)[label_ids]
+        #
+        return catids
 
     def get_dataset_info(self):
         # return only info and categories for now as the whole thing could be quite large.
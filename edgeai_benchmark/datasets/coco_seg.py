@@ -110,6 +110,7 @@ import numpy as np
 import PIL
 import cv2
 import tempfile
+import shutil
 from colorama import Fore
 from pycocotools.coco import COCO
 from pycocotools import mask as coco_mask
@@ -122,6 +123,9 @@ __all__ = ['COCOSegmentation']
 
 
 class COCOSegmentation(DatasetBase):
+    # increment this if the way the labels are generated changes, so that old label caches are not used
+    LABEL_CACHE_VERSION = 1
+
     def __init__(self, num_classes=21, download=False, num_frames=None, name="cocoseg21", **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
         self.force_download = True if download == 'always' else False
@@ -190,6 +194,9 @@ class COCOSegmentation(DatasetBase):
             self.tempfiles.append(temp_dir)
         #
         self.label_dir = os.path.join(run_dir, 'labels')
+        # folder where the rasterized labels are cached during the first evaluate() and reused later,
+        # for example a folder in the work_dir. None or False disables the cache.
+        self.label_cache_dir = self.kwargs.get('label_cache_dir', None)
         with open(self.annotation_file) as afp:
             self.dataset_store = json.load(afp)
         #
@@ -232,11 +239,7 @@ class COCOSegmentation(DatasetBase):
         image_path = os.path.join(self.image_dir, img['file_name'])
         if with_label:
             os.makedirs(self.label_dir, exist_ok=True)
-            ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
-            anno = self.coco_dataset.loadAnns(ann_ids)
-            image = PIL.Image.open(image_path)
-            image, anno = self._filter_and_remap_categories(image, anno)
-            image, target = self._convert_polys_to_mask(image, anno)
+            target = self._get_label(img_id)
             # write the label file to a temorary dir so that it can be used by evaluate()
             image_basename = os.path.basename(image_path)
             label_path = os.path.join(self.label_dir, image_basename)
@@ -263,23 +266,126 @@ class COCOSegmentation(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
+            self.update(predictions[n], n, **kwargs)
+        #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        # accumulate the confusion matrix of one frame, so that the outputs need not be kept till the end
+        if self.metric_state is None:
+            label_cache = self._get_label_cache() if self.label_cache_dir else None
+            self.metric_state = dict(cmatrix=None, label_cache=label_cache)
+        #
+        label_cache = self.metric_state['label_cache']
+        if label_cache is not None:
+            label_img = self._read_label_cache(label_cache, frame_index)
+        else:
+            image_file, label_file = self.__getitem__(frame_index, with_label=True)
             label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
         #
-        accuracy = utils.segmentation_accuracy(cmatrix)
+        label_img = self.encode_segmap(label_img)
+        # reshape prediction is needed
+        output = frame_output
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # compute metric
+        self.metric_state['cmatrix'] = utils.confusion_matrix(self.metric_state['cmatrix'], output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        metric_state, self.metric_state = self.metric_state, None
+        accuracy = utils.segmentation_accuracy(metric_state['cmatrix'])
         return accuracy
 
+    def get_metric_checkpoint(self):
+        # the label cache is memory mapped - it is opened again instead of being written into the checkpoint
+        if self.metric_state is None:
+            return None
+        #
+        return dict(cmatrix=self.metric_state['cmatrix'])
+
+    def set_metric_checkpoint(self, metric_checkpoint):
+        if metric_checkpoint is None:
+            self.metric_state = None
+            return
+        #
+        label_cache = self._get_label_cache() if self.label_cache_dir else None
+        self.metric_state = dict(cmatrix=metric_checkpoint['cmatrix'], label_cache=label_cache)
+
+    def _get_label_cache(self):
+        # the label cache has all the labels of the frames of this dataset (in the same order), stored as
+        # one flat uint8 array (labels.bin) that is memory mapped, and an index (index.npy) with one row per frame:
+        # [offset, height, width, img_id]. it is keyed by the annotation file, category mapping and frame subset.
+        annotation_stat = os.stat(self.annotation_file)
+        img_ids = self.img_ids[:self.num_frames]
+        cache_key = utils.hash_object(dict(version=self.LABEL_CACHE_VERSION,
+            annotation_file=os.path.abspath(self.annotation_file), annotation_size=annotation_stat.st_size,
+            annotation_mtime=annotation_stat.st_mtime_ns, categories=list(self.categories), img_ids=img_ids))
+        cache_dir = os.path.join(self.label_cache_dir, f'{self.name}_labels_v{self.LABEL_CACHE_VERSION}_{cache_key[:16]}')
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(self.label_cache_dir, exist_ok=True)
+                if not os.access(self.label_cache_dir, os.W_OK):
+                    print(utils.log_color('WARNING', 'label cache folder is not writable - labels will not be cached', self.label_cache_dir))
+                    return None
+                #
+                self._write_label_cache(cache_dir, img_ids)
+            #
+            label_index = np.load(os.path.join(cache_dir, 'index.npy'))
+            label_data = np.memmap(os.path.join(cache_dir, 'labels.bin'), dtype=np.uint8, mode='r')
+        except OSError as e:
+            print(utils.log_color('WARNING', 'label cache could not be used', f'{cache_dir} - {e}'))
+            return None
+        #
+        return label_index, label_data
+
+    def _write_label_cache(self, cache_dir, img_ids):
+        print(utils.log_color('INFO', 'creating label cache', cache_dir))
+        # write to a temporary folder and rename it at the end,
+        # so that a partially written cache is never used by another process
+        temp_dir = tempfile.mkdtemp(dir=self.label_cache_dir, prefix='.tmp_')
+        try:
+            label_index = np.zeros((len(img_ids), 4), dtype=np.int64)
+            offset = 0
+            with open(os.path.join(temp_dir, 'labels.bin'), 'wb') as label_fp:
+                for n, img_id in enumerate(img_ids):
+                    target = self._get_label(img_id)
+                    label_fp.write(np.ascontiguousarray(target, dtype=np.uint8).tobytes())
+                    label_index[n] = (offset, target.shape[0], target.shape[1], img_id)
+                    offset += target.size
+                #
+            #
+            np.save(os.path.join(temp_dir, 'index.npy'), label_index)
+            os.rename(temp_dir, cache_dir)
+        except OSError:
+            # another process may have created the same cache in the meantime
+            if not os.path.exists(cache_dir):
+                raise
+            #
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            #
+        #
+
+    def _read_label_cache(self, label_cache, n):
+        label_index, label_data = label_cache
+        offset, height, width, img_id = label_index[n]
+        assert img_id == self.img_ids[n], f'label cache does not match the dataset at frame {n}'
+        return label_data[offset:offset+height*width].reshape(height, width)
+
+    def _get_label(self, img_id):
+        img = self.coco_dataset.loadImgs([img_id])[0]
+        image_path = os.path.join(self.image_dir, img['file_name'])
+        ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
+        anno = self.coco_dataset.loadAnns(ann_ids)
+        image = PIL.Image.open(image_path)
+        image, anno = self._filter_and_remap_categories(image, anno)
+        image, target = self._convert_polys_to_mask(image, anno)
+        return target
+
     def get_dataset_info(self):
         # return only info and categories for now as the whole thing could be quite large.
         dataset_store = dict()
@@ -1,3 +1,4 @@
+import copy
 from .. import utils
 
 
@@ -6,5 +7,31 @@ class DatasetBase(utils.ParamsBase):
         super().__init__()
         # this is required to save the params
         self.kwargs = kwargs
+        # the metric accumulated so far by update() - see evaluate(), update() and finalize() in the derived classes
+        self.metric_state = None
         # call the utils.ParamsBase.initialize()
-        super().initialize()
\ No newline at end of file
+        super().initialize()
+
+    def shared_copy(self):
+        # a lightweight copy of the dataset for a pipeline, used instead of a deepcopy.
+        # the loaded index/annotations are shared with this object and must be treated as read-only,
+        # only the params (kwargs) are copied - setting an attribute on the copy does not affect this object.
+        # the copy does not own the temporary files created by this object.
+        dataset_copy = copy.copy(self)
+        dataset_copy.kwargs = copy.copy(self.kwargs)
+        if hasattr(self, 'tempfiles'):
+            dataset_copy.tempfiles = []
+        #
+        return dataset_copy
+
+    def reset_metric(self):
+        # discards the metric state left by an earlier inference on this object that did not reach finalize()
+        self.metric_state = None
+
+    def get_metric_checkpoint(self):
+        # the state of the metric accumulated by update(), to be written into an inference checkpoint (it must be picklable)
+        return self.metric_state
+
+    def set_metric_checkpoint(self, metric_checkpoint):
+        # restores the state given by get_metric_checkpoint(), so that update() continues from there
+        self.metric_state = metric_checkpoint
@@ -89,15 +89,24 @@ class ImageClassification(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        in_lines = self.imgs
-        metric_tracker = utils.AverageMeter(name='accuracy_top1%')
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            words = in_lines[n].split(' ')
-            gt_label = int(words[1])
-            accuracy = self.classification_accuracy(predictions[n], gt_label, **kwargs)
-            metric_tracker.update(accuracy)
+            self.update(predictions[n], n, **kwargs)
         #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        # accumulate the metric of one frame, so that the outputs need not be kept till the end
+        if self.metric_state is None:
+            self.metric_state = utils.AverageMeter(name='accuracy_top1%')
+        #
+        words = self.imgs[frame_index].split(' ')
+        gt_label = int(words[1])
+        accuracy = self.classification_accuracy(frame_output, gt_label, **kwargs)
+        self.metric_state.update(accuracy)
+
+    def finalize(self, **kwargs):
+        metric_tracker, self.metric_state = self.metric_state, None
         return {metric_tracker.name:metric_tracker.avg}
 
     def classification_accuracy(self, prediction, target, label_offset_pred=0, label_offset_gt=0,
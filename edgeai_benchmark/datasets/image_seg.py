@@ -46,18 +46,25 @@ class ImageSegmentation(ImagePixel2Pixel):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
         for n in range(self.num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
+            self.update(predictions[n], n, **kwargs)
         #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        # accumulate the confusion matrix of one frame, so that the outputs need not be kept till the end
+        image_file, label_file = self.__getitem__(frame_index, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        # reshape prediction is needed
+        output = frame_output
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # compute metric
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix, self.metric_state = self.metric_state, None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
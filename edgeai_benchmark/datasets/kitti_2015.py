@@ -309,27 +309,37 @@ class Kitti2015(DatasetBase):
     def __call__(self, predictions, **kwargs):
         return self.evaluate(predictions, **kwargs)
         
-    def evaluate(self, predictions, **kwargs):        
-        accuracy = 0.0
-        max_disp = self.kwargs.get('max_disp')
-
+    def evaluate(self, predictions, **kwargs):
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            left_file, right_file, gt_file = self.__getitem__(n, with_label=True)
-            gt_img = PIL.Image.open(gt_file)
-            gt_img = np.array(gt_img, dtype=np.float32) / 256.
-            prediction = predictions[n]
+            self.update(predictions[n], n, **kwargs)
+        #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        # accumulate the metric of one frame, so that the outputs need not be kept till the end
+        if self.metric_state is None:
+            self.metric_state = dict(accuracy=0.0, num_frames=0)
+        #
+        max_disp = self.kwargs.get('max_disp')
+        left_file, right_file, gt_file = self.__getitem__(frame_index, with_label=True)
+        gt_img = PIL.Image.open(gt_file)
+        gt_img = np.array(gt_img, dtype=np.float32) / 256.
+        prediction = frame_output
 
-            gt_img = F.center_crop(gt_img, (prediction.shape[0], prediction.shape[1]))
+        gt_img = F.center_crop(gt_img, (prediction.shape[0], prediction.shape[1]))
 
-            mask = (gt_img < max_disp) & (gt_img > 0)
+        mask = (gt_img < max_disp) & (gt_img > 0)
 
-            diff = abs(gt_img - prediction[:, :, 0])
-            diff = diff[mask]
+        diff = abs(gt_img - prediction[:, :, 0])
+        diff = diff[mask]
 
-            accuracy += diff.sum() / mask.sum()
+        self.metric_state['accuracy'] += diff.sum() / mask.sum()
+        self.metric_state['num_frames'] += 1
 
-        accuracy /= (n+1)             
+    def finalize(self, **kwargs):
+        metric_state, self.metric_state = self.metric_state, None
+        accuracy = metric_state['accuracy'] / metric_state['num_frames']
         #return accuracy
         return {'disparity_error_%':accuracy}   
 
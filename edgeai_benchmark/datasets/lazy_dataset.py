@@ -0,0 +1,110 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import copy
+
+__all__ = ['LazyDatasetPair', 'LazyDataset', 'shared_copy']
+
+
+def shared_copy(dataset):
+    # copy of a dataset for a pipeline - see DatasetBase.shared_copy()
+    if dataset is None or isinstance(dataset, str):
+        return dataset
+    elif hasattr(dataset, 'shared_copy'):
+        return dataset.shared_copy()
+    else:
+        return copy.deepcopy(dataset)
+    #
+
+
+class LazyDatasetPair():
+    # constructs the calibration and input datasets of a category when either of them is used first.
+    # the construction (which may involve parsing large annotation files) happens only once.
+    def __init__(self, settings, dataset_category, download=False):
+        self.settings = settings
+        self.dataset_category = dataset_category
+        self.download = download
+        self.datasets = None
+
+    def get(self, dataset_key):
+        if self.datasets is None:
+            from . import create_datasets
+            calibration_dataset, input_dataset = create_datasets(self.settings, self.dataset_category, download=self.download)
+            self.datasets = {'calibration_dataset': calibration_dataset, 'input_dataset': input_dataset}
+        #
+        return self.datasets[dataset_key]
+
+    def is_created(self):
+        return self.datasets is not None
+
+
+class LazyDataset():
+    # a proxy that stands in for a dataset in the pipeline_configs until the dataset is actually used.
+    # PipelineRunner replaces it with the real dataset for the selected pipelines - see LazyDataset.resolve()
+    def __init__(self, dataset_pair, dataset_key, copy_on_create=False):
+        self.dataset_pair = dataset_pair
+        self.dataset_key = dataset_key
+        # a deepcopy of the proxy that was made before the dataset was created should get its own (shared) copy of the dataset
+        self.copy_on_create = copy_on_create
+        self.dataset = None
+
+    def get(self):
+        if self.dataset is None:
+            dataset = self.dataset_pair.get(self.dataset_key)
+            self.dataset = shared_copy(dataset) if self.copy_on_create else dataset
+        #
+        return self.dataset
+
+    @staticmethod
+    def resolve(dataset):
+        return dataset.get() if isinstance(dataset, LazyDataset) else dataset
+
+    def __deepcopy__(self, memo):
+        if self.dataset_pair.is_created():
+            return copy.deepcopy(self.get(), memo)
+        #
+        return LazyDataset(self.dataset_pair, self.dataset_key, copy_on_create=True)
+
+    def __getattr__(self, name):
+        # dunder attributes are not forwarded, so that copy/pickle do not create the dataset
+        if name.startswith('__') or name in ('dataset_pair', 'dataset_key', 'copy_on_create', 'dataset'):
+            raise AttributeError(name)
+        #
+        return getattr(self.get(), name)
+
+    def __len__(self):
+        return len(self.get())
+
+    def __getitem__(self, index, **kwargs):
+        return self.get().__getitem__(index, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.dataset_pair.dataset_category}:{self.dataset_key})'
@@ -128,14 +128,23 @@ class ModelMakerClassificationDataset(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        metric_tracker = utils.AverageMeter(name='accuracy_top1%')
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            words = self.__getitem__(n, with_label=True)
-            gt_label = int(words[1])
-            accuracy = self.classification_accuracy(predictions[n], gt_label, **kwargs)
-            metric_tracker.update(accuracy)
+            self.update(predictions[n], n, **kwargs)
         #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        if self.metric_state is None:
+            self.metric_state = utils.AverageMeter(name='accuracy_top1%')
+        #
+        words = self.__getitem__(frame_index, with_label=True)
+        gt_label = int(words[1])
+        accuracy = self.classification_accuracy(frame_output, gt_label, **kwargs)
+        self.metric_state.update(accuracy)
+
+    def finalize(self, **kwargs):
+        metric_tracker, self.metric_state = self.metric_state, None
         return {metric_tracker.name: metric_tracker.avg}
 
     def classification_accuracy(self, prediction, target, label_offset_pred=0, label_offset_gt=0,
@@ -284,20 +293,26 @@ class ModelMakerSegmentationDataset(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
         num_frames = min(self.num_frames, len(predictions))
         for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
+            self.update(predictions[n], n, **kwargs)
         #
+        return self.finalize(**kwargs)
+
+    def update(self, frame_output, frame_index, **kwargs):
+        image_file, label_file = self.__getitem__(frame_index, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = self.encode_segmap(label_img)
+        # reshape prediction is needed
+        output = frame_output
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # compute metric
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix, self.metric_state = self.metric_state, None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
@@ -3,3 +3,4 @@ from .run_report import *
 from .run_package import *
 from .run_model import *
 from .get_configs import *
+from .run_daemon import *
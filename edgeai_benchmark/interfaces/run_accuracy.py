@@ -83,6 +83,8 @@ def run_accuracy(settings, work_dir, pipeline_configs=None, modify_pipelines_fun
     sys.stdout.flush()
 
     # now actually run the configs
-    if settings.run_import or settings.run_inference:
-        pipeline_runner.run()
+    results_list = None
+    if settings.run_import or settings.run_inference or settings.run_rescore:
+        results_list = pipeline_runner.run()
     #
+    return results_list
@@ -0,0 +1,278 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import sys
+import io
+import json
+import select
+import socket
+import tempfile
+import threading
+import time
+import traceback
+
+from .. import utils, datasets
+
+__all__ = ['BenchmarkDaemon', 'get_daemon_socket_path']
+
+
+def get_daemon_socket_path():
+    # scripts/benchmark_client.py uses the same default
+    return os.path.join(tempfile.gettempdir(), f'edgeai_benchmark_daemon_{os.getuid()}.sock')
+
+
+class _ClientConnection():
+    # the messages are json objects, one per line, in both the directions.
+    # the processes forked while a request is run (eg. by ParallelRun or the prefetch) inherit sys.stdout - they do not
+    # write into the socket, where their messages could interleave. each message of a forked process is written into
+    # the relay pipe in a single write of at most PIPE_BUF bytes (which is atomic), and this process sends it on.
+    # the text is split, so that a message fits into PIPE_BUF even if every character is escaped by json (upto 12 bytes)
+    RELAY_TEXT_CHARS = max(select.PIPE_BUF // 16, 32)
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.connected = True
+        self.owner_pid = os.getpid()
+        self.relay_fds = None
+        self.relay_thread = None
+        self.relay_stop = threading.Event()
+
+    def receive(self):
+        with self.conn.makefile('r', encoding='utf-8') as fp:
+            return json.loads(fp.readline())
+        #
+
+    def is_owner(self):
+        return os.getpid() == self.owner_pid
+
+    def send(self, message):
+        data = (json.dumps(message, default=str) + '\n').encode('utf-8')
+        if not self.is_owner():
+            if self.relay_fds is None:
+                return False
+            #
+            assert len(data) <= select.PIPE_BUF, f'message too long to be relayed: {len(data)} bytes'
+            os.write(self.relay_fds[1], data)
+            return True
+        #
+        return self._send_data(data)
+
+    def _send_data(self, data):
+        if not self.connected:
+            return False
+        #
+        try:
+            with self.lock:
+                self.conn.sendall(data)
+            #
+        except OSError:
+            # the client has gone away - the request is run to completion anyway, its results are written to the run_dirs
+            self.connected = False
+        #
+        return self.connected
+
+    def start_relay(self):
+        self.relay_fds = os.pipe()
+        self.relay_stop.clear()
+        self.relay_thread = threading.Thread(target=self._relay, daemon=True)
+        self.relay_thread.start()
+
+    def stop_relay(self):
+        # the forked processes of the request have finished by now - what they have written is still sent
+        self.relay_stop.set()
+        self.relay_thread.join()
+        for fd in self.relay_fds:
+            os.close(fd)
+        #
+        self.relay_fds = None
+        self.relay_thread = None
+
+    def _relay(self):
+        read_fd = self.relay_fds[0]
+        buffer = b''
+        while True:
+            readable, _, _ = select.select([read_fd], [], [], 0.1)
+            if not readable:
+                if self.relay_stop.is_set():
+                    break
+                #
+                continue
+            #
+            data = os.read(read_fd, 65536)
+            if not data:
+                break
+            #
+            lines = (buffer + data).split(b'\n')
+            buffer = lines.pop()
+            for line in lines:
+                self._send_data(line + b'\n')
+            #
+        #
+
+
+class _ClientStream(io.TextIOBase):
+    # used as sys.stdout/sys.stderr while a request is run, so that the client gets the log
+    def __init__(self, client, stream_name):
+        super().__init__()
+        self.client = client
+        self.stream_name = stream_name
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        chunk_chars = len(text) if self.client.is_owner() else self.client.RELAY_TEXT_CHARS
+        for start_index in range(0, len(text), max(chunk_chars, 1)):
+            self.client.send(dict(type='log', stream=self.stream_name, text=text[start_index:start_index+chunk_chars]))
+        #
+        return len(text)
+
+
+class BenchmarkDaemon():
+    """
+    A long running process that runs the benchmark requests sent by scripts/benchmark_client.py over a unix socket.
+    The imports, the configs module and the datasets (see datasets.enable_dataset_memo) are loaded only once,
+    instead of once per invocation. The requests are run one at a time, the log is streamed back to the client.
+    run_func(argv) runs one request (for example the main() of scripts/benchmark_modelzoo.py) and returns the results list.
+    """
+    def __init__(self, run_func, socket_path=None):
+        self.run_func = run_func
+        self.socket_path = socket_path or get_daemon_socket_path()
+        self.start_time = None
+        self.num_requests = 0
+        self.running = False
+
+    def serve(self):
+        datasets.enable_dataset_memo()
+        if os.path.exists(self.socket_path):
+            assert not self._is_listening(), f'a daemon is already running on: {self.socket_path}'
+            # left behind by a daemon that was killed
+            os.remove(self.socket_path)
+        #
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server_socket.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+            server_socket.listen()
+            print(utils.log_color('\nINFO', 'benchmark daemon', f'pid:{os.getpid()} listening on: {self.socket_path}'))
+            sys.stdout.flush()
+            self.start_time = time.time()
+            self.running = True
+            while self.running:
+                conn, _ = server_socket.accept()
+                with conn:
+                    self._handle_request(_ClientConnection(conn))
+                #
+            #
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server_socket.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            #
+        #
+        print(utils.log_color('\nINFO', 'benchmark daemon', f'stopped after {self.num_requests} requests'))
+
+    def _is_listening(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+            try:
+                client_socket.connect(self.socket_path)
+            except OSError:
+                return False
+            #
+        #
+        return True
+
+    def _handle_request(self, client):
+        try:
+            request = client.receive()
+        except (OSError, ValueError) as e:
+            print(utils.log_color('\nWARNING', 'invalid request', str(e)))
+            return
+        #
+        command = request.get('command', 'run')
+        if command == 'run':
+            self._run_request(client, request)
+        elif command == 'ping':
+            client.send(dict(type='done', status=0, pid=os.getpid(), num_requests=self.num_requests,
+                             uptime_sec=round(time.time() - self.start_time, 1)))
+        elif command == 'shutdown':
+            self.running = False
+            client.send(dict(type='done', status=0))
+        else:
+            client.send(dict(type='done', status=1, error=f'unknown command: {command}'))
+        #
+
+    def _run_request(self, client, request):
+        argv = request.get('argv', [])
+        print(utils.log_color('\nINFO', 'benchmark daemon', f'request: {argv}'))
+        sys.stdout.flush()
+        cwd = os.getcwd()
+        client.start_relay()
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _ClientStream(client, 'stdout'), _ClientStream(client, 'stderr')
+        start_time = time.time()
+        status = 0
+        results_list = None
+        try:
+            os.chdir(request.get('cwd', cwd))
+            results_list = self.run_func(argv)
+        except SystemExit as e:
+            # argparse exits on a wrong argument (and after printing the help)
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            os.chdir(cwd)
+            client.stop_relay()
+        #
+        elapsed_sec = time.time() - start_time
+        self.num_requests += 1
+        client.send(dict(type='done', status=status, elapsed_sec=round(elapsed_sec, 3),
+                         results=self._get_results_summary(results_list)))
+        print(utils.log_color('\nINFO', 'benchmark daemon', f'request done - status:{status} time:{elapsed_sec:.1f}s'))
+        sys.stdout.flush()
+
+    def _get_results_summary(self, results_list):
+        results_summary = []
+        for param_result in (results_list or []):
+            if not isinstance(param_result, dict) or not param_result:
+                continue
+            #
+            session = param_result.get('session', None)
+            run_dir = session.get('run_dir', None) if isinstance(session, dict) else None
+            results_summary.append(dict(run_dir=os.path.basename(run_dir) if run_dir else None,
+                                        result=utils.pretty_object(param_result.get('result', {}))))
+        #
+        return results_summary
@@ -30,6 +30,7 @@ import os
 import datetime
 import yaml
 import glob
+import sqlite3
 
 from .. import utils
 
@@ -82,6 +83,17 @@ def run_report(settings, rewrite_results=True, skip_pattern=None):
     work_dirs = sorted(work_dirs, reverse=True)
     work_dirs = [w for w in work_dirs if '32bits' in w] + [w for w in work_dirs if '32bits' not in w]
 
+    # the results are read from the results database, which is updated by the pipelines.
+    # any result.yaml that is not yet in the database (or has changed) is added to it here.
+    results_db = None
+    if settings.results_db_file is not False:
+        try:
+            results_db = utils.ResultsDatabase(utils.get_results_db_file(settings))
+        except (sqlite3.Error, OSError) as e:
+            print(utils.log_color('WARNING', 'results database cannot be used', e))
+        #
+    #
+
     work_dir_keys = []
     results_max_len = 0
     results_max_id = 0
@@ -89,22 +101,36 @@ def run_report(settings, rewrite_results=True, skip_pattern=None):
     results_collection = dict()
     for work_id, work_dir in enumerate(work_dirs):
         results_yaml = os.path.join(work_dir, 'results.yaml')
-        # generate results.yaml, aggregating results from all the artifacts across all work_dirs.
-        if rewrite_results:
-            run_rewrite_results(work_dir, results_yaml)
-        #
         work_dir_splits = os.path.normpath(work_dir).split(os.sep)
         work_dir_key = '_'.join(work_dir_splits[-2:])
+        if results_db is not None:
+            results_changed = results_db.sync_work_dir(work_dir)
+            results = results_db.query(*work_dir_splits[-2:])
+            # results.yaml aggregates the results from all the artifacts in the work_dir
+            if rewrite_results and (results_changed or not os.path.exists(results_yaml)):
+                with open(results_yaml, 'w') as rfp:
+                    yaml.safe_dump(results, rfp)
+                #
+            #
+        else:
+            # generate results.yaml, aggregating results from all the artifacts across all work_dirs.
+            if rewrite_results:
+                run_rewrite_results(work_dir, results_yaml)
+            #
+            results = None
+        #
         if skip_pattern is None or skip_pattern not in work_dir_key:
-            with open(results_yaml) as rfp:
-                results = yaml.safe_load(rfp)
-                results_collection[work_dir_key] = results
-                if len(results) > results_max_len:
-                    results_max_len = len(results)
-                    results_max_id = work_id
-                    results_max_name = work_dir_key
+            if results is None:
+                with open(results_yaml) as rfp:
+                    results = yaml.safe_load(rfp)
                 #
             #
+            results_collection[work_dir_key] = results
+            if len(results) > results_max_len:
+                results_max_len = len(results)
+                results_max_id = work_id
+                results_max_name = work_dir_key
+            #
             work_dir_keys.append(work_dir_key)
         #
     #
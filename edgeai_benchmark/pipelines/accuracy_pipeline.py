@@ -32,16 +32,39 @@ import copy
 import yaml
 import time
 import itertools
+import functools
+import sqlite3
+import resource
+import traceback
+import pickle
+import multiprocessing
+import numpy as np
 from .. import utils, constants
 
 
 class AccuracyPipeline():
+    # increment this if the format of the preprocess cache entries changes
+    PREPROCESS_CACHE_VERSION = 1
+    # increment this if the contents of the inference checkpoint change
+    INFER_CHECKPOINT_VERSION = 1
+
     def __init__(self, settings, pipeline_config):
         self.info_dict = dict()
         self.settings = settings
         self.pipeline_config = pipeline_config
         self.avg_inference_time = None
         self.logger = None
+        self.metrics_streamed = False
+        self.infer_state = None
+        self.elapsed_time_dict = {}
+        # set in the worker processes of _infer_frames_sharded()
+        self.shard_conn = None
+        # store of the raw outputs of the session, if capture_raw_outputs is set - see rescore()
+        self.output_store = None
+        # the achieved confidence interval and number of frames, if early_stop_halfwidth is set
+        self.early_stop_dict = {}
+        # number of times the inference has been resumed from a checkpoint - see _load_checkpoint()
+        self.resume_count = 0
         # run_dir is assigned after initialize is called in PipelineRunner
         # if it has not been created, it will be created in start
         self.session = self.pipeline_config['session']
@@ -50,6 +73,10 @@ class AccuracyPipeline():
         # these files will be written after import and inference respectively
         self.param_yaml = os.path.join(self.run_dir, 'param.yaml')
         self.result_yaml = os.path.join(self.run_dir, 'result.yaml')
+        # progress of the inference, written periodically if infer_checkpoint_interval is set
+        self.checkpoint_file = os.path.join(self.run_dir, 'infer_checkpoint.pkl')
+        # the per frame latency values, if latency_frames_format is set
+        self.latency_frames_file = os.path.join(self.run_dir, 'latency_frames')
         # pop out dataset info from the pipeline config,
         # because it will increase the size of the para.yaml and result.yaml files
         self.pipeline_config['calibration_dataset'].get_param('kwargs').pop('dataset_info', None)
@@ -70,6 +97,10 @@ class AccuracyPipeline():
         self.close()
 
     def close(self):
+        if self.output_store is not None:
+            self.output_store.close()
+            self.output_store = None
+        #
         if self.logger is not None:
             self.logger.close()
             self.logger = None
@@ -78,6 +109,21 @@ class AccuracyPipeline():
     def __call__(self, description=''):
         ##################################################################
         # check and return if result exists
+        param_result = self._check_result()
+        if param_result is not None:
+            return param_result
+        #
+
+        ##################################################################
+        self._start()
+
+        # now actually run the import and inference
+        param_result = self._run(description=description)
+
+        self._finish(param_result)
+        return param_result
+
+    def _check_result(self):
         if self.settings.run_missing and os.path.exists(self.result_yaml):
             with open(self.result_yaml) as fp:
                 param_result = yaml.safe_load(fp)
@@ -93,14 +139,21 @@ class AccuracyPipeline():
                 with open(self.result_yaml, 'w') as fp:
                     yaml.safe_dump(param_result, fp, sort_keys=False)
                 #
+                self._update_results_db(param_result)
             #
             print(utils.log_color('\nSUCCESS', 'found results', f'{result_dict}\n'))
             return param_result
         #
+        return None
 
-        ##################################################################
+    def _start(self, start_session=True):
         # start() must be called to create the required directories
-        self.session.start()
+        # start_session is False in rescore(), which does not need the model
+        if start_session:
+            self.session.start()
+        else:
+            os.makedirs(self.run_dir, exist_ok=True)
+        #
 
         # start logger - run_dir has been created in start() above
         log_filename = os.path.join(self.run_dir, 'run.log') if self.settings.enable_logging else None
@@ -118,14 +171,11 @@ class AccuracyPipeline():
             #
         #
 
-        # now actually run the import and inference
-        param_result = self._run(description=description)
-
+    def _finish(self, param_result):
         result_dict = param_result.get('result', {})
         self.write_log(utils.log_color('\n\nSUCCESS', 'benchmark results', f'{result_dict}\n'))
         self.logger.close()
         self.logger = None
-        return param_result
 
     def write_log(self, message):
         if self.logger is not None:
@@ -134,7 +184,24 @@ class AccuracyPipeline():
             print(message)
 
     def _run(self, description=''):
+        param_result = self._run_import(description)
+
+        ##################################################################
+        # inference
+        if self.settings.run_inference:
+            start_time = time.time()
+            self.write_log(utils.log_color('\nINFO', f'infer {description}', self.run_dir_base + ' - this may take some time...'))
+            output_list = self._infer_frames(description)
+            elapsed_time = time.time() - start_time
+            param_result = self._run_evaluate(output_list, elapsed_time, description)
+        #
+        return param_result
+
+    def _run_import(self, description=''):
         param_result = {}
+        # wall clock time of the phases that were run - recorded in result.yaml
+        # these can be used to estimate the cost of the task if it is run again
+        self.elapsed_time_dict = {}
 
         ##################################################################
         # import.
@@ -146,6 +213,9 @@ class AccuracyPipeline():
             self._import_model(description)
             elapsed_time = time.time() - start_time
             self.write_log(utils.log_color('\nINFO', f'import completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
+            self.elapsed_time_dict['import_elapsed_sec'] = elapsed_time
+            # the inference progress of the earlier artifacts is not valid anymore
+            self._remove_checkpoint()
             # collect the input params
             param_dict = utils.pretty_object(self.pipeline_config)
             param_result = param_dict
@@ -156,31 +226,49 @@ class AccuracyPipeline():
                 #
             #
         #
+        return param_result
 
-        ##################################################################
-        # inference
-        if self.settings.run_inference:
-            start_time = time.time()
-            self.write_log(utils.log_color('\nINFO', f'infer {description}', self.run_dir_base + ' - this may take some time...'))
-            output_list = self._infer_frames(description)
-            elapsed_time = time.time() - start_time
-            self.write_log(utils.log_color('\nINFO', f'infer completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
-            result_dict = self._evaluate(output_list)
-            # collect the results
-            result_dict.update(self.infer_stats_dict)
-            result_dict = utils.pretty_object(result_dict)
-            # collect the params once again, as it might have changed internally
-            param_dict = utils.pretty_object(self.pipeline_config)
-            param_result = dict(result=result_dict, **param_dict)
-            # dump the results
-            if self.settings.enable_logging:
-                with open(self.result_yaml, 'w') as fp:
-                    yaml.safe_dump(param_result, fp, sort_keys=False)
-                #
+    def _run_evaluate(self, output_list, elapsed_time, description=''):
+        self.write_log(utils.log_color('\nINFO', f'infer completed {description}', f'{self.run_dir_base} - {elapsed_time:.0f} sec'))
+        self.elapsed_time_dict['infer_elapsed_sec'] = elapsed_time
+        result_dict = self._evaluate(output_list)
+        # collect the results
+        result_dict.update(self.infer_stats_dict)
+        result_dict.update(self.early_stop_dict)
+        result_dict.update(self.elapsed_time_dict)
+        # peak resident memory of this process (and its worker processes) - used by PipelineRunner to admit parallel tasks
+        result_dict['peak_rss_mb'] = self._get_peak_rss() / constants.MEGA_CONST
+        result_dict = utils.pretty_object(result_dict)
+        # collect the params once again, as it might have changed internally
+        param_dict = utils.pretty_object(self.pipeline_config)
+        param_result = dict(result=result_dict, **param_dict)
+        # dump the results
+        if self.settings.enable_logging:
+            with open(self.result_yaml, 'w') as fp:
+                yaml.safe_dump(param_result, fp, sort_keys=False)
             #
+            self._update_results_db(param_result)
         #
+        self._remove_checkpoint()
         return param_result
 
+    def _get_peak_rss(self):
+        # ru_maxrss is in kilobytes on linux
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return peak_rss * 1024
+
+    def _update_results_db(self, param_result):
+        if self.settings.results_db_file is False:
+            return
+        #
+        results_db_file = utils.get_results_db_file(self.settings)
+        try:
+            results_db = utils.ResultsDatabase(results_db_file)
+            results_db.upsert(self.run_dir, param_result, result_mtime=os.stat(self.result_yaml).st_mtime)
+        except (sqlite3.Error, OSError) as e:
+            self.write_log(utils.log_color('\nWARNING', 'could not update the results database', f'{results_db_file} - {e}'))
+        #
+
     def _import_model(self, description=''):
         session = self.pipeline_config['session']
         calibration_dataset = self.pipeline_config['calibration_dataset']
@@ -191,77 +279,382 @@ class AccuracyPipeline():
             utils.log_color('\nERROR', 'import', f'too few calibration data - calibration dataset size ({len(calibration_dataset)}) '
                                                  f'should be >= calibration_frames ({calibration_frames})')
 
-        calib_data = []
-        for data_index in range(calibration_frames):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = calibration_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            calib_data.append(data)
-        #
+        calib_data = self._get_calibration_data(calibration_dataset, preprocess, calibration_frames)
 
         # this is the actual import
-        self._run_with_log(session.import_model, calib_data)
+        self._run_with_log(session.import_model_cached, calib_data)
+
+    def _get_calibration_data(self, calibration_dataset, preprocess, calibration_frames):
+        # the frames are preprocessed in parallel if prefetch_workers is set.
+        # if the preprocess cache is enabled, the calibration tensors are read from it (memory mapped) when the session
+        # iterates over them, instead of being held in memory - the cache is also shared by the other pipelines / work_dirs.
+        tensor_cache = self._get_preprocess_cache(calibration_dataset, preprocess)
+        if tensor_cache is not None:
+            cache_frame_func = functools.partial(self._cache_frame, calibration_dataset, preprocess, tensor_cache)
+            frames_iter = utils.PrefetchIterator(cache_frame_func, range(calibration_frames),
+                num_workers=self.settings.prefetch_workers, mode=self.settings.prefetch_mode,
+                queue_size=self.settings.prefetch_queue_size)
+            if all(list(frames_iter)):
+                return utils.CachedTensorList(tensor_cache, range(calibration_frames))
+            #
+        #
+        read_frame_func = functools.partial(self._read_frame, calibration_dataset, preprocess, tensor_cache)
+        frames_iter = utils.PrefetchIterator(read_frame_func, range(calibration_frames),
+            num_workers=self.settings.prefetch_workers, mode=self.settings.prefetch_mode,
+            queue_size=self.settings.prefetch_queue_size)
+        calib_data = [data for data, info_dict in frames_iter]
+        return calib_data
 
     def _infer_frames(self, description=''):
+        # with infer_shards > 1, the frames are split across that many worker processes - see _infer_frames_sharded()
+        # with early stopping, the frames are run in this process, so that the inference can stop once the metric converges.
+        # with infer_checkpoint_interval, the inference continues from the checkpoint of an earlier run that did not complete.
+        num_frames = self._get_num_frames()
+        num_shards = 1 if self.settings.early_stop_halfwidth else min(self.settings.infer_shards or 1, num_frames)
+        checkpoint = self._load_checkpoint()
+        self.resume_count = (checkpoint['resume_count'] + 1) if checkpoint is not None else 0
+        self._start_infer(start_session=(num_shards <= 1))
+        # with early stopping, the frames are run in a random order (the same in every run)
+        frame_indices = range(num_frames) if self.infer_state['early_stop'] is None else \
+            [int(i) for i in np.random.default_rng(0).permutation(num_frames)]
+        if checkpoint is not None:
+            frames_done = self._restore_checkpoint(checkpoint)
+            frame_indices = [frame_index for frame_index in frame_indices if frame_index not in frames_done]
+            self.write_log(utils.log_color('\nINFO', 'resuming inference', f'{self.run_dir_base} - '
+                                           f'{len(frames_done)} of {num_frames} frames are done'))
+        #
+        # the shard workers buffer their raw outputs till the end - a checkpoint could list frames that are not in the store
+        if self.settings.infer_checkpoint_interval and num_shards > 1 and self.settings.capture_raw_outputs:
+            self.write_log(utils.log_color('\nWARNING', 'inference checkpoints are not written',
+                                           f'{self.run_dir_base} - they are not supported with infer_shards and capture_raw_outputs'))
+        elif self.settings.infer_checkpoint_interval:
+            self.infer_state['checkpoint_frames'] = 0
+        #
+        pbar_desc = f'infer {description}: {self.run_dir_base}'
+        if num_shards > 1:
+            self._infer_frames_sharded(num_shards, pbar_desc, frame_indices)
+        else:
+            frames_iter = self._get_frames_iter(frame_indices)
+            frames_iter = utils.progress_step(frames_iter, desc=pbar_desc, file=self.logger, position=0)
+            self._infer_frames_loop(frame_indices, frames_iter)
+        #
+        return self._finish_infer()
+
+    def _infer_frames_loop(self, frame_indices, frames_iter):
+        # with infer_batch_size > 1, the frames are given to the session in batches - see session.infer_batch()
+        infer_batch_size = 1 if self.settings.flip_test else (self.settings.infer_batch_size or 1)
+        batch_frames = []
+        for frame_index, (data, info_dict) in zip(frame_indices, frames_iter):
+            if infer_batch_size <= 1:
+                self._infer_frame(frame_index, data, info_dict)
+            else:
+                batch_frames.append((frame_index, data, info_dict))
+                if len(batch_frames) == infer_batch_size:
+                    self._infer_batch(batch_frames)
+                    batch_frames = []
+                #
+            #
+            if self.infer_state['early_stop'] is not None and self.infer_state['early_stop']['converged']:
+                batch_frames = []
+                break
+            #
+        #
+        if len(batch_frames) > 0:
+            self._infer_batch(batch_frames)
+        #
+
+    def _infer_frames_sharded(self, num_shards, pbar_desc, frame_indices):
+        # frame i is run by the worker i % num_shards. each worker has its own session and (if available) its own set of cpus.
+        # the postprocessed outputs are received in the order of the frames and given to the metric here,
+        # so the result is the same as that of running all the frames in this process.
+        cpu_sets = utils.get_cpu_sets(num_shards) or ([None] * num_shards)
+        mp_context = multiprocessing.get_context(method='fork')
+        shard_conns = []
+        shard_procs = []
+        for shard_index in range(num_shards):
+            r_conn, w_conn = mp_context.Pipe(duplex=False)
+            proc = mp_context.Process(target=self._infer_shard_worker,
+                                      args=(shard_index, num_shards, frame_indices, cpu_sets[shard_index], w_conn))
+            proc.start()
+            # close the parent's copy of the write end, so that recv() sees EOF if the worker dies
+            w_conn.close()
+            shard_conns.append(r_conn)
+            shard_procs.append(proc)
+        #
+        try:
+            infer_state = self.infer_state
+            for frame_index in utils.progress_step(frame_indices, desc=pbar_desc, file=self.logger, position=0):
+                message = self._recv_shard_message(shard_conns[frame_index % num_shards])
+                _, message_frame_index, output, frame_values, num_frames_ddr = message
+                assert message_frame_index == frame_index, f'expected frame {frame_index} from the shard, got {message_frame_index}'
+                for name, value in frame_values.items():
+                    infer_state['frame_stats'][name][frame_index] = value
+                #
+                if not np.isnan(frame_values['ddr_transfer']):
+                    infer_state['ddr_transfer'] += frame_values['ddr_transfer']
+                #
+                infer_state['num_frames_ddr'] += num_frames_ddr
+                self._collect_output(frame_index, output)
+            #
+            # the stats of the last frame are used for the values that are not per frame
+            for shard_index, shard_conn in enumerate(shard_conns):
+                _, stats_dict = self._recv_shard_message(shard_conn)
+                if len(frame_indices) > 0 and shard_index == frame_indices[-1] % num_shards:
+                    infer_state['stats_dict'] = stats_dict
+                #
+            #
+        finally:
+            for shard_conn, proc in zip(shard_conns, shard_procs):
+                shard_conn.close()
+                proc.join(timeout=60)
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join()
+                #
+            #
+        #
+
+    def _recv_shard_message(self, shard_conn):
+        try:
+            message = shard_conn.recv()
+        except EOFError:
+            message = ('error', 'the worker process exited unexpectedly')
+        #
+        assert message[0] != 'error', utils.log_color('\nERROR', 'sharded inference failed', f'{self.run_dir_base} - {message[1]}')
+        return message
+
+    def _infer_shard_worker(self, shard_index, num_shards, frame_indices, cpu_set, shard_conn):
         session = self.pipeline_config['session']
+        try:
+            if cpu_set is not None:
+                utils.set_thread_budget(cpu_set)
+            #
+            is_ok = session.start_infer()
+            assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', self.run_dir_base)
+            self.shard_conn = shard_conn
+            if self.settings.capture_raw_outputs:
+                self.output_store = self._open_output_store(writer_id=shard_index)
+            #
+            frame_indices = [frame_index for frame_index in frame_indices if frame_index % num_shards == shard_index]
+            self._infer_frames_loop(frame_indices, self._get_frames_iter(frame_indices))
+            if self.output_store is not None:
+                self.output_store.close()
+                self.output_store = None
+            #
+            shard_conn.send(('done', self.infer_state['stats_dict']))
+        except Exception as e:
+            traceback.print_exc()
+            shard_conn.send(('error', f'shard {shard_index}: {e}'))
+        finally:
+            shard_conn.close()
+        #
+
+    def _get_num_frames(self):
         input_dataset = self.pipeline_config['input_dataset']
-        assert input_dataset is not None, f'got input_dataset={input_dataset}. please check settings.dataset_loading'
-        preprocess = self.pipeline_config['preprocess']
-        postprocess = self.pipeline_config['postprocess']
-        run_dir_base = os.path.split(session.get_param('run_dir'))[-1]
         num_frames = self.pipeline_config.get('num_frames', self.settings.num_frames)
         num_frames = min(len(input_dataset), num_frames) if num_frames else len(input_dataset)
+        return num_frames
 
-        is_ok = session.start_infer()
-        assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', run_dir_base)
+    def _get_frames_iter(self, frame_indices, postprocess=None):
+        # read and preprocess the frames ahead of inference, if prefetch_workers is set
+        # the frames are still handed out in the order of frame_indices
+        input_dataset = self.pipeline_config['input_dataset']
+        preprocess = self.pipeline_config['preprocess']
+        postprocess = postprocess if postprocess is not None else self.pipeline_config['postprocess']
+        tensor_cache = self._get_preprocess_cache(input_dataset, preprocess, postprocess)
+        read_frame_func = functools.partial(self._read_frame, input_dataset, preprocess, tensor_cache)
+        frames_iter = utils.PrefetchIterator(read_frame_func, frame_indices,
+            num_workers=self.settings.prefetch_workers, mode=self.settings.prefetch_mode,
+            queue_size=self.settings.prefetch_queue_size)
+        return frames_iter
 
-        invoke_time = 0.0
-        core_time = 0.0
-        subgraph_time = 0.0
-        ddr_transfer = 0.0
-        num_frames_ddr = 0
+    def _start_infer(self, start_session=True, capture_outputs=True):
+        session = self.pipeline_config['session']
+        input_dataset = self.pipeline_config['input_dataset']
+        assert input_dataset is not None, f'got input_dataset={input_dataset}. please check settings.dataset_loading'
+        num_frames = self._get_num_frames()
 
-        output_list = []
-        pbar_desc = f'infer {description}: {run_dir_base}'
-        for data_index in utils.progress_step(range(num_frames), desc=pbar_desc, file=self.logger, position=0):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = input_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
-            invoke_time += info_dict['session_invoke_time']
+        # start_session is False when the session is started in the worker processes instead
+        if start_session:
+            is_ok = session.start_infer()
+            assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', self.run_dir_base)
+        #
 
+        # the raw outputs of an earlier run are removed (unless the inference is resumed from a checkpoint).
+        # with sharded inference, each worker writes its part of the store
+        if capture_outputs and self.settings.capture_raw_outputs:
+            if self.resume_count == 0:
+                utils.OutputStore.remove(self._get_output_store_dir())
+            #
+            self.output_store = self._open_output_store(writer_id=0) if start_session else None
+        #
+
+        # per frame values - the times are in seconds and the ddr transfer is in bytes
+        # ddr_transfer is nan for the frames in which it is not available
+        frame_stats = {name: np.zeros(num_frames, dtype=np.float64) for name in ('invoke_time', 'core_time', 'subgraph_time')}
+        frame_stats['ddr_transfer'] = np.full(num_frames, np.nan, dtype=np.float64)
+
+        # if all the metrics support it, the outputs are folded into the metric frame by frame (update/finalize)
+        # instead of being held in output_list till the end of inference
+        metrics, metrics_options = self._get_metrics()
+        self.metrics_streamed = self.settings.stream_metrics and \
+            all(callable(getattr(m, 'update', None)) and callable(getattr(m, 'finalize', None)) for m in metrics)
+        # a pipeline that failed in the middle of the inference may have left its partial state in a (shared) dataset.
+        # a checkpoint, if any, is restored after this - see _restore_checkpoint()
+        for m in metrics:
+            if callable(getattr(m, 'reset_metric', None)):
+                m.reset_metric()
+            #
+        #
+
+        # the state that is carried from one frame to the next - see _infer_frame()
+        self.infer_state = dict(num_frames=num_frames, frame_stats=frame_stats, ddr_transfer=0.0, num_frames_ddr=0,
+                                num_frames_ddr_sent=0, metrics=metrics, metrics_options=metrics_options,
+                                output_list=[], stats_dict=None, early_stop=self._start_early_stop(metrics),
+                                frames_done=[], checkpoint_frames=None)
+
+    def _infer_frame(self, frame_index, data, info_dict):
+        session = self.pipeline_config['session']
+        infer_state = self.infer_state
+        frame_stats = infer_state['frame_stats']
+        info_dict['dataset_info'] = self.dataset_info
+        output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
+        stats_dict = session.infer_stats()
+        infer_state['ddr_transfer'], infer_state['num_frames_ddr'] = self._update_frame_stats(frame_stats, frame_index,
+            info_dict, stats_dict, infer_state['ddr_transfer'], infer_state['num_frames_ddr'])
+        if self.settings.flip_test:
+            outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
+            info_dict['outputs_flip'] = outputs_flip
             stats_dict = session.infer_stats()
-            core_time += stats_dict['core_time']
-            subgraph_time += stats_dict['subgraph_time']
-            if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                num_frames_ddr += 1
-           
-            if self.settings.flip_test:
-                outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
-                info_dict['outputs_flip'] = outputs_flip
-                invoke_time += info_dict['session_invoke_time']
-
-                stats_dict = session.infer_stats()
-                core_time += stats_dict['core_time']
-                subgraph_time += stats_dict['subgraph_time']
-                if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                    ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                    num_frames_ddr += 1
-            else:
-                info_dict['outputs_flip'] = None
+            infer_state['ddr_transfer'], infer_state['num_frames_ddr'] = self._update_frame_stats(frame_stats, frame_index,
+                info_dict, stats_dict, infer_state['ddr_transfer'], infer_state['num_frames_ddr'])
+        else:
+            info_dict['outputs_flip'] = None
+
+        infer_state['stats_dict'] = stats_dict
+        self._postprocess_frame(frame_index, output, info_dict)
+
+    def _infer_batch(self, batch_frames):
+        session = self.pipeline_config['session']
+        frame_indices, batch_data, batch_info_dicts = zip(*batch_frames)
+        if not session.supports_batch(batch_data):
+            # run the frames one by one, so that the stats of each frame are available
+            for frame_index, data, info_dict in batch_frames:
+                self._infer_frame(frame_index, data, info_dict)
+            #
+            return
+        #
+        infer_state = self.infer_state
+        for info_dict in batch_info_dicts:
+            info_dict['dataset_info'] = self.dataset_info
+            info_dict['outputs_flip'] = None
+        #
+        outputs, batch_info_dicts = self._run_with_log(session.infer_batch, batch_data, batch_info_dicts)
+        stats_dict = session.infer_stats()
+        for frame_index, output, info_dict in zip(frame_indices, outputs, batch_info_dicts):
+            infer_state['ddr_transfer'], infer_state['num_frames_ddr'] = self._update_frame_stats(infer_state['frame_stats'],
+                frame_index, info_dict, stats_dict, infer_state['ddr_transfer'], infer_state['num_frames_ddr'])
+            self._postprocess_frame(frame_index, output, info_dict)
+        #
+        infer_state['stats_dict'] = stats_dict
+
+    def _postprocess_frame(self, frame_index, output, info_dict):
+        postprocess = self.pipeline_config['postprocess']
+        infer_state = self.infer_state
+        if self.output_store is not None:
+            self.output_store.put(frame_index, output, info_dict)
+        #
+        output, info_dict = postprocess(output, info_dict)
+        if self.shard_conn is not None:
+            # in a worker process of _infer_frames_sharded() - the output and the stats of the frame are sent to the main process
+            frame_values = {name: values[frame_index] for name, values in infer_state['frame_stats'].items()}
+            num_frames_ddr = infer_state['num_frames_ddr'] - infer_state['num_frames_ddr_sent']
+            infer_state['num_frames_ddr_sent'] = infer_state['num_frames_ddr']
+            self.shard_conn.send(('frame', frame_index, output, frame_values, num_frames_ddr))
+        else:
+            self._collect_output(frame_index, output)
+        #
+
+    def _collect_output(self, frame_index, output):
+        infer_state = self.infer_state
+        if self.metrics_streamed:
+            for m, m_options in zip(infer_state['metrics'], infer_state['metrics_options']):
+                m.update(output, frame_index, **m_options)
+            #
+            self._update_early_stop(frame_index)
+        else:
+            infer_state['output_list'].append(output)
+        #
+        infer_state['frames_done'].append(frame_index)
+        if infer_state['checkpoint_frames'] is not None:
+            infer_state['checkpoint_frames'] += 1
+            # there is no checkpoint after the last frame - the result is written right after that
+            if infer_state['checkpoint_frames'] >= self.settings.infer_checkpoint_interval and \
+                    len(infer_state['frames_done']) < infer_state['num_frames']:
+                infer_state['checkpoint_frames'] = 0
+                self._save_checkpoint()
+            #
+        #
 
-            output, info_dict = postprocess(output, info_dict)
-            output_list.append(output)
+    def _finish_infer(self, warmup_frames=None):
+        # warmup_frames: the first frames that are left out of the latency distribution - latency_warmup_frames by default
+        warmup_frames = self.settings.latency_warmup_frames if warmup_frames is None else warmup_frames
+        infer_state = self.infer_state
+        self.infer_state = None
+        if self.output_store is not None:
+            self.output_store.close()
+            self.output_store = None
         #
+        num_frames = infer_state['num_frames']
+        frame_stats = infer_state['frame_stats']
+        self.early_stop_dict = {}
+        early_stop = infer_state.get('early_stop', None)
+        frame_indices = np.arange(num_frames)
+        if early_stop is not None and early_stop['estimator'] is not None:
+            # only the frames that were run are in the stats
+            frame_indices = np.array(early_stop['frame_indices'], dtype=np.int64)
+            frame_stats = {name: values[frame_indices] for name, values in frame_stats.items()}
+            num_frames = len(frame_indices)
+            estimate = early_stop['estimator'].estimate()
+            self.early_stop_dict = {'early_stop_frames': num_frames, 'early_stop_converged': early_stop['converged'],
+                'early_stop_confidence': self.settings.early_stop_confidence, 'early_stop_ci_low': estimate['low'],
+                'early_stop_ci_high': estimate['high'], 'early_stop_ci_halfwidth': estimate['halfwidth']}
+        #
+        ddr_transfer = infer_state['ddr_transfer']
+        num_frames_ddr = infer_state['num_frames_ddr']
+        stats_dict = infer_state['stats_dict']
+        output_list = infer_state['output_list']
+        # the warm-up frames are left out of both the average and the distribution of the latency (at least one frame is kept)
+        warmup_frames = max(min(warmup_frames, num_frames - 1), 0)
         # compute and populate final stats so that it can be used in result
         self.infer_stats_dict = {
             'num_subgraphs': stats_dict['num_subgraphs'],
-            #'infer_time_invoke_ms': invoke_time * constants.MILLI_CONST / num_frames,
-            'infer_time_core_ms': core_time * constants.MILLI_CONST / num_frames,
-            'infer_time_subgraph_ms': subgraph_time * constants.MILLI_CONST / num_frames,
+            #'infer_time_invoke_ms': frame_stats['invoke_time'].sum() * constants.MILLI_CONST / num_frames,
+            'infer_time_core_ms': frame_stats['core_time'][warmup_frames:].mean() * constants.MILLI_CONST,
+            'infer_time_subgraph_ms': frame_stats['subgraph_time'][warmup_frames:].mean() * constants.MILLI_CONST,
             'ddr_transfer_mb': (ddr_transfer / num_frames_ddr / constants.MEGA_CONST) if num_frames_ddr > 0 else 0
         }
+        # distribution of the latency - the tail latency and jitter are not visible in the average.
+        # core_time and subgraph_time are measured only with TIDL (they are 0 otherwise) - invoke_time for all the sessions
+        for name, stats_prefix in (('invoke_time', 'infer_time_invoke'), ('core_time', 'infer_time_core'),
+                                   ('subgraph_time', 'infer_time_subgraph')):
+            if not np.any(frame_stats[name]):
+                continue
+            #
+            latency_stats = utils.latency_stats(frame_stats[name] * constants.MILLI_CONST,
+                warmup_frames=warmup_frames, histogram_bins=self.settings.latency_histogram_bins)
+            for stats_key, stats_value in latency_stats.items():
+                if stats_key == 'histogram':
+                    self.infer_stats_dict[f'{stats_prefix}_histogram'] = {'bin_edges_ms': stats_value['bin_edges'],
+                                                                          'counts': stats_value['counts']}
+                else:
+                    self.infer_stats_dict[f'{stats_prefix}_{stats_key}_ms'] = stats_value
+                #
+            #
+        #
+        if self.settings.latency_frames_format is not None and self.settings.enable_logging:
+            self._write_frame_stats(frame_stats, frame_indices, self.settings.latency_frames_format)
+        #
         if 'perfsim_time' in stats_dict:
             self.infer_stats_dict.update({'perfsim_time_ms': stats_dict['perfsim_time'] * constants.MILLI_CONST})
         #
@@ -273,7 +666,292 @@ class AccuracyPipeline():
         #
         return output_list
 
-    def _evaluate(self, output_list):
+    def _start_early_stop(self, metrics):
+        # early stopping needs a single metric that is updated frame by frame - see _update_early_stop()
+        if not self.settings.early_stop_halfwidth:
+            return None
+        elif not self.metrics_streamed or len(metrics) != 1:
+            self.write_log(utils.log_color('\nWARNING', 'early stopping is not done',
+                                           f'{self.run_dir_base} - it needs a single metric with stream_metrics'))
+            return None
+        #
+        return dict(estimator=None, frame_indices=[], metric_state=None, converged=False)
+
+    def _update_early_stop(self, frame_index):
+        # the contribution of the frame is taken from the state of the metric: the value of the frame in the
+        # AverageMeter (classification) or the change in the confusion matrix (segmentation)
+        early_stop = self.infer_state['early_stop']
+        if early_stop is None:
+            return
+        #
+        metric = self.infer_state['metrics'][0]
+        # the state is read through the dataset, as it may hold more than the metric (eg. the label cache in COCOSegmentation)
+        metric_state = metric.get_metric_checkpoint() if callable(getattr(metric, 'get_metric_checkpoint', None)) \
+            else getattr(metric, 'metric_state', None)
+        if isinstance(metric_state, dict) and 'cmatrix' in metric_state:
+            metric_state = metric_state['cmatrix']
+        #
+        if early_stop['estimator'] is None:
+            if isinstance(metric_state, utils.AverageMeter):
+                kind = 'mean'
+            elif isinstance(metric_state, np.ndarray) and metric_state.ndim == 2:
+                kind = 'cmatrix'
+            else:
+                self.write_log(utils.log_color('\nWARNING', 'early stopping is not done',
+                                               f'{self.run_dir_base} - it is supported for classification and segmentation'))
+                self.infer_state['early_stop'] = None
+                return
+            #
+            early_stop['estimator'] = utils.SequentialEstimator(kind, confidence=self.settings.early_stop_confidence)
+        #
+        estimator = early_stop['estimator']
+        if estimator.kind == 'mean':
+            estimator.add(metric_state.val)
+        else:
+            # confusion_matrix() returns a new matrix, so the previous one is not modified
+            previous_state = early_stop['metric_state']
+            estimator.add(metric_state - previous_state if previous_state is not None else metric_state)
+            early_stop['metric_state'] = metric_state
+        #
+        early_stop['frame_indices'].append(frame_index)
+        if estimator.count >= self.settings.early_stop_min_frames and \
+                estimator.count % self.settings.early_stop_check_interval == 0:
+            estimate = estimator.estimate()
+            if estimate['halfwidth'] <= self.settings.early_stop_halfwidth:
+                early_stop['converged'] = True
+                self.write_log(utils.log_color('\nINFO', 'early stopping', f'{self.run_dir_base} - {estimator.count} frames, '
+                    f'{estimate["value"]:.3f} [{estimate["low"]:.3f}, {estimate["high"]:.3f}]'))
+            #
+        #
+
+    def _get_checkpoint_key(self):
+        # a checkpoint can be used only with the same imported model (param.yaml is written at import) and inference settings
+        param_yaml = None
+        if os.path.exists(self.param_yaml):
+            with open(self.param_yaml) as fp:
+                param_yaml = fp.read()
+            #
+        #
+        return utils.hash_object(dict(version=self.INFER_CHECKPOINT_VERSION, param_yaml=param_yaml,
+            num_frames=self._get_num_frames(), metrics_streamed=self.settings.stream_metrics,
+            early_stop=self.settings.early_stop_halfwidth, flip_test=self.settings.flip_test))
+
+    def _save_checkpoint(self):
+        # the frames that are done, with the metric state (or the postprocessed outputs) and the stats accumulated so far
+        infer_state = self.infer_state
+        if self.output_store is not None:
+            # the raw outputs of the frames in the checkpoint must be in the store
+            self.output_store.flush()
+        #
+        if self.metrics_streamed:
+            metric_checkpoints = [m.get_metric_checkpoint() if hasattr(m, 'get_metric_checkpoint') else getattr(m, 'metric_state', None)
+                                  for m in infer_state['metrics']]
+            output_list = None
+        else:
+            metric_checkpoints = None
+            output_list = infer_state['output_list']
+        #
+        checkpoint = dict(checkpoint_key=self._get_checkpoint_key(), resume_count=self.resume_count,
+            frames_done=infer_state['frames_done'], frame_stats=infer_state['frame_stats'],
+            ddr_transfer=infer_state['ddr_transfer'], num_frames_ddr=infer_state['num_frames_ddr'],
+            stats_dict=infer_state['stats_dict'], metric_checkpoints=metric_checkpoints, output_list=output_list,
+            early_stop=infer_state['early_stop'])
+        try:
+            utils.write_file_atomic(self.checkpoint_file, lambda fp: pickle.dump(checkpoint, fp, protocol=pickle.HIGHEST_PROTOCOL))
+        except (OSError, TypeError, AttributeError, pickle.PicklingError) as e:
+            # the checkpoint is not tried again for this run
+            infer_state['checkpoint_frames'] = None
+            self.write_log(utils.log_color('\nWARNING', 'inference checkpoint could not be written', f'{self.run_dir_base} - {e}'))
+        #
+
+    def _load_checkpoint(self):
+        if not self.settings.infer_checkpoint_interval or not os.path.exists(self.checkpoint_file):
+            return None
+        #
+        try:
+            with open(self.checkpoint_file, 'rb') as fp:
+                checkpoint = pickle.load(fp)
+            #
+        except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError) as e:
+            self.write_log(utils.log_color('\nWARNING', 'inference checkpoint could not be read', f'{self.run_dir_base} - {e}'))
+            return None
+        #
+        if checkpoint.get('checkpoint_key', None) != self._get_checkpoint_key():
+            self.write_log(utils.log_color('\nINFO', 'inference checkpoint is not used', f'{self.run_dir_base} - the config has changed'))
+            return None
+        #
+        return checkpoint
+
+    def _restore_checkpoint(self, checkpoint):
+        infer_state = self.infer_state
+        for key in ('frames_done', 'frame_stats', 'ddr_transfer', 'num_frames_ddr', 'stats_dict', 'early_stop'):
+            infer_state[key] = checkpoint[key]
+        #
+        # the shard workers report only the ddr frames counted after the restore
+        infer_state['num_frames_ddr_sent'] = infer_state['num_frames_ddr']
+        if self.metrics_streamed:
+            for m, metric_checkpoint in zip(infer_state['metrics'], checkpoint['metric_checkpoints']):
+                if hasattr(m, 'set_metric_checkpoint'):
+                    m.set_metric_checkpoint(metric_checkpoint)
+                else:
+                    m.metric_state = metric_checkpoint
+                #
+            #
+        else:
+            infer_state['output_list'] = checkpoint['output_list']
+        #
+        return set(infer_state['frames_done'])
+
+    def _remove_checkpoint(self):
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        #
+
+    def _get_output_store_dir(self):
+        return os.path.join(self.run_dir, 'raw_outputs')
+
+    def _open_output_store(self, writer_id):
+        # a resumed inference writes new chunks next to those written before
+        writer_id = writer_id if self.resume_count == 0 else f'{writer_id}_r{self.resume_count}'
+        compress = self.settings.capture_raw_outputs != 'uncompressed'
+        return utils.OutputStore(self._get_output_store_dir(), mode='w', writer_id=writer_id, compress=compress)
+
+    def rescore(self, description=''):
+        # run the postprocess and the metric again on the raw outputs stored by an earlier inference (capture_raw_outputs),
+        # without starting the session - no runtime is loaded. the infer stats in the earlier result.yaml are kept.
+        output_store_dir = self._get_output_store_dir()
+        assert utils.OutputStore.exists(output_store_dir), \
+            utils.log_color('\nERROR', 'no raw outputs to rescore', f'{output_store_dir} - run inference with capture_raw_outputs set')
+        self._start(start_session=False)
+        start_time = time.time()
+        self.write_log(utils.log_color('\nINFO', f'rescore {description}', self.run_dir_base))
+        output_store = utils.OutputStore(output_store_dir, mode='r')
+        self._start_infer(start_session=False, capture_outputs=False)
+        frame_indices = output_store.frame_indices()
+        # a metric that is updated frame by frame can be given any set of frames (for example after early stopping)
+        assert frame_indices == list(range(self.infer_state['num_frames'])) or \
+            (self.metrics_streamed and set(frame_indices) <= set(range(self.infer_state['num_frames']))), \
+            utils.log_color('\nERROR', 'incomplete raw outputs', f'{output_store_dir} has {len(frame_indices)} frames, '
+                            f'expected {self.infer_state["num_frames"]}')
+        # the input data is not stored - it is read again if the postprocess needs it (for example to save images)
+        postprocess = self.pipeline_config['postprocess']
+        postprocess_transforms = postprocess.transforms if isinstance(postprocess, utils.TransformsCompose) else [postprocess]
+        frames_iter = iter(self._get_frames_iter(frame_indices)) \
+            if any(getattr(t, 'uses_input_data', False) for t in postprocess_transforms) else None
+        pbar_desc = f'rescore {description}: {self.run_dir_base}'
+        for frame_index in utils.progress_step(frame_indices, desc=pbar_desc, file=self.logger, position=0):
+            output, info_dict = output_store.get(frame_index)
+            info_dict['dataset_info'] = self.dataset_info
+            if frames_iter is not None:
+                data, input_info_dict = next(frames_iter)
+                info_dict['data'] = input_info_dict.get('data', None)
+            #
+            self._postprocess_frame(frame_index, output, info_dict)
+        #
+        output_store.close()
+        output_list = self.infer_state['output_list']
+        self.infer_state = None
+        result_dict = {}
+        if os.path.exists(self.result_yaml):
+            with open(self.result_yaml) as fp:
+                result_dict = (yaml.safe_load(fp) or {}).get('result', {}) or {}
+            #
+        #
+        result_dict.update(self._evaluate(output_list))
+        result_dict['rescore_elapsed_sec'] = time.time() - start_time
+        result_dict = utils.pretty_object(result_dict)
+        param_dict = utils.pretty_object(self.pipeline_config)
+        param_result = dict(result=result_dict, **param_dict)
+        if self.settings.enable_logging:
+            with open(self.result_yaml, 'w') as fp:
+                yaml.safe_dump(param_result, fp, sort_keys=False)
+            #
+            self._update_results_db(param_result)
+        #
+        self._finish(param_result)
+        return param_result
+
+    def _update_frame_stats(self, frame_stats, frame_index, info_dict, stats_dict, ddr_transfer, num_frames_ddr):
+        # with flip_test, the values of both the inferences of a frame are added
+        frame_stats['invoke_time'][frame_index] += info_dict['session_invoke_time']
+        frame_stats['core_time'][frame_index] += stats_dict['core_time']
+        frame_stats['subgraph_time'][frame_index] += stats_dict['subgraph_time']
+        if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
+            frame_ddr_transfer = (stats_dict['write_total'] + stats_dict['read_total'])
+            frame_stats['ddr_transfer'][frame_index] = frame_ddr_transfer if np.isnan(frame_stats['ddr_transfer'][frame_index]) \
+                else (frame_stats['ddr_transfer'][frame_index] + frame_ddr_transfer)
+            ddr_transfer += frame_ddr_transfer
+            num_frames_ddr += 1
+        #
+        return ddr_transfer, num_frames_ddr
+
+    def _write_frame_stats(self, frame_stats, frame_indices, file_format):
+        # frame_indices: the frame of each entry in frame_stats - a (permuted) subset of the frames after early stop
+        frame_table = np.zeros(len(frame_stats['core_time']), dtype=[('frame_index', np.int64),
+            ('invoke_time_ms', np.float64), ('core_time_ms', np.float64),
+            ('subgraph_time_ms', np.float64), ('ddr_transfer_mb', np.float64)])
+        frame_table['frame_index'] = frame_indices
+        frame_table['invoke_time_ms'] = frame_stats['invoke_time'] * constants.MILLI_CONST
+        frame_table['core_time_ms'] = frame_stats['core_time'] * constants.MILLI_CONST
+        frame_table['subgraph_time_ms'] = frame_stats['subgraph_time'] * constants.MILLI_CONST
+        frame_table['ddr_transfer_mb'] = frame_stats['ddr_transfer'] / constants.MEGA_CONST
+        if file_format == 'csv':
+            np.savetxt(self.latency_frames_file + '.csv', frame_table, delimiter=',',
+                       fmt=['%d', '%.6f', '%.6f', '%.6f', '%.6f'], header=','.join(frame_table.dtype.names), comments='')
+        elif file_format == 'npy':
+            np.save(self.latency_frames_file + '.npy', frame_table)
+        else:
+            assert False, f'invalid latency_frames_format {file_format}'
+        #
+
+    def _read_frame(self, dataset, preprocess, tensor_cache, data_index):
+        # dataset_info is added back by the caller - it need not be transferred from a prefetch process
+        label_offset_pred = self.pipeline_config.get('metric',{}).get('label_offset_pred',None)
+        cached_frame = tensor_cache.get(data_index) if tensor_cache is not None else None
+        if cached_frame is not None:
+            data, info_dict = cached_frame
+            info_dict['label_offset_pred'] = label_offset_pred
+            return data, info_dict
+        #
+        info_dict = {'label_offset_pred': label_offset_pred}
+        data = dataset[data_index]
+        data, info_dict = preprocess(data, info_dict)
+        if tensor_cache is not None:
+            tensor_cache.put(data_index, data, info_dict)
+        #
+        return data, info_dict
+
+    def _cache_frame(self, dataset, preprocess, tensor_cache, data_index):
+        # make sure that the frame is in the cache - returns False if it could not be cached
+        if tensor_cache.contains(data_index):
+            return True
+        #
+        info_dict = {}
+        data = dataset[data_index]
+        data, info_dict = preprocess(data, info_dict)
+        return tensor_cache.put(data_index, data, info_dict)
+
+    def _get_preprocess_cache(self, dataset, preprocess, postprocess=None):
+        # the preprocessed tensors are shared by the pipelines that use the same dataset and the same preprocess transforms.
+        # the decoded image in info_dict['data'] is not cached - so the cache is not used if the postprocess needs it.
+        cache_path = self.settings.preprocess_cache_path
+        if not cache_path or not isinstance(preprocess, utils.TransformsCompose) or not hasattr(dataset, 'kwargs'):
+            return None
+        #
+        postprocess_transforms = postprocess.transforms if isinstance(postprocess, utils.TransformsCompose) else [postprocess]
+        if any(getattr(t, 'uses_input_data', False) for t in postprocess_transforms):
+            return None
+        #
+        # the calibration tensors are shared across the models, work_dirs and tensor_bits - so the entries that point
+        # into the run_dir (eg. dataset_info, set to the dataset.yaml of this run_dir in __init__) are not in the key
+        dataset_kwargs = {k: v for k, v in dataset.kwargs.items() if k != 'dataset_info' and
+                          not (isinstance(v, str) and v.startswith(self.run_dir))}
+        cache_key = utils.hash_object(dict(version=self.PREPROCESS_CACHE_VERSION,
+            dataset=utils.canonical_state([type(dataset), dataset_kwargs]),
+            preprocess=utils.canonical_state(preprocess.transforms)))
+        return utils.TensorCache(cache_path, cache_key)
+
+    def _get_metrics(self):
         session = self.pipeline_config['session']
         # if metric is not given use input_dataset
         if 'metric' in self.pipeline_config and callable(self.pipeline_config['metric']):
@@ -287,11 +965,18 @@ class AccuracyPipeline():
         metric_options['run_dir'] = run_dir
         metric = utils.as_list(metric)
         metric_options = utils.as_list(metric_options)
+        return metric, metric_options
+
+    def _evaluate(self, output_list):
+        session = self.pipeline_config['session']
+        metric, metric_options = self._get_metrics()
+        run_dir = session.get_param('run_dir')
         output_dict = {}
         inference_path = os.path.split(run_dir)[-1]
         output_dict.update({'infer_path':inference_path})
         for m, m_options in zip(metric, metric_options):
-            output = m(output_list, **m_options)
+            # with metrics_streamed, the outputs have already been given to the metric in update()
+            output = m.finalize(**m_options) if self.metrics_streamed else m(output_list, **m_options)
             output_dict.update(output)
         #
         return output_dict
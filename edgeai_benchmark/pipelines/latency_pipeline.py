@@ -0,0 +1,175 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import time
+import numpy as np
+
+from .. import utils, constants
+from .accuracy_pipeline import *
+
+
+class LatencyPipeline(AccuracyPipeline):
+    # measures the latency of a session on a few fixed inputs - no dataset frames are decoded beyond those, and no metric is run.
+    # the inputs are preprocessed frames of the input_dataset, or random tensors of the shapes and types of the model inputs.
+    # the warm-up inferences are not measured. the measured inferences are run in one or more rounds (latency_repeats).
+    # the results go into result_latency.yaml, so that the result.yaml of the accuracy pipeline is not overwritten.
+    def __init__(self, settings, pipeline_config):
+        super().__init__(settings, pipeline_config)
+        self.result_yaml = os.path.join(self.run_dir, 'result_latency.yaml')
+        self.latency_frames_file = os.path.join(self.run_dir, 'latency_frames_perf')
+        # the inference checkpoint in the run_dir is that of the accuracy pipeline - it is neither written nor removed here
+        self.checkpoint_file = None
+
+    def _get_latency_param(self, name):
+        return self.pipeline_config.get(name, self.settings[name])
+
+    def _update_results_db(self, param_result):
+        # the results database holds the results of the accuracy pipeline
+        pass
+
+    def _remove_checkpoint(self):
+        pass
+
+    def _run(self, description=''):
+        param_result = self._run_import(description)
+        if self.settings.run_inference:
+            start_time = time.time()
+            self.write_log(utils.log_color('\nINFO', f'latency {description}', self.run_dir_base + ' - this may take some time...'))
+            self._infer_latency(description)
+            elapsed_time = time.time() - start_time
+            param_result = self._run_evaluate([], elapsed_time, description)
+        #
+        return param_result
+
+    def _evaluate(self, output_list):
+        output_dict = {'infer_path': self.run_dir_base}
+        output_dict.update(self.latency_info_dict)
+        return output_dict
+
+    def _infer_latency(self, description=''):
+        session = self.pipeline_config['session']
+        is_ok = session.start_infer()
+        assert is_ok, utils.log_color('\nERROR', f'start_infer() did not succeed for:', self.run_dir_base)
+        latency_inputs = self._get_latency_param('latency_inputs')
+        warmup_iterations = self._get_latency_param('latency_warmup_iterations')
+        iterations = self._get_latency_param('latency_iterations')
+        repeats = self._get_latency_param('latency_repeats')
+        if latency_inputs == 'synthetic':
+            inputs = self._get_synthetic_inputs()
+        elif latency_inputs == 'dataset':
+            inputs = self._get_dataset_inputs()
+        else:
+            assert False, f'invalid latency_inputs {latency_inputs}'
+        #
+        for iteration in range(warmup_iterations):
+            self._run_with_log(session.infer_frame, inputs[iteration % len(inputs)], {})
+        #
+        # the measured inferences are the frames of _finish_infer() - so the infer stats are the same as of the accuracy pipeline
+        num_frames = iterations * repeats
+        frame_stats = {name: np.zeros(num_frames, dtype=np.float64) for name in ('invoke_time', 'core_time', 'subgraph_time')}
+        frame_stats['ddr_transfer'] = np.full(num_frames, np.nan, dtype=np.float64)
+        self.infer_state = dict(num_frames=num_frames, frame_stats=frame_stats, ddr_transfer=0.0, num_frames_ddr=0,
+                                output_list=[], stats_dict=None)
+        # the wall time around infer_frame on the host, including the overheads of the session
+        wall_times = np.zeros(num_frames, dtype=np.float64)
+        pbar_desc = f'latency {description}: {self.run_dir_base}'
+        for frame_index in utils.progress_step(range(num_frames), desc=pbar_desc, file=self.logger, position=0):
+            info_dict = {}
+            start_time = time.perf_counter()
+            output, info_dict = self._run_with_log(session.infer_frame, inputs[frame_index % len(inputs)], info_dict)
+            wall_times[frame_index] = time.perf_counter() - start_time
+            stats_dict = session.infer_stats()
+            self.infer_state['ddr_transfer'], self.infer_state['num_frames_ddr'] = self._update_frame_stats(frame_stats,
+                frame_index, info_dict, stats_dict, self.infer_state['ddr_transfer'], self.infer_state['num_frames_ddr'])
+            self.infer_state['stats_dict'] = stats_dict
+        #
+        # the warm-up is already done by latency_warmup_iterations
+        self._finish_infer(warmup_frames=0)
+        self.latency_info_dict = dict(latency_inputs=latency_inputs, latency_input_frames=len(inputs),
+            latency_warmup_iterations=warmup_iterations, latency_iterations=iterations, latency_repeats=repeats)
+        for name, stats_prefix in (('invoke_time', 'host_invoke_time'), (None, 'host_wall_time')):
+            values = (frame_stats[name] if name is not None else wall_times) * constants.MILLI_CONST
+            self.latency_info_dict[f'{stats_prefix}_ms'] = float(values.mean())
+            latency_stats = utils.latency_stats(values, histogram_bins=self.settings.latency_histogram_bins)
+            latency_stats.pop('histogram', None)
+            for stats_key, stats_value in latency_stats.items():
+                self.latency_info_dict[f'{stats_prefix}_{stats_key}_ms'] = stats_value
+            #
+        #
+        # the mean of each round - shows the drift across the rounds (for example thermal throttling)
+        if repeats > 1:
+            for name, stats_prefix in (('core_time', 'infer_time_core'), (None, 'host_wall_time')):
+                values = (frame_stats[name] if name is not None else wall_times) * constants.MILLI_CONST
+                self.latency_info_dict[f'{stats_prefix}_repeat_mean_ms'] = [float(v) for v in values.reshape(repeats, iterations).mean(axis=1)]
+            #
+        #
+
+    def _get_dataset_inputs(self):
+        input_dataset = self.pipeline_config['input_dataset']
+        preprocess = self.pipeline_config['preprocess']
+        num_inputs = max(min(self._get_latency_param('latency_input_frames'), len(input_dataset)), 1)
+        tensor_cache = self._get_preprocess_cache(input_dataset, preprocess)
+        return [self._read_frame(input_dataset, preprocess, tensor_cache, frame_index)[0] for frame_index in range(num_inputs)]
+
+    def _get_synthetic_inputs(self):
+        # random tensors of the shapes and types in the input_details of the session (available after start_infer).
+        # the dimensions that are not fixed (for example the batch size) are set to 1.
+        session = self.pipeline_config['session']
+        input_details = session.get_param('input_details')
+        assert input_details, utils.log_color('\nERROR', 'input_details are not available for synthetic inputs', self.run_dir_base)
+        num_inputs = max(self._get_latency_param('latency_input_frames'), 1)
+        rng = np.random.default_rng(0)
+        inputs = []
+        for input_index in range(num_inputs):
+            in_data = []
+            for input_detail in input_details:
+                shape = [dim if isinstance(dim, (int, np.integer)) and dim > 0 else 1 for dim in input_detail['shape']]
+                dtype = self._get_input_dtype(input_detail['type'])
+                if np.issubdtype(dtype, np.floating):
+                    in_data.append(rng.uniform(0, 255, size=shape).astype(dtype))
+                elif np.issubdtype(dtype, np.bool_):
+                    in_data.append(rng.integers(0, 2, size=shape).astype(dtype))
+                else:
+                    in_data.append(rng.integers(0, min(np.iinfo(dtype).max, 255)+1, size=shape).astype(dtype))
+                #
+            #
+            inputs.append(in_data[0] if len(in_data) == 1 else tuple(in_data))
+        #
+        return inputs
+
+    def _get_input_dtype(self, type_name):
+        # the type names are for example 'tensor(float)' (onnxruntime), "<class 'numpy.float32'>" (tflite) or 'float32'
+        type_name = str(type_name)
+        type_name = type_name.split('numpy.')[-1].strip("'>") if 'numpy.' in type_name else type_name
+        type_name = type_name[len('tensor('):-1] if type_name.startswith('tensor(') else type_name
+        type_name = {'float': 'float32', 'double': 'float64', 'bool': 'bool'}.get(type_name, type_name)
+        try:
+            return np.dtype(type_name)
+        except TypeError:
+            return np.dtype(np.float32)
+        #
@@ -0,0 +1,155 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import copy
+import time
+import traceback
+
+from .. import utils, datasets
+from .accuracy_pipeline import *
+
+
+class MultiModelPipeline():
+    # runs the inference of several AccuracyPipelines that use the same input_dataset and preprocess in one pass over the frames.
+    # each frame is read and preprocessed once and given to all the sessions - the postprocess and metric are still per model.
+    # import (if required) is done for each model before the shared inference pass.
+    def __init__(self, settings, pipeline_configs):
+        self.settings = settings
+        # the pipelines in a group may have been given the same dataset objects - each pipeline gets its own copy,
+        # as the dataset holds the (streamed) metric state and AccuracyPipeline modifies the dataset_info in its kwargs
+        for pipeline_config in pipeline_configs:
+            pipeline_config['calibration_dataset'] = datasets.shared_copy(pipeline_config['calibration_dataset'])
+            pipeline_config['input_dataset'] = datasets.shared_copy(pipeline_config['input_dataset'])
+        #
+        self.pipelines = [AccuracyPipeline(settings, pipeline_config) for pipeline_config in pipeline_configs]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for pipeline in self.pipelines:
+            pipeline.close()
+        #
+
+    def __call__(self, description=''):
+        param_results = [None] * len(self.pipelines)
+        active_indices = []
+        for pipeline_index, pipeline in enumerate(self.pipelines):
+            param_result = pipeline._check_result()
+            if param_result is not None:
+                param_results[pipeline_index] = param_result
+                continue
+            #
+            # an error in a model should not stop the other models in the group
+            try:
+                pipeline._start()
+                param_results[pipeline_index] = pipeline._run_import(description)
+                active_indices.append(pipeline_index)
+            except Exception as e:
+                self._print_error(pipeline, e)
+            #
+        #
+
+        if self.settings.run_inference and len(active_indices) > 0:
+            infer_elapsed_times = {}
+            active_indices = self._infer_frames(active_indices, infer_elapsed_times, description)
+            for pipeline_index in list(active_indices):
+                pipeline = self.pipelines[pipeline_index]
+                try:
+                    output_list = pipeline._finish_infer()
+                    param_results[pipeline_index] = pipeline._run_evaluate(output_list, infer_elapsed_times[pipeline_index], description)
+                except Exception as e:
+                    self._print_error(pipeline, e)
+                    active_indices.remove(pipeline_index)
+                #
+            #
+        #
+        for pipeline_index in active_indices:
+            self.pipelines[pipeline_index]._finish(param_results[pipeline_index])
+        #
+        return [param_result or {} for param_result in param_results]
+
+    def _infer_frames(self, active_indices, infer_elapsed_times, description):
+        active_indices = list(active_indices)
+        for pipeline_index in list(active_indices):
+            pipeline = self.pipelines[pipeline_index]
+            try:
+                pipeline.write_log(utils.log_color('\nINFO', f'infer {description}', pipeline.run_dir_base + ' - this may take some time...'))
+                pipeline._start_infer()
+                infer_elapsed_times[pipeline_index] = 0.0
+            except Exception as e:
+                self._print_error(pipeline, e)
+                active_indices.remove(pipeline_index)
+            #
+        #
+        if len(active_indices) == 0:
+            return active_indices
+        #
+        # the frames are read by the first pipeline - the preprocess cache can be used only if all the postprocess allow it
+        leader = self.pipelines[active_indices[0]]
+        postprocess_transforms = []
+        for pipeline_index in active_indices:
+            postprocess = self.pipelines[pipeline_index].pipeline_config['postprocess']
+            postprocess_transforms += postprocess.transforms if isinstance(postprocess, utils.TransformsCompose) else [postprocess]
+        #
+        postprocess = utils.TransformsCompose(postprocess_transforms)
+        frames_iter = leader._get_frames_iter(range(leader.infer_state['num_frames']), postprocess=postprocess)
+
+        pbar_desc = f'infer {description}: {len(active_indices)} models'
+        read_start_time = time.time()
+        for frame_index, (data, info_dict) in enumerate(utils.progress_step(frames_iter, desc=pbar_desc, file=leader.logger, position=0)):
+            # the time to read the frame is shared equally by the models
+            read_time = (time.time() - read_start_time) / len(active_indices)
+            for pipeline_index in list(active_indices):
+                pipeline = self.pipelines[pipeline_index]
+                start_time = time.time()
+                try:
+                    # the postprocess may modify the info_dict - each model gets its own copy
+                    pipeline_info_dict = copy.copy(info_dict)
+                    # the frame was read by the leader - the label offset is that of this model's metric
+                    pipeline_info_dict['label_offset_pred'] = pipeline.pipeline_config.get('metric',{}).get('label_offset_pred',None)
+                    pipeline._infer_frame(frame_index, data, pipeline_info_dict)
+                except Exception as e:
+                    self._print_error(pipeline, e)
+                    active_indices.remove(pipeline_index)
+                #
+                infer_elapsed_times[pipeline_index] += (time.time() - start_time) + read_time
+            #
+            if len(active_indices) == 0:
+                break
+            #
+            read_start_time = time.time()
+        #
+        return active_indices
+
+    def _print_error(self, pipeline, e):
+        traceback.print_exc()
+        pipeline.write_log(utils.log_color('\nERROR', 'pipeline failed', f'{pipeline.run_dir_base} - {e}'))
+        pipeline.close()
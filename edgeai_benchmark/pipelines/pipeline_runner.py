@@ -30,13 +30,15 @@ import sys
 import functools
 import itertools
 import warnings
-import copy
 import traceback
+import yaml
 
 from .. import utils
 from .. import datasets
 from .model_transformation import *
 from .accuracy_pipeline import *
+from .multi_model_pipeline import *
+from .latency_pipeline import *
 from edgeai_benchmark import preprocess
 
 
@@ -88,12 +90,15 @@ class PipelineRunner():
         for pipeline_key, pipeline_config in self.pipeline_configs.items():
             if isinstance(pipeline_config['calibration_dataset'], str):
                 dataset_category_name = pipeline_config['calibration_dataset']
-                pipeline_config['calibration_dataset'] = copy.deepcopy(settings.dataset_cache[dataset_category_name]['calibration_dataset'])
+                pipeline_config['calibration_dataset'] = datasets.shared_copy(settings.dataset_cache[dataset_category_name]['calibration_dataset'])
             #
             if isinstance(pipeline_config['input_dataset'], str):
                 dataset_category_name = pipeline_config['input_dataset']
-                pipeline_config['input_dataset'] = copy.deepcopy(settings.dataset_cache[dataset_category_name]['input_dataset'])
+                pipeline_config['input_dataset'] = datasets.shared_copy(settings.dataset_cache[dataset_category_name]['input_dataset'])
             #
+            # the datasets given by get_datasets() are created only now, on first use by a selected pipeline
+            pipeline_config['calibration_dataset'] = datasets.LazyDataset.resolve(pipeline_config['calibration_dataset'])
+            pipeline_config['input_dataset'] = datasets.LazyDataset.resolve(pipeline_config['input_dataset'])
         #
 
     def run(self):
@@ -107,12 +112,18 @@ class PipelineRunner():
         # get the cwd so that we can continue even if exception occurs
         cwd = os.getcwd()
         results_list = []
-        total = len(self.pipeline_configs)
-        for pipeline_id, pipeline_config in enumerate(self.pipeline_configs.values()):
+        pipeline_groups = self._group_pipelines(self.settings, self.pipeline_configs)
+        total = len(pipeline_groups)
+        for pipeline_id, pipeline_group in enumerate(pipeline_groups):
             os.chdir(cwd)
             description = f'{pipeline_id+1}/{total}' if total > 1 else ''
-            result = self._run_pipeline(self.settings, pipeline_config, description=description)
-            results_list.append(result)
+            if len(pipeline_group) == 1:
+                result = self._run_pipeline(self.settings, pipeline_group[0], description=description)
+                results_list.append(result)
+            else:
+                result = self._run_pipeline_group(self.settings, pipeline_group, description=description)
+                results_list.extend(result)
+            #
         #
         return results_list
 
@@ -125,29 +136,167 @@ class PipelineRunner():
         #
         cwd = os.getcwd()
         description = 'TASKS'
+        memory_budget = self.settings.parallel_memory_budget
+        memory_budget = memory_budget * constants.MEGA_CONST if isinstance(memory_budget, (int,float)) else memory_budget
         parallel_exec = utils.ParallelRun(parallel_processes=self.settings.parallel_processes, parallel_devices=parallel_devices,
-                                          desc=description)
-        for pipeline_index, pipeline_config in enumerate(self.pipeline_configs.values()):
+                                          desc=description, cpus_per_process=self.settings.parallel_cpus_per_process,
+                                          memory_budget=memory_budget, task_timeout=self.settings.parallel_task_timeout,
+                                          task_retries=self.settings.parallel_task_retries)
+        pipeline_costs = self._estimate_pipeline_costs(self.settings, self.pipeline_configs)
+        pipeline_costs = {id(pipeline_config): pipeline_cost for pipeline_config, pipeline_cost in
+                          zip(self.pipeline_configs.values(), pipeline_costs)}
+        pipeline_memory = self._estimate_pipeline_memory(self.settings, self.pipeline_configs) \
+            if self.settings.parallel_memory_budget else [None] * len(self.pipeline_configs)
+        pipeline_memory = {id(pipeline_config): memory for pipeline_config, memory in
+                           zip(self.pipeline_configs.values(), pipeline_memory)}
+        pipeline_groups = self._group_pipelines(self.settings, self.pipeline_configs)
+        for pipeline_group in pipeline_groups:
             os.chdir(cwd)
-            run_pipeline_bound_func = functools.partial(self._run_pipeline, self.settings, pipeline_config,
-                                                        description='')
-            parallel_exec.enqueue(run_pipeline_bound_func)
+            if len(pipeline_group) == 1:
+                run_pipeline_bound_func = functools.partial(self._run_pipeline, self.settings, pipeline_group[0],
+                                                            description='')
+            else:
+                run_pipeline_bound_func = functools.partial(self._run_pipeline_group, self.settings, pipeline_group,
+                                                            description='')
+            #
+            task_cost = sum(pipeline_costs[id(pipeline_config)] for pipeline_config in pipeline_group)
+            group_memory = [pipeline_memory[id(pipeline_config)] for pipeline_config in pipeline_group]
+            task_memory = sum(group_memory) if all(m is not None for m in group_memory) else None
+            task_dirs = [pipeline_config['session'].get_param('run_dir') for pipeline_config in pipeline_group]
+            parallel_exec.enqueue(run_pipeline_bound_func, task_cost=task_cost, task_memory=task_memory, task_dirs=task_dirs)
+        #
+        results_list = []
+        for pipeline_group, result in zip(pipeline_groups, parallel_exec.run()):
+            if len(pipeline_group) == 1:
+                results_list.append(result)
+            else:
+                results_list.extend(result if isinstance(result, list) else [{}] * len(pipeline_group))
+            #
         #
-        results_list = parallel_exec.run()
         return results_list
 
+    def _group_pipelines(self, settings, pipeline_configs):
+        # groups of the pipelines that can be run in a single pass over the input frames - see MultiModelPipeline.
+        # the pipelines in a group use the same input_dataset, preprocess and num_frames.
+        group_size = settings.multi_model_group_size
+        # the shared pass of MultiModelPipeline reads the frames in order, one at a time, in this process - so
+        # the early stop (random frame order), sharded and batched inference and the inference checkpoints
+        # need the pipelines to run on their own
+        infer_options_ungrouped = settings.early_stop_halfwidth or (settings.infer_shards or 1) > 1 or \
+            (settings.infer_batch_size or 1) > 1 or settings.infer_checkpoint_interval
+        if not group_size or group_size <= 1 or settings.run_rescore or infer_options_ungrouped:
+            return [[pipeline_config] for pipeline_config in pipeline_configs.values()]
+        #
+        groups_dict = {}
+        for pipeline_config in pipeline_configs.values():
+            if pipeline_config.get('pipeline_type', settings.pipeline_type) != constants.PIPELINE_ACCURACY:
+                groups_dict[id(pipeline_config)] = [pipeline_config]
+                continue
+            #
+            input_dataset = pipeline_config['input_dataset']
+            preprocess = pipeline_config['preprocess']
+            if hasattr(input_dataset, 'kwargs') and isinstance(preprocess, utils.TransformsCompose):
+                group_key = utils.hash_object(utils.canonical_state([type(input_dataset), input_dataset.kwargs,
+                    preprocess.transforms, pipeline_config.get('num_frames', settings.num_frames)]))
+            else:
+                group_key = id(pipeline_config)
+            #
+            groups_dict.setdefault(group_key, []).append(pipeline_config)
+        #
+        pipeline_groups = []
+        for group in groups_dict.values():
+            for start_index in range(0, len(group), group_size):
+                pipeline_groups.append(group[start_index:start_index+group_size])
+            #
+        #
+        return pipeline_groups
+
+    def _estimate_pipeline_costs(self, settings, pipeline_configs):
+        # estimated run time of each pipeline, used to start the long running ones first.
+        # the run time recorded in an earlier result.yaml is used if available.
+        # otherwise the model file size is used, converted to time using the ratio seen in the other pipelines.
+        elapsed_times = []
+        model_sizes = []
+        for pipeline_config in pipeline_configs.values():
+            result_dict = self._read_previous_result(pipeline_config)
+            elapsed_time = None
+            if result_dict is not None:
+                if settings.run_missing:
+                    # result exists - this will be skipped
+                    elapsed_time = 0.0
+                else:
+                    elapsed_keys = [k for k in ('import_elapsed_sec', 'infer_elapsed_sec') if k in result_dict]
+                    elapsed_time = sum(result_dict[k] for k in elapsed_keys) if elapsed_keys else None
+                #
+            #
+            elapsed_times.append(elapsed_time)
+            model_sizes.append(self._get_model_size(pipeline_config))
+        #
+        return self._estimate_from_history(elapsed_times, model_sizes)
+
+    def _estimate_pipeline_memory(self, settings, pipeline_configs):
+        # estimated peak resident memory (bytes) of each pipeline, used by the memory_budget of ParallelRun.
+        # the peak recorded in an earlier result.yaml is used if available, otherwise it is scaled from the model size.
+        # None if there is no history at all - ParallelRun then uses what it has seen in the completed tasks.
+        peak_rss_values = []
+        model_sizes = []
+        for pipeline_config in pipeline_configs.values():
+            result_dict = self._read_previous_result(pipeline_config) or {}
+            peak_rss_mb = result_dict.get('peak_rss_mb', None)
+            peak_rss_values.append(peak_rss_mb * constants.MEGA_CONST if peak_rss_mb else None)
+            model_sizes.append(self._get_model_size(pipeline_config))
+        #
+        if not any(peak_rss_values):
+            return [None] * len(peak_rss_values)
+        #
+        return self._estimate_from_history(peak_rss_values, model_sizes)
+
+    def _estimate_from_history(self, values, model_sizes):
+        # the missing values are computed from the model size, using the ratio seen in the other pipelines
+        history = [(v, m) for v, m in zip(values, model_sizes) if v and m]
+        value_per_byte = (sum(v for v, m in history) / sum(m for v, m in history)) if history else 1.0
+        return [v if v is not None else m*value_per_byte for v, m in zip(values, model_sizes)]
+
+    def _read_previous_result(self, pipeline_config):
+        run_dir = pipeline_config['session'].get_param('run_dir')
+        result_yaml = os.path.join(run_dir, 'result.yaml')
+        if not os.path.exists(result_yaml):
+            return None
+        #
+        try:
+            with open(result_yaml) as fp:
+                result_dict = yaml.safe_load(fp).get('result', {}) or {}
+            #
+        except Exception:
+            result_dict = {}
+        #
+        return result_dict
+
+    def _get_model_size(self, pipeline_config):
+        model_path = pipeline_config['session'].peek_param('model_path')
+        model_path = utils.as_list_or_tuple(model_path)
+        return sum(os.path.getsize(m) for m in model_path if isinstance(m, str) and os.path.isfile(m))
+
     # this function cannot be an instance method of PipelineRunner, as it causes an
     # error during pickling, involved in the launch of a process is parallel run. make it classmethod
     @classmethod
     def _run_pipeline_impl(cls, settings, pipeline_config, description=''):
         result = {}
-        if settings.pipeline_type == constants.PIPELINE_ACCURACY:
+        # a pipeline_config can select its own pipeline_type
+        pipeline_type = pipeline_config.get('pipeline_type', settings.pipeline_type)
+        if pipeline_type == constants.PIPELINE_ACCURACY:
             # use with statement, so that the logger and other file resources are cleaned up
             with AccuracyPipeline(settings, pipeline_config) as accuracy_pipeline:
-                accuracy_result = accuracy_pipeline(description)
+                accuracy_result = accuracy_pipeline.rescore(description) if settings.run_rescore \
+                    else accuracy_pipeline(description)
                 result.update(accuracy_result)
             #
-        elif settings.pipeline_type == constants.PIPELINE_SOMETHING:
+        elif pipeline_type == constants.PIPELINE_LATENCY:
+            with LatencyPipeline(settings, pipeline_config) as latency_pipeline:
+                latency_result = latency_pipeline(description)
+                result.update(latency_result)
+            #
+        elif pipeline_type == constants.PIPELINE_SOMETHING:
             # this is just an example of how other pipelines can be implemented.
             # 'something' used here is not real and it is not supported
             with SomethingPipeline(settings, pipeline_config) as something_pipeline:
@@ -155,7 +304,7 @@ class PipelineRunner():
                 result.update(something_result)
             #
         else:
-            assert False, f'unknown pipeline: {settings.pipeline_type}'
+            assert False, f'unknown pipeline: {pipeline_type}'
         #
         return result
 
@@ -181,6 +330,24 @@ class PipelineRunner():
         os.chdir(cwd)
         return result
 
+    @classmethod
+    def _run_pipeline_group(cls, settings, pipeline_configs, description=''):
+        basic_settings = settings.basic_settings()
+        cwd = os.getcwd()
+        results = [{}] * len(pipeline_configs)
+        try:
+            run_dirs = [pipeline_config['session'].get_param('run_dir') for pipeline_config in pipeline_configs]
+            print(utils.log_color('\nINFO', 'starting', ', '.join(os.path.basename(run_dir) for run_dir in run_dirs)))
+            with MultiModelPipeline(basic_settings, pipeline_configs) as multi_model_pipeline:
+                results = multi_model_pipeline(description)
+            #
+        except Exception as e:
+            traceback.print_exc()
+            print(str(e))
+        #
+        os.chdir(cwd)
+        return results
+
     def _str_match_any(self, k, x_list):
         match_any = any([(k in x) for x in x_list])
         return match_any
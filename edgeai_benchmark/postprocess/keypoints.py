@@ -985,6 +985,8 @@ class BboxKeypointsConfReformat():
 
 
 class HumanPoseImageSave:
+    uses_input_data = True
+
     def __init__(self, num_output_frames=None):
         self.pose_nms_thr = 0.9
         self.kpt_score_thr = 0.5
@@ -275,6 +275,8 @@ class BboxObject6dPoseReformat():
 
 
 class Object6dPoseImageSave:
+    uses_input_data = True
+
     def __init__(self, num_output_frames=None):
         self.cadmodels = None
         self.camera_matrix = None
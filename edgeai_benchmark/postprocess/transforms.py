@@ -185,6 +185,8 @@ class IgnoreIndex():
 
 
 class ClassificationImageSave():
+    uses_input_data = True
+
     def __init__(self, num_output_frames=None):
         self.color_step = 64  # 32
         self.colors = [(r, g, b) for r in range(0, 256, self.color_step) \
@@ -374,6 +376,8 @@ class SegmentationImageSave():
 
 ##############################################################################
 class DetectionResizeOnlyNormalized():
+    uses_input_data = True
+
     def __call__(self, bbox, info_dict):
         img_data = info_dict['data']
         assert isinstance(img_data, np.ndarray), 'only supports np array for now'
@@ -390,6 +394,8 @@ class DetectionResizeOnlyNormalized():
 
 
 class DetectionResizePad():
+    uses_input_data = True
+
     def __init__(self, resize_with_pad=False, normalized_detections=True, keypoint=False, object6dpose=False):
         self.resize_with_pad = resize_with_pad
         self.normalized_detections = normalized_detections
@@ -501,6 +507,8 @@ class DetectionBoxSL2BoxLS(DetectionFormatting):
 
 
 class DetectionImageSave():
+    uses_input_data = True
+
     def __init__(self, num_output_frames=None):
         self.color_step = 64  # 32
         self.colors = [(r, g, b) for r in range(0, 256, self.color_step) \
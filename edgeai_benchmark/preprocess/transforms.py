@@ -220,6 +220,14 @@ class ImageNormMeanScale(object):
         #
         return tensor, info_dict
 
+    def normalize_into(self, tensor, out):
+        # same as __call__ for a single tensor, but the result is written into out, which can be reused across frames.
+        # out must be of dtype np.result_type(tensor.dtype, np.float32)
+        mean, scale = F._normalize_pre(tensor, self.mean, self.scale, self.data_layout, inplace=True)
+        np.subtract(tensor, mean, out=out)
+        np.multiply(out, scale, out=out)
+        return out
+
     def __repr__(self):
         return self.__class__.__name__ + '(mean={0}, scale={1})'.format(self.mean, self.scale)
 
@@ -480,195 +488,92 @@ class Voxelization(object):
         self.num_feat_per_voxel = 10
         self.num_channel = 64
         self.scale_fact = 32.0
-
+        # numpy versions differ in the precision used for (float32 array - float64 scalar),
+        # the per voxel mean is subtracted in the same precision as the scalar expression would use.
+        self.mean_dtype = (np.zeros(1, dtype=np.float32) - np.float64(1)).dtype
 
     def __call__(self, lidar_data, info_dict):
-
-        scratch_2 =[]
-        enable_pre_proc = True
-        enable_opt_pre_proc = True
-
+        # the outputs are allocated for each frame - the consumers (eg. the session, prefetch) may hold on to them
+        input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
         input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
-
-        if enable_pre_proc == True:
-            input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
-            input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
-
-            #start_time = time.time()
-
-            if enable_opt_pre_proc == False:
-
-                scratch_1 = []
-                for i, data in enumerate(lidar_data):
-
-                    x = data[0]
-                    y = data[1]
-                    z = data[2]
-
-                    if ((x > self.min_x) and (x < self.max_x) and (y > self.min_y) and (y < self.max_y) and
-                        (z > self.min_z) and (z < self.max_z)):
-
-                        x_id = (((x - self.min_x) / self.voxel_size_x)).astype(int)
-                        y_id = (((y - self.min_y) / self.voxel_size_y)).astype(int)
-                        scratch_1.append(y_id * self.num_voxel_x + x_id)
-                    else:
-                        scratch_1.append(-1 - i) # filing unique non valid index
-            else:
-                x = lidar_data[:, 0]
-                y = lidar_data[:, 1]
-                z = lidar_data[:, 2]
-
-                x_id = ((((x - self.min_x) / self.voxel_size_x))).astype(int)
-                y_id =  ((((y - self.min_y) / self.voxel_size_y))).astype(int)
-                valid_idx = y_id * self.num_voxel_x + x_id
-                not_valid_idx = np.ones(len(lidar_data))*-1 # -1  is the invalid index
-
-                valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
-                            (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
-
-                indx_write = np.where(valid_pts,valid_idx,not_valid_idx)
-
-                scratch_1  = indx_write
-
-            num_points = np.zeros(self.nw_max_num_voxels,dtype=int)
-
-            # Find unique indices
-            # There will be voxel which doesnt have any 3d point, hence collecting the voxel ids for valid voxels*/
-            # scratch_2 is the index in valid voxels
-            num_non_empty_voxels = 0
-
-            lidar_data = lidar_data[np.where(scratch_1 != -1)]
-            scratch_1 = scratch_1[np.where(scratch_1 != -1)]
-
-            if enable_opt_pre_proc == False:
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
-
-                        find_voxel = scratch_1[i] in scratch_1[:i]
-
-                        if find_voxel == False:
-                            scratch_2.append(num_non_empty_voxels) # this voxel idx has come first time, hence allocate a new index for this
-                            input2[0][0][num_non_empty_voxels] = scratch_1[i]
-                            num_non_empty_voxels += 1
-                        else:
-                            if enable_opt_pre_proc == False:
-                                k = scratch_1[:i].index(scratch_1[i])
-                            else:
-                                k = (np.where(scratch_1[:i] == scratch_1[i]))[0][0]
-                            scratch_2.append(scratch_2[k]) #already this voxel is having one id hence reuse it
-                    else:
-                        scratch_2.append(None)
-            else:
-                unq_rtn = np.unique(scratch_1, return_inverse = True, return_counts = True)
-                num_non_empty_voxels = (int)(unq_rtn[2].shape[0])
-                #num_points = unq_rtn[2]
-                #num_points = np.clip(num_points,0,self.max_points_per_voxel)
-                scratch_2 = unq_rtn[1]
-                input2[0, 0, :num_non_empty_voxels] = unq_rtn[0][:num_non_empty_voxels]
-
-
-            #Even though current_voxels is less than self.nw_max_num_voxels, then also arrange
-            #    the data as per maximum number of voxels.
-
-            if enable_opt_pre_proc == False:
-                tot_num_pts = 0
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
-                        j = scratch_2[i] #voxel index
-                        if(num_points[j]<self.max_points_per_voxel):
-                            input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                            num_points[j] = num_points[j] + 1
-                        else:
-                            tot_num_pts = tot_num_pts+1
-            else:
-                for i in range(len(lidar_data)):
-                    j = scratch_2[i] #voxel index
-                    if(num_points[j] < self.max_points_per_voxel):
-                        input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                        num_points[j] = num_points[j] + 1
-
-            line_pitch = self.nw_max_num_voxels
-            channel_pitch = self.max_points_per_voxel * line_pitch
-            x_offset = self.voxel_size_x / 2 + self.min_x
-            y_offset = self.voxel_size_y / 2 + self.min_y
-            z_offset = self.voxel_size_z / 2 + self.min_z
-
-            for i in range(num_non_empty_voxels):
-                x = 0
-                y = 0
-                z = 0
-
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        x += input0[0][0][j][i]
-                        y += input0[0][1][j][i]
-                        z += input0[0][2][j][i]
-                else:
-                    x = input0[0, 0, :num_points[i], i].sum()
-                    y = input0[0, 1, :num_points[i], i].sum()
-                    z = input0[0, 2, :num_points[i], i].sum()
-
-                x_avg = x / num_points[i]
-                y_avg = y / num_points[i]
-                z_avg = z / num_points[i]
-
-                voxel_center_y = (int)(input2[0][0][i] / self.num_voxel_x)
-                voxel_center_x = (int)(input2[0][0][i] - ((int)(voxel_center_y)) * self.num_voxel_x)
-
-                voxel_center_x *= self.voxel_size_x
-                voxel_center_x += x_offset
-
-                voxel_center_y *= self.voxel_size_y
-                voxel_center_y += y_offset
-
-                voxel_center_z = 0
-                voxel_center_z *= self.voxel_size_z
-                voxel_center_z += z_offset
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        input0[0][4][j][i] = input0[0][0][j][i] - x_avg
-                        input0[0][5][j][i] = input0[0][1][j][i] - y_avg
-                        input0[0][6][j][i] = input0[0][2][j][i] - z_avg
-                        input0[0][7][j][i] = input0[0][0][j][i] - voxel_center_x * self.scale_fact
-                        input0[0][8][j][i] = input0[0][1][j][i] - voxel_center_y * self.scale_fact
-                        input0[0][9][j][i] = input0[0][2][j][i] - voxel_center_z * self.scale_fact
-
-                    #/*looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour*/
-                    for j in range (num_points[i]):
-                        input0[0][0][j][i] = input0[0][7][j][i]
-                        input0[0][1][j][i] = input0[0][8][j][i]
-                        input0[0][2][j][i] = input0[0][9][j][i]
-                else:
-                    input0[0, 4, :num_points[i], i] = input0[0, 0, :num_points[i], i] - x_avg
-                    input0[0, 5, :num_points[i], i] = input0[0, 1, :num_points[i], i] - y_avg
-                    input0[0, 6, :num_points[i], i] = input0[0, 2, :num_points[i], i] - z_avg
-                    input0[0, 7, :num_points[i], i] = input0[0, 0, :num_points[i], i] - voxel_center_x * self.scale_fact
-                    input0[0, 8, :num_points[i], i] = input0[0, 1, :num_points[i], i] - voxel_center_y * self.scale_fact
-                    input0[0, 9, :num_points[i], i] = input0[0, 2, :num_points[i], i] - voxel_center_z * self.scale_fact
-
-                    input0[0, 0, :num_points[i], i] = input0[0, 7, :num_points[i], i]
-                    input0[0, 1, :num_points[i], i] = input0[0, 8, :num_points[i], i]
-                    input0[0, 2, :num_points[i], i] = input0[0, 9, :num_points[i], i]
-
-
-            input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
-            input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
-            #input2 = input2.astype("float32")
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
-        else:
-            input0 = np.fromfile(info_dict['data_path'] + "_input0_f32.bin", dtype='float32')
-            input2 = np.fromfile(info_dict['data_path'] + "_input2_f32.bin", dtype='float32')
-
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
-
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
-
-            input0 = input0.reshape(1, 9, 32, 10000)
-            input2 = input2.reshape(1, 64, 10000).astype('int32')
-
+        input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
+
+        x = lidar_data[:, 0]
+        y = lidar_data[:, 1]
+        z = lidar_data[:, 2]
+        valid_pts = (x > self.min_x) & (x < self.max_x) & (y > self.min_y) & \
+                    (y < self.max_y) & (z > self.min_z) & (z < self.max_z)
+        lidar_data = lidar_data[valid_pts]
+
+        x_id = ((lidar_data[:, 0] - self.min_x) / self.voxel_size_x).astype(int)
+        y_id = ((lidar_data[:, 1] - self.min_y) / self.voxel_size_y).astype(int)
+        voxel_idx = y_id * self.num_voxel_x + x_id
+
+        # group the points into voxels - voxels are numbered in the order of their index
+        voxel_ids, point_voxel, voxel_num_points = np.unique(voxel_idx, return_inverse=True, return_counts=True)
+        num_non_empty_voxels = len(voxel_ids)
+        assert num_non_empty_voxels < self.nw_max_num_voxels, \
+            f'number of voxels {num_non_empty_voxels} exceeds the maximum {self.nw_max_num_voxels}'
+
+        # position of each point within its voxel, in the order of the points. only the first
+        # max_points_per_voxel points of each voxel are used.
+        point_order = np.argsort(point_voxel, kind='stable')
+        voxel_start = np.cumsum(voxel_num_points) - voxel_num_points
+        point_slot = np.empty_like(point_order)
+        point_slot[point_order] = np.arange(len(point_order)) - voxel_start[point_voxel[point_order]]
+        used_pts = point_slot < self.max_points_per_voxel
+        num_points = np.minimum(voxel_num_points, self.max_points_per_voxel)
+
+        features = input0[0, :, :, :num_non_empty_voxels]
+        features[0:4, point_slot[used_pts], point_voxel[used_pts]] = (lidar_data[used_pts, 0:4] * self.scale_fact).T
+
+        x_offset = self.voxel_size_x / 2 + self.min_x
+        y_offset = self.voxel_size_y / 2 + self.min_y
+        z_offset = self.voxel_size_z / 2 + self.min_z
+        voxel_ids = voxel_ids.astype(np.int32)
+        voxel_center_y = np.trunc(voxel_ids / self.num_voxel_x)
+        voxel_center_x = np.trunc(voxel_ids - voxel_center_y * self.num_voxel_x)
+        voxel_center_x = voxel_center_x * self.voxel_size_x + x_offset
+        voxel_center_y = voxel_center_y * self.voxel_size_y + y_offset
+        voxel_center_z = 0 * self.voxel_size_z + z_offset
+        voxel_center = (voxel_center_x * self.scale_fact, voxel_center_y * self.scale_fact,
+                        np.full(num_non_empty_voxels, voxel_center_z * self.scale_fact))
+
+        slot_valid = np.arange(self.max_points_per_voxel)[:, np.newaxis] < num_points[np.newaxis, :]
+        for c in range(3):
+            voxel_sum = self._voxel_sum(features[c], num_points)
+            voxel_avg = (voxel_sum.astype(np.float64) / num_points).astype(self.mean_dtype)
+            np.subtract(features[c], voxel_avg, out=features[4+c], where=slot_valid, casting='unsafe')
+            np.subtract(features[c], voxel_center[c].astype(np.float32), out=features[7+c], where=slot_valid)
+        #
+        # looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour
+        features[0:3] = features[7:10]
+
+        input2[0, 0, :num_non_empty_voxels] = voxel_ids
+        input2[0, 0, num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
+        input2[0, 1:, :num_non_empty_voxels+1] = input2[0, 0, :num_non_empty_voxels+1] # As scatter is same for all channels.
+        # equivalent to astype('int32').astype('float32') - adding 0 turns -0.0 into 0.0
+        np.trunc(features, out=features)
+        features += 0
         return (input0,input2,input1), info_dict
+
+    def _voxel_sum(self, values, num_points):
+        # sum of the valid points of each voxel, in the same order of additions as numpy's
+        # pairwise summation does for a 1d array of upto 128 elements, so that the result is bit exact.
+        # values: max_points_per_voxel x num_voxels, with zeros in the unused slots.
+        num_blocked = num_points - num_points % 8
+        slot = np.arange(values.shape[0])[:, np.newaxis]
+        blocked = np.where(slot < num_blocked, values, 0)
+        partial = blocked[0:8].copy()
+        for b in range(8, values.shape[0], 8):
+            partial += blocked[b:b+8]
+        #
+        voxel_sum = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + \
+                    ((partial[4] + partial[5]) + (partial[6] + partial[7]))
+        voxel_index = np.arange(values.shape[1])
+        for r in range(7):
+            rest_slot = np.minimum(num_blocked + r, values.shape[0] - 1)
+            rest = np.where(num_blocked + r < num_points, values[rest_slot, voxel_index], 0)
+            voxel_sum += rest
+        #
+        return voxel_sum
@@ -72,6 +72,7 @@ def get_common_session_cfg(settings, work_dir=None, input_optimization=True, inp
               input_optimization=input_optimization, input_data_layout=input_data_layout,
               input_mean=input_mean, input_scale=input_scale,
               run_dir_tree_depth=settings.run_dir_tree_depth,
+              artifacts_cache_path=settings.artifacts_cache_path,
               **kwargs)
     return common_session_cfg
 
@@ -37,6 +37,7 @@ import copy
 from colorama import Fore
 import numpy as np
 import tarfile
+import yaml
 
 from .. import utils
 from .. import constants
@@ -53,6 +54,8 @@ class BaseRTSession(utils.ParamsBase):
         self.is_imported = False
         self.is_start_infer_done = False
         self.input_normalizer = None
+        # set if the outputs of a batch could not be split into the frames - see infer_batch()
+        self.is_batch_disabled = False
 
         self.kwargs['target_machine'] = self.kwargs.get('target_machine', 'pc')
         self.kwargs['target_device'] = self.kwargs.get('target_device', None)
@@ -88,6 +91,9 @@ class BaseRTSession(utils.ParamsBase):
         self.kwargs['input_mean'] = self.kwargs.get('input_mean', None)
         self.kwargs['input_scale'] = self.kwargs.get('input_scale', None)
 
+        # folder to cache the imported artifacts across work_dirs and runs. None disables the cache
+        self.kwargs['artifacts_cache_path'] = self.kwargs.get('artifacts_cache_path', None)
+
         # other parameters
         self.kwargs['tensor_bits'] = self.kwargs.get('tensor_bits', 8)
         self.kwargs['quant_params_proto_path'] = self.kwargs.get('quant_params_proto_path', True)
@@ -155,6 +161,27 @@ class BaseRTSession(utils.ParamsBase):
         self.clear()
         self.is_imported = True
 
+    def import_model_cached(self, calib_data, info_dict=None):
+        # if an import with the same model file, runtime_options, calibration data and tools was done earlier
+        # (possibly in another work_dir), the artifacts are copied from artifacts_cache_path instead of importing again
+        artifacts_cache_path = self.kwargs['artifacts_cache_path']
+        if not artifacts_cache_path:
+            return self.import_model(calib_data, info_dict)
+        #
+        if not self.is_started:
+            self.start()
+        #
+        cache_key = self._get_artifacts_cache_key(calib_data)
+        cache_dir = os.path.join(artifacts_cache_path, cache_key)
+        if os.path.exists(cache_dir):
+            print(utils.log_color('INFO', 'artifacts found in cache - skipping import', cache_dir))
+            self._restore_artifacts_from_cache(cache_dir)
+            return info_dict
+        #
+        info_dict = self.import_model(calib_data, info_dict)
+        self._store_artifacts_to_cache(cache_dir)
+        return info_dict
+
     def start_infer(self):
         artifacts_folder = self.kwargs['artifacts_folder']
         artifacts_folder_missing = not os.path.exists(artifacts_folder)
@@ -189,6 +216,69 @@ class BaseRTSession(utils.ParamsBase):
         #
         return outputs, info_dict
 
+    def infer_batch(self, inputs, info_dicts):
+        # infer a list of frames. if the model supports it (see supports_batch()), the frames are stacked into
+        # one N-batch tensor and run in a single call, and the outputs are split back into per frame outputs.
+        # otherwise the frames are run one by one.
+        if not self.supports_batch(inputs):
+            return self._infer_frames_each(inputs, info_dicts)
+        #
+        batch_size = len(inputs)
+        batch_input = tuple(np.concatenate(in_data, axis=0) for in_data in zip(*[utils.as_tuple(input) for input in inputs]))
+        batch_outputs, batch_info_dict = self.infer_frame(batch_input, {})
+        # a symbolic dim 0 of an output need not be the batch (eg. the number of detections in [num_dets, 6])
+        if not all(isinstance(batch_output, np.ndarray) and batch_output.ndim > 0 and batch_output.shape[0] == batch_size
+                   for batch_output in batch_outputs):
+            print(utils.log_color('WARNING', 'batch inference is disabled',
+                                  f'the output shapes {[np.shape(o) for o in batch_outputs]} do not match the batch size {batch_size}'))
+            self.is_batch_disabled = True
+            return self._infer_frames_each(inputs, info_dicts)
+        #
+        outputs = [[] for _ in range(batch_size)]
+        for batch_output in batch_outputs:
+            for frame_index, output in enumerate(np.split(batch_output, batch_size, axis=0)):
+                outputs[frame_index].append(output)
+            #
+        #
+        for info_dict in info_dicts:
+            info_dict['run_dir'] = self.get_param('run_dir')
+            # the invoke time of the batch is shared equally by the frames
+            info_dict['session_invoke_time'] = batch_info_dict['session_invoke_time'] / batch_size
+        #
+        return outputs, info_dicts
+
+    def _infer_frames_each(self, inputs, info_dicts):
+        outputs = []
+        for input, info_dict in zip(inputs, info_dicts):
+            output, info_dict = self.infer_frame(input, info_dict)
+            outputs.append(output)
+        #
+        return outputs, info_dicts
+
+    def supports_batch(self, inputs):
+        # whether the frames in inputs can be run as a single batch - over-ridden by the sessions that can do it.
+        return False
+
+    def _check_batch_inputs(self, inputs):
+        # the frames must be of batch size 1 and must have the same shapes, to be stacked into one batch
+        if len(inputs) <= 1:
+            return False
+        #
+        inputs = [utils.as_tuple(input) for input in inputs]
+        in_data0 = inputs[0]
+        for in_data in inputs:
+            if len(in_data) != len(in_data0):
+                return False
+            #
+            for d, d0 in zip(in_data, in_data0):
+                if not isinstance(d, np.ndarray) or d.ndim == 0 or d.shape[0] != 1 or \
+                        d.shape != d0.shape or d.dtype != d0.dtype:
+                    return False
+                #
+            #
+        #
+        return True
+
     def run(self, calib_data, inputs, info_dict=None):
         info_dict = self.import_model(calib_data, info_dict)
         outputs, info_dict = self.infer_frames(inputs, info_dict)
@@ -609,6 +699,81 @@ class BaseRTSession(utils.ParamsBase):
             fp.write('\n'.join(lines))
         #
 
+    def _get_artifacts_cache_key(self, calib_data):
+        run_dir = self.kwargs['run_dir']
+        excluded_options = ('artifacts_folder', 'tidl_tools_path', 'import')
+        def _cache_key_options(options):
+            key_options = {}
+            for k, v in options.items():
+                if k in excluded_options:
+                    continue
+                elif isinstance(v, dict):
+                    v = _cache_key_options(v)
+                elif isinstance(v, str) and os.path.isfile(v):
+                    # files such as the od meta architecture file are identified by their contents
+                    v = utils.hash_file(v)
+                elif isinstance(v, str):
+                    v = v.replace(run_dir, '')
+                #
+                key_options[k] = v
+            #
+            return key_options
+        #
+        tidl_tools_path = self.kwargs['tidl_tools_path']
+        tidl_tools_version_file = os.path.join(tidl_tools_path, 'version.txt')
+        tidl_tools_version = utils.hash_file(tidl_tools_version_file) \
+            if os.path.isfile(tidl_tools_version_file) else os.path.realpath(tidl_tools_path)
+        cache_key_dict = {
+            'session_name': self.kwargs['session_name'],
+            'target_device': self.kwargs['target_device'],
+            'tidl_offload': self.kwargs['tidl_offload'],
+            'tidl_version': constants.TIDL_VERSION_STR,
+            'tidl_tools_version': tidl_tools_version,
+            'model_file': utils.hash_file(self.kwargs['model_file']),
+            'runtime_options': _cache_key_options(self.kwargs['runtime_options']),
+            'calib_data': utils.hash_object(calib_data),
+        }
+        return utils.hash_object(cache_key_dict)
+
+    def _restore_artifacts_from_cache(self, cache_dir):
+        artifacts_folder = self.kwargs['artifacts_folder']
+        self._clear_folder(artifacts_folder, remove_base_folder=True)
+        shutil.copytree(os.path.join(cache_dir, 'artifacts'), artifacts_folder, symlinks=True)
+        # the input/output details are normally found during import
+        session_info_file = os.path.join(cache_dir, 'session_info.yaml')
+        if os.path.exists(session_info_file):
+            with open(session_info_file) as fp:
+                session_info = yaml.safe_load(fp)
+            #
+            for k, v in session_info.items():
+                if self.kwargs.get(k, None) is None:
+                    self.kwargs[k] = v
+                #
+            #
+        #
+        self.is_imported = True
+
+    def _store_artifacts_to_cache(self, cache_dir):
+        artifacts_cache_path = os.path.dirname(cache_dir)
+        os.makedirs(artifacts_cache_path, exist_ok=True)
+        # copy into a temporary folder first and then rename it,
+        # so that a partially written cache entry is never picked up by another process
+        temp_dir = tempfile.mkdtemp(dir=artifacts_cache_path, prefix='.tmp_')
+        try:
+            shutil.copytree(self.kwargs['artifacts_folder'], os.path.join(temp_dir, 'artifacts'), symlinks=True)
+            session_info = {'input_details': self.kwargs['input_details'], 'output_details': self.kwargs['output_details']}
+            with open(os.path.join(temp_dir, 'session_info.yaml'), 'w') as fp:
+                yaml.safe_dump(utils.pretty_object(session_info), fp, sort_keys=False)
+            #
+            os.rename(temp_dir, cache_dir)
+        except OSError as e:
+            # another process may have stored the same entry in the meantime
+            print(utils.log_color('WARNING', 'artifacts could not be stored in cache', f'{cache_dir} - {e}'))
+        #
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        #
+
     def _set_default_options(self):
         assert False, 'this function must be overridden in the derived class'
 
@@ -36,11 +36,24 @@ from .. import constants
 from .basert_session import BaseRTSession
 
 
+# numpy dtypes of the onnx tensor types, used for the preallocated output buffers
+ONNX_TENSOR_DTYPES = {
+    'tensor(float)': np.float32, 'tensor(float16)': np.float16, 'tensor(double)': np.float64,
+    'tensor(int8)': np.int8, 'tensor(uint8)': np.uint8, 'tensor(int16)': np.int16, 'tensor(uint16)': np.uint16,
+    'tensor(int32)': np.int32, 'tensor(uint32)': np.uint32, 'tensor(int64)': np.int64, 'tensor(uint64)': np.uint64,
+    'tensor(bool)': np.bool_
+}
+
+
 class ONNXRTSession(BaseRTSession):
     def __init__(self, session_name=constants.SESSION_NAME_ONNXRT, **kwargs):
         super().__init__(session_name=session_name, **kwargs)
         self.kwargs['input_data_layout'] = self.kwargs.get('input_data_layout', constants.NCHW)
+        # use onnxruntime io binding with buffers that are allocated once, in infer_frame.
+        # it is opt-in, as it changes the inference path (and the latency) of the existing sessions, including TIDL
+        self.kwargs['io_binding'] = self.kwargs.get('io_binding', False)
         self.interpreter = None
+        self.interpreter_io_binding = None
 
     def start(self):
         super().start()
@@ -81,11 +94,15 @@ class ONNXRTSession(BaseRTSession):
         self.interpreter = self._create_interpreter(is_import=False)
         # input_details is needed during inference - get it if it is not given
         self._get_input_output_details_onnx(self.interpreter)
+        self._start_io_binding()
         os.chdir(self.cwd)
         return True
 
     def infer_frame(self, input, info_dict=None):
         super().infer_frame(input, info_dict)
+        if self.interpreter_io_binding is not None:
+            return self._infer_frame_io_binding(input, info_dict)
+        #
 
         if not isinstance(input, list):
             in_data = utils.as_tuple(input)        
@@ -107,6 +124,77 @@ class ONNXRTSession(BaseRTSession):
         info_dict['session_invoke_time'] = (time.time() - start_time)
         return outputs, info_dict
 
+    def _start_io_binding(self):
+        # the names, types and output buffers are resolved here once, instead of in every infer_frame
+        self.interpreter_io_binding = None
+        if not self.kwargs['io_binding'] or not hasattr(self.interpreter, 'io_binding'):
+            return
+        #
+        self.interpreter_io_binding = self.interpreter.io_binding()
+        self.input_names = [d_info.name for d_info in self.interpreter.get_inputs()]
+        self.input_buffers = {}
+        if self.kwargs['extra_inputs'] is not None:
+            self.extra_input_buffers = {name: np.ascontiguousarray(value) for name, value in self.kwargs['extra_inputs'].items()}
+            for name, value in self.extra_input_buffers.items():
+                self.interpreter_io_binding.bind_cpu_input(name, value)
+            #
+        #
+        # outputs with a static shape are written into preallocated buffers, the others are allocated by onnxruntime
+        self.output_buffers = []
+        for d_info in self.interpreter.get_outputs():
+            output_dtype = ONNX_TENSOR_DTYPES.get(d_info.type, None)
+            output_shape = d_info.shape
+            if output_dtype is not None and all(isinstance(dim, int) and dim > 0 for dim in output_shape):
+                output_buffer = np.empty(output_shape, dtype=output_dtype)
+                self.interpreter_io_binding.bind_output(d_info.name, 'cpu', 0, output_dtype, output_shape, output_buffer.ctypes.data)
+            else:
+                output_buffer = None
+                self.interpreter_io_binding.bind_output(d_info.name, 'cpu')
+            #
+            self.output_buffers.append(output_buffer)
+        #
+
+    def _infer_frame_io_binding(self, input, info_dict):
+        in_data = input if isinstance(input, (list,tuple)) else utils.as_tuple(input)
+        # the bound arrays must be alive till the inference is done
+        bound_inputs = []
+        for name, d in zip(self.input_names, in_data):
+            d = np.asarray(d)
+            if self.input_normalizer is not None:
+                # the normalized input is written into a buffer that is reused across frames
+                buffer_dtype = np.result_type(d.dtype, np.float32)
+                input_buffer = self.input_buffers.get(name, None)
+                if input_buffer is None or input_buffer.shape != d.shape or input_buffer.dtype != buffer_dtype:
+                    input_buffer = np.empty(d.shape, dtype=buffer_dtype)
+                    self.input_buffers[name] = input_buffer
+                #
+                d = self.input_normalizer.normalize_into(d, input_buffer)
+            #
+            d = np.ascontiguousarray(d)
+            self.interpreter_io_binding.bind_cpu_input(name, d)
+            bound_inputs.append(d)
+        #
+        # run the actual inference
+        start_time = time.time()
+        self.interpreter.run_with_iobinding(self.interpreter_io_binding)
+        info_dict['session_invoke_time'] = (time.time() - start_time)
+        # the outputs are copied out of the buffers, as the buffers are overwritten in the next frame
+        if all(output_buffer is not None for output_buffer in self.output_buffers):
+            outputs = [output_buffer.copy() for output_buffer in self.output_buffers]
+        else:
+            outputs = self.interpreter_io_binding.copy_outputs_to_cpu()
+        #
+        return outputs, info_dict
+
+    def supports_batch(self, inputs):
+        # the tidl offload and the extra_inputs are meant for a batch size of 1
+        if self.is_batch_disabled or self.kwargs['tidl_offload'] or self.kwargs['extra_inputs'] is not None or not self._check_batch_inputs(inputs):
+            return False
+        #
+        # all the inputs and outputs of the model must have a dynamic (symbolic) batch dimension
+        model_details = self.interpreter.get_inputs() + self.interpreter.get_outputs()
+        return all(len(d_info.shape) > 0 and not isinstance(d_info.shape[0], int) for d_info in model_details)
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
@@ -125,6 +213,12 @@ class ONNXRTSession(BaseRTSession):
         #
         runtime_options = self.kwargs["runtime_options"]
         sess_options = onnxruntime.SessionOptions()
+        # in a parallel worker, the thread pool is sized to the cpus given to the worker
+        thread_budget = utils.get_thread_budget()
+        if thread_budget is not None:
+            sess_options.intra_op_num_threads = thread_budget
+            sess_options.inter_op_num_threads = 1
+        #
 
         if self.kwargs['tidl_offload']:
             ep_list = ['TIDLCompilationProvider', 'CPUExecutionProvider'] if is_import else \
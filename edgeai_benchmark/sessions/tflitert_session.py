@@ -81,6 +81,7 @@ class TFLiteRTSession(BaseRTSession):
         if self.input_normalizer is not None:
             in_data, _ = self.input_normalizer(in_data, {})
         #
+        self._resize_batch(in_data)
         for (input_detail, c_data_entry) in zip(self.interpreter.get_input_details(), in_data):
             self._set_tensor(input_detail, c_data_entry)
         #
@@ -92,6 +93,14 @@ class TFLiteRTSession(BaseRTSession):
         outputs = [self._get_tensor(output_detail) for output_detail in self.interpreter.get_output_details()]
         return outputs, info_dict
 
+    def supports_batch(self, inputs):
+        if self.is_batch_disabled or self.kwargs['tidl_offload'] or not self._check_batch_inputs(inputs):
+            return False
+        #
+        # all the inputs and outputs of the model must have a dynamic batch dimension
+        model_details = self.interpreter.get_input_details() + self.interpreter.get_output_details()
+        return all(len(d.get('shape_signature', [])) > 0 and d['shape_signature'][0] == -1 for d in model_details)
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
@@ -102,6 +111,8 @@ class TFLiteRTSession(BaseRTSession):
         # move the import inside the function, so that tflite_runtime needs to be installed
         # only if some one wants to use it
         import tflite_runtime.interpreter as tflitert_interpreter
+        # in a parallel worker, the thread pool is sized to the cpus given to the worker
+        thread_budget = utils.get_thread_budget()
         if self.kwargs['tidl_offload']:
             if is_import:
                 self.kwargs["runtime_options"]["import"] = "yes"
@@ -110,9 +121,10 @@ class TFLiteRTSession(BaseRTSession):
                 self.kwargs["runtime_options"]["import"] = "no"
                 tidl_delegate = [tflitert_interpreter.load_delegate('libtidl_tfl_delegate.so', self.kwargs["runtime_options"])]
             #
-            interpreter = tflitert_interpreter.Interpreter(model_path=self.kwargs['model_file'], experimental_delegates=tidl_delegate)
+            interpreter = tflitert_interpreter.Interpreter(model_path=self.kwargs['model_file'], experimental_delegates=tidl_delegate,
+                                                           num_threads=thread_budget)
         else:
-            interpreter = tflitert_interpreter.Interpreter(model_path=self.kwargs['model_file'])
+            interpreter = tflitert_interpreter.Interpreter(model_path=self.kwargs['model_file'], num_threads=thread_budget)
         #
         interpreter.allocate_tensors()
         return interpreter
@@ -132,6 +144,20 @@ class TFLiteRTSession(BaseRTSession):
         default_options.update(runtime_options)
         self.kwargs["runtime_options"] = default_options
 
+    def _resize_batch(self, in_data):
+        # the input tensors are re-allocated if the batch size changes - see supports_batch()
+        is_resized = False
+        for (input_detail, c_data_entry) in zip(self.interpreter.get_input_details(), in_data):
+            input_shape = tuple(input_detail['shape'])
+            if isinstance(c_data_entry, np.ndarray) and c_data_entry.shape[1:] == input_shape[1:] and c_data_entry.shape[0] != input_shape[0]:
+                self.interpreter.resize_tensor_input(input_detail['index'], c_data_entry.shape)
+                is_resized = True
+            #
+        #
+        if is_resized:
+            self.interpreter.allocate_tensors()
+        #
+
     def _set_tensor(self, model_input, tensor):
         if model_input['dtype'] == np.int8:
             # scale, zero_point = model_input['quantization']
@@ -37,6 +37,13 @@ from .environ_utils import *
 from .timer_utils import *
 from .metric_utils import *
 from .progress_step import *
+from .prefetch_utils import *
+from .tensor_cache import *
+from .output_store import *
+from .thread_utils import *
+from .memory_utils import *
+from .hash_utils import *
+from .results_db import *
 from .transforms_utils import *
 from .onnx_utils import *
 from .model_utils import *
@@ -27,6 +27,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import tempfile
 import PIL
 import numpy as np
 from . import download_utils
@@ -196,3 +197,17 @@ def list_dir(d, only_files=False, basename=False):
 def list_files(d, basename=False):
     return list_dir(d, only_files=True, basename=basename)
 
+
+def write_file_atomic(file_name, write_func):
+    # write_func(fp) writes into a temporary file in the same folder, which is then renamed to file_name -
+    # so a reader (possibly in another process) never sees a partially written file
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(file_name), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            write_func(fp)
+        #
+        os.replace(temp_file, file_name)
+    except:
+        os.remove(temp_file)
+        raise
+    #
@@ -0,0 +1,120 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import inspect
+import hashlib
+import numbers
+import collections.abc
+import numpy as np
+
+__all__ = ['hash_update', 'hash_object', 'hash_file', 'canonical_state']
+
+
+def hash_update(hasher, obj):
+    # feed a (possibly nested) python/numpy object into the given hashlib object.
+    # the type of each entry is also hashed, so that [1,2] and (1,2) or 1 and '1' are distinct.
+    # subclasses that hold the same values (for example np.memmap or a lazily read list) hash the same as their base type
+    if isinstance(obj, np.ndarray):
+        type_name = np.ndarray.__name__
+    elif isinstance(obj, collections.abc.Sequence) and not isinstance(obj, (str, bytes, list, tuple)):
+        type_name = list.__name__
+    else:
+        type_name = type(obj).__name__
+    #
+    hasher.update(type_name.encode())
+    if obj is None:
+        pass
+    elif isinstance(obj, np.ndarray):
+        hasher.update(str(obj.dtype).encode())
+        hasher.update(str(obj.shape).encode())
+        hasher.update(memoryview(np.ascontiguousarray(obj)).cast('B'))
+    elif isinstance(obj, bytes):
+        hasher.update(obj)
+    elif isinstance(obj, str):
+        hasher.update(obj.encode())
+    elif isinstance(obj, (numbers.Number, np.generic)):
+        hasher.update(repr(obj).encode())
+    elif isinstance(obj, dict):
+        for k in sorted(obj.keys(), key=str):
+            hash_update(hasher, k)
+            hash_update(hasher, obj[k])
+        #
+    elif isinstance(obj, collections.abc.Sequence):
+        hasher.update(str(len(obj)).encode())
+        for o in obj:
+            hash_update(hasher, o)
+        #
+    else:
+        # other objects are identified by their repr
+        hasher.update(repr(obj).encode())
+    #
+    return hasher
+
+
+def canonical_state(obj, max_depth=8):
+    # a description of an object made of plain python/numpy values, that does not depend on the memory
+    # address of the object - so that it can be hashed across runs (the default repr of an object has the address).
+    # objects are described by their class and public attributes (or __getstate__ if the class defines it)
+    if obj is None or isinstance(obj, (str, bytes, numbers.Number, np.generic, np.ndarray)):
+        return obj
+    elif max_depth <= 0:
+        return type(obj).__qualname__
+    elif isinstance(obj, dict):
+        return {k: canonical_state(v, max_depth-1) for k, v in obj.items()}
+    elif isinstance(obj, (list,tuple)):
+        return type(obj)(canonical_state(o, max_depth-1) for o in obj)
+    elif isinstance(obj, type) or inspect.isroutine(obj):
+        return f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}"
+    elif getattr(type(obj), '__getstate__', None) not in (None, getattr(object, '__getstate__', None)):
+        state = obj.__getstate__()
+    elif hasattr(obj, '__dict__'):
+        state = vars(obj)
+    else:
+        return repr(obj)
+    #
+    state = {k: v for k, v in state.items() if not str(k).startswith('_')} if isinstance(state, dict) else state
+    return {'__class__': f'{type(obj).__module__}.{type(obj).__qualname__}', 'state': canonical_state(state, max_depth-1)}
+
+
+def hash_object(obj, algorithm='sha256'):
+    hasher = hashlib.new(algorithm)
+    hash_update(hasher, obj)
+    return hasher.hexdigest()
+
+
+def hash_file(file_path, algorithm='sha256', chunk_size=1<<20):
+    hasher = hashlib.new(algorithm)
+    file_paths = file_path if isinstance(file_path, (list,tuple)) else [file_path]
+    for fpath in file_paths:
+        with open(fpath, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b''):
+                hasher.update(chunk)
+            #
+        #
+    #
+    return hasher.hexdigest()
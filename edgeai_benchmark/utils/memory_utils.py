@@ -0,0 +1,113 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import collections
+
+__all__ = ['get_memory_info', 'get_process_tree_rss', 'get_descendant_pids']
+
+
+def get_memory_info():
+    # the entries of /proc/meminfo (for example MemTotal, MemAvailable) in bytes. empty if it is not available
+    memory_info = {}
+    try:
+        with open('/proc/meminfo') as fp:
+            for line in fp:
+                key, value = line.split(':', 1)
+                value = value.split()
+                memory_info[key] = int(value[0]) * (1024 if len(value) > 1 and value[1] == 'kB' else 1)
+            #
+        #
+    except (OSError, ValueError, IndexError):
+        pass
+    #
+    return memory_info
+
+
+def _get_children_dict():
+    children_dict = collections.defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        #
+        try:
+            with open(f'/proc/{entry}/stat') as fp:
+                stat = fp.read()
+            #
+        except OSError:
+            continue
+        #
+        # the process name (within parenthesis) may contain spaces - the fields after it are split
+        ppid = int(stat[stat.rindex(')')+2:].split()[1])
+        children_dict[ppid].append(int(entry))
+    #
+    return children_dict
+
+
+def get_process_tree_rss(pids):
+    # resident memory in bytes of each of the given processes, including all their descendants
+    # (for example the prefetch or shard workers started by a task)
+    if not os.path.isdir('/proc'):
+        return {pid: None for pid in pids}
+    #
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    children_dict = _get_children_dict()
+    rss_dict = {}
+    for pid in pids:
+        rss = 0
+        pending = [pid]
+        while len(pending) > 0:
+            cur_pid = pending.pop()
+            try:
+                with open(f'/proc/{cur_pid}/statm') as fp:
+                    rss += int(fp.read().split()[1]) * page_size
+                #
+            except (OSError, ValueError, IndexError):
+                pass
+            #
+            pending.extend(children_dict.get(cur_pid, []))
+        #
+        rss_dict[pid] = rss
+    #
+    return rss_dict
+
+
+def get_descendant_pids(pid):
+    # pids of all the descendants of a process (children first). empty if it is not available
+    if not os.path.isdir('/proc'):
+        return []
+    #
+    children_dict = _get_children_dict()
+    descendant_pids = []
+    pending = list(children_dict.get(pid, []))
+    while len(pending) > 0:
+        cur_pid = pending.pop(0)
+        descendant_pids.append(cur_pid)
+        pending.extend(children_dict.get(cur_pid, []))
+    #
+    return descendant_pids
@@ -26,6 +26,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import statistics
 import numpy as np
 
 class AverageMeter(object):
@@ -71,3 +72,82 @@ def segmentation_accuracy(cmatrix, multiplier=100.0):
     mean_iou = np.nanmean(iou)
     metric = {'accuracy_mean_iou%':mean_iou*multiplier}
     return metric
+
+
+class SequentialEstimator:
+    """
+    Running estimate of a metric with a confidence interval, from the contribution of each frame -
+    used to stop the inference once the metric is known precisely enough.
+    kind 'mean': a value per frame (for example the top-1 accuracy). the binomial (Wilson) interval is used
+    if the values are 0 or multiplier, otherwise the normal interval of the mean.
+    kind 'cmatrix': a confusion matrix per frame. the mean iou, with a bootstrap interval over blocks of frames.
+    the blocks are merged in pairs when there are 2*max_blocks, so that the memory does not grow with the frames.
+    """
+    def __init__(self, kind, confidence=0.95, multiplier=100.0, num_resamples=100, max_blocks=128, seed=0):
+        assert kind in ('mean', 'cmatrix'), f'invalid kind {kind}'
+        self.kind = kind
+        self.confidence = confidence
+        self.multiplier = multiplier
+        self.num_resamples = num_resamples
+        self.max_blocks = max_blocks
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.values = []
+        self.blocks = []
+        self.block_size = 1
+        self.block = None
+        self.block_count = 0
+
+    def add(self, sample):
+        self.count += 1
+        if self.kind == 'mean':
+            self.values.append(float(sample))
+            return
+        #
+        self.block = sample if self.block is None else (self.block + sample)
+        self.block_count += 1
+        if self.block_count == self.block_size:
+            self.blocks.append(self.block)
+            self.block = None
+            self.block_count = 0
+            if len(self.blocks) == 2 * self.max_blocks:
+                self.blocks = [a + b for a, b in zip(self.blocks[0::2], self.blocks[1::2])]
+                self.block_size *= 2
+            #
+        #
+
+    def estimate(self):
+        # value, low and high of the interval, and its half-width
+        if self.count == 0:
+            return None
+        #
+        z = statistics.NormalDist().inv_cdf((1 + self.confidence) / 2)
+        if self.kind == 'mean':
+            values = np.array(self.values)
+            n = len(values)
+            value = float(values.mean())
+            if np.all((values == 0) | (values == self.multiplier)):
+                p = value / self.multiplier
+                center = (p + z*z/(2*n)) / (1 + z*z/n)
+                halfwidth = z * np.sqrt(p*(1-p)/n + z*z/(4*n*n)) / (1 + z*z/n)
+                low, high = (center - halfwidth) * self.multiplier, (center + halfwidth) * self.multiplier
+            else:
+                halfwidth = z * values.std(ddof=1) / np.sqrt(n) if n > 1 else np.inf
+                low, high = value - halfwidth, value + halfwidth
+            #
+        else:
+            blocks = self.blocks + ([self.block] if self.block is not None else [])
+            blocks = np.stack(blocks).astype(np.float64)
+            value = segmentation_accuracy(blocks.sum(axis=0), multiplier=self.multiplier)['accuracy_mean_iou%']
+            num_blocks = len(blocks)
+            # each resample is a weighted sum of the blocks - the weights are the counts of a draw with replacement
+            counts = self.rng.multinomial(num_blocks, np.full(num_blocks, 1.0/num_blocks), size=self.num_resamples)
+            cmatrices = np.tensordot(counts, blocks, axes=1)
+            eps = np.finfo(np.float32).eps
+            intersection = np.einsum('rii->ri', cmatrices)
+            union = cmatrices.sum(axis=1) + cmatrices.sum(axis=2) - intersection
+            mean_ious = np.nanmean(intersection / (union + eps), axis=1) * self.multiplier
+            alpha = 1 - self.confidence
+            low, high = np.percentile(mean_ious, (100*alpha/2, 100*(1-alpha/2)))
+        #
+        return {'value': float(value), 'low': float(low), 'high': float(high), 'halfwidth': float((high - low) / 2)}
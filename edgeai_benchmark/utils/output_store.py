@@ -0,0 +1,201 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import glob
+import shutil
+import pickle
+import collections
+import numpy as np
+
+from .file_utils import write_file_atomic
+
+__all__ = ['OutputStore']
+
+
+class OutputStore:
+    """
+    On disk store of the raw outputs of a session (before postprocess) with the info_dict of each frame,
+    so that the postprocess and the metric can be run again without running the session - see AccuracyPipeline.rescore()
+    The frames are written in chunks: for each output, the flattened arrays of the frames in a chunk are concatenated
+    into one array - compressed (.npz) or not (.npy, memory mapped when read). The info_dicts are pickled with it.
+    Each writer (for example a worker process of the sharded inference) writes its own chunks and index,
+    so that several writers can fill the same store.
+    """
+    def __init__(self, store_dir, mode='r', writer_id=0, chunk_frames=256, compress=True,
+                 exclude_keys=('data', 'flip_img', 'dataset_info')):
+        assert mode in ('r', 'w'), f'invalid mode {mode}'
+        self.store_dir = store_dir
+        self.mode = mode
+        self.writer_id = writer_id
+        self.chunk_frames = chunk_frames
+        self.compress = compress
+        # info_dict entries that are not stored (for example the decoded input image)
+        self.exclude_keys = exclude_keys
+        self.chunk_buffer = []
+        self.chunk_signature = None
+        self.num_chunks = 0
+        # frame_index: (chunk_name, position in the chunk)
+        self.index = dict()
+        self.loaded_chunks = collections.OrderedDict()
+        if mode == 'w':
+            os.makedirs(store_dir, exist_ok=True)
+        else:
+            for index_file in sorted(glob.glob(os.path.join(store_dir, 'index_*.pkl'))):
+                with open(index_file, 'rb') as fp:
+                    self.index.update(pickle.load(fp))
+                #
+            #
+        #
+
+    @staticmethod
+    def exists(store_dir):
+        return len(glob.glob(os.path.join(store_dir, 'index_*.pkl'))) > 0
+
+    @staticmethod
+    def remove(store_dir):
+        if os.path.isdir(store_dir):
+            shutil.rmtree(store_dir)
+        #
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def frame_indices(self):
+        return sorted(self.index.keys())
+
+    def put(self, frame_index, output, info_dict):
+        # the arrays are copied - the postprocess may modify the output in place
+        if isinstance(output, np.ndarray):
+            output_kind, arrays = 'array', [output]
+        elif isinstance(output, (list, tuple)) and all(isinstance(o, np.ndarray) and not o.dtype.hasobject for o in output):
+            output_kind, arrays = type(output).__name__, list(output)
+        else:
+            output_kind, arrays = 'object', []
+        #
+        frame_meta = dict(frame_index=frame_index, output_kind=output_kind,
+                          shapes=[a.shape for a in arrays],
+                          output=(output if output_kind == 'object' else None),
+                          info_dict={k: v for k, v in info_dict.items() if k not in self.exclude_keys})
+        arrays = [np.ascontiguousarray(a).ravel().copy() for a in arrays]
+        # the arrays of an output are concatenated - so a frame with different outputs starts a new chunk
+        signature = (output_kind, tuple(a.dtype.str for a in arrays))
+        if len(self.chunk_buffer) > 0 and signature != self.chunk_signature:
+            self.flush()
+        #
+        self.chunk_signature = signature
+        self.chunk_buffer.append((frame_meta, arrays))
+        if len(self.chunk_buffer) >= self.chunk_frames:
+            self.flush()
+        #
+
+    def flush(self):
+        if len(self.chunk_buffer) == 0:
+            return
+        #
+        chunk_name = f'chunk_w{self.writer_id}_{self.num_chunks:06d}'
+        frame_metas = [frame_meta for frame_meta, arrays in self.chunk_buffer]
+        num_outputs = len(self.chunk_buffer[0][1])
+        output_arrays = {f'output_{k}': np.concatenate([arrays[k] for frame_meta, arrays in self.chunk_buffer])
+                         for k in range(num_outputs)}
+        if self.compress:
+            write_file_atomic(os.path.join(self.store_dir, chunk_name + '.npz'),
+                              lambda fp: np.savez_compressed(fp, **output_arrays))
+        else:
+            for output_name, output_array in output_arrays.items():
+                write_file_atomic(os.path.join(self.store_dir, f'{chunk_name}_{output_name}.npy'),
+                                  lambda fp: np.save(fp, output_array, allow_pickle=False))
+            #
+        #
+        write_file_atomic(os.path.join(self.store_dir, chunk_name + '.pkl'),
+                          lambda fp: pickle.dump(dict(num_outputs=num_outputs, compress=self.compress, frames=frame_metas),
+                                                 fp, protocol=pickle.HIGHEST_PROTOCOL))
+        for position, frame_meta in enumerate(frame_metas):
+            self.index[frame_meta['frame_index']] = (chunk_name, position)
+        #
+        # the index is written after the chunk, so the frames in it are always complete
+        write_file_atomic(os.path.join(self.store_dir, f'index_w{self.writer_id}.pkl'),
+                          lambda fp: pickle.dump(self.index, fp, protocol=pickle.HIGHEST_PROTOCOL))
+        self.chunk_buffer = []
+        self.chunk_signature = None
+        self.num_chunks += 1
+
+    def close(self):
+        if self.mode == 'w':
+            self.flush()
+        #
+        self.loaded_chunks.clear()
+
+    def get(self, frame_index):
+        chunk_name, position = self.index[frame_index]
+        chunk_meta, output_arrays, offsets = self._load_chunk(chunk_name)
+        frame_meta = chunk_meta['frames'][position]
+        info_dict = dict(frame_meta['info_dict'])
+        if frame_meta['output_kind'] == 'object':
+            return frame_meta['output'], info_dict
+        #
+        output = [output_arrays[k][offsets[k][position]:offsets[k][position+1]].reshape(shape)
+                  for k, shape in enumerate(frame_meta['shapes'])]
+        if frame_meta['output_kind'] == 'array':
+            output = output[0]
+        elif frame_meta['output_kind'] == 'tuple':
+            output = tuple(output)
+        #
+        return output, info_dict
+
+    def _load_chunk(self, chunk_name, max_loaded_chunks=2):
+        if chunk_name in self.loaded_chunks:
+            return self.loaded_chunks[chunk_name]
+        #
+        with open(os.path.join(self.store_dir, chunk_name + '.pkl'), 'rb') as fp:
+            chunk_meta = pickle.load(fp)
+        #
+        output_names = [f'output_{k}' for k in range(chunk_meta['num_outputs'])]
+        if chunk_meta['compress']:
+            with np.load(os.path.join(self.store_dir, chunk_name + '.npz'), allow_pickle=False) as npz_file:
+                output_arrays = [npz_file[output_name] for output_name in output_names]
+            #
+        else:
+            # copy on write mapping - a postprocess that modifies the output does not modify the store
+            output_arrays = [np.load(os.path.join(self.store_dir, f'{chunk_name}_{output_name}.npy'), mmap_mode='c',
+                                     allow_pickle=False) for output_name in output_names]
+        #
+        # offset of each frame in the concatenated arrays
+        offsets = [np.concatenate([[0], np.cumsum([int(np.prod(frame_meta['shapes'][k])) for frame_meta in chunk_meta['frames']])])
+                   for k in range(chunk_meta['num_outputs'])]
+        self.loaded_chunks[chunk_name] = (chunk_meta, output_arrays, offsets)
+        while len(self.loaded_chunks) > max_loaded_chunks:
+            self.loaded_chunks.popitem(last=False)
+        #
+        return self.loaded_chunks[chunk_name]
@@ -29,38 +29,79 @@
 import os
 import sys
 import multiprocessing
+import multiprocessing.connection
 from multiprocessing import pool
 import collections
 import time
 import traceback
-import queue
-import copy
+import signal
+import yaml
 
 from .progress_step import *
 from .logger_utils import *
+from .thread_utils import *
+from .memory_utils import *
 
 
 class ParallelRun:
-    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60):
+    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60,
+                 cpus_per_process=None, memory_budget=None, memory_sample_interval=2.0,
+                 task_timeout=None, task_retries=0, retry_backoff=10.0, task_log_name='run.log'):
         self.desc = desc
         self.parallel_processes = parallel_processes
         self.parallel_devices = parallel_devices
+        # each of the running processes gets a disjoint set of cpus and sizes its thread pools to it - see set_thread_budget()
+        # cpus_per_process can be 'auto' (the available cpus are divided equally) or a number. None disables it.
+        self.cpu_sets = get_cpu_sets(parallel_processes, cpus_per_process) if cpus_per_process else None
+        if cpus_per_process and self.cpu_sets is None:
+            print(log_color('\nWARNING', 'parallel_run', f'not enough cpus for cpus_per_process={cpus_per_process} - cpu partitioning is not done'))
+        #
+        self.free_slots = list(range(parallel_processes))
+        self.task_slots = dict()
+        # a task is started only if the projected resident memory of the running tasks and the new one fits in memory_budget.
+        # memory_budget is in bytes, or 'auto' for 80% of the memory available now. None disables it.
+        if memory_budget == 'auto':
+            memory_budget = int(get_memory_info().get('MemAvailable', 0) * 0.8) or None
+        #
+        self.memory_budget = memory_budget
+        self.memory_sample_interval = memory_sample_interval
+        # the expected and the observed (peak) memory of the running tasks
+        self.task_memory_dict = dict()
+        self.task_peak_rss_dict = dict()
+        self.completed_peak_rss = []
+        # a task running longer than task_timeout (seconds) is killed. a task that timed out or crashed is run again
+        # up to task_retries times, after a delay of retry_backoff seconds that doubles with each retry.
+        self.task_timeout = task_timeout
+        self.task_retries = task_retries
+        self.retry_backoff = retry_backoff
+        # the last lines of this log file in the task_dirs go into the failure record
+        self.task_log_name = task_log_name
+        self.task_start_times = dict()
+        self.failure_records = []
         self.queued_tasks = collections.deque()
         self.maxinterval = maxinterval
         self.blocking = blocking
         self.verbose = verbose
         self.num_total_tasks = 0
         self.num_started_tasks = 0
-        self.result_queues_dict = dict()
+        self.result_pipes_dict = dict()
         self.process_dict = dict()
+        self.running_tasks = dict()
         self.result_list = []
+        self.task_results = dict()
         if self.verbose:
             print(log_color('\nINFO', "parallel_run", f"parallel_processes:{self.parallel_processes} parallel_devices={self.parallel_devices}"))
             sys.stdout.flush()
         #
 
-    def enqueue(self, task):
-        self.queued_tasks.append(task)
+    def enqueue(self, task, task_cost=None, task_memory=None, task_dirs=None):
+        # task_cost is an estimate of the run time (any unit, but consistent across tasks)
+        # if it is given, the costliest tasks are started first, so that the long ones do not end up in the tail
+        # task_memory is an estimate of the peak resident memory of the task in bytes - used with memory_budget
+        # task_dirs are the folders (for example the run_dir) into which the failure record of the task is written
+        task_dirs = [task_dirs] if isinstance(task_dirs, str) else list(task_dirs or [])
+        self.queued_tasks.append(dict(task=task, task_cost=task_cost, task_memory=task_memory, task_dirs=task_dirs,
+                                      task_id=len(self.queued_tasks), attempt=0, retry_time=0.0))
 
     def run(self):
         assert len(self.queued_tasks) > 0, f'at least one task must be queued, got {len(self.queued_tasks)}'
@@ -68,18 +109,37 @@ class ParallelRun:
 
     def _run_sequential(self):
         self.result_list = []
-        for task_id, task in progress_step(self.queued_tasks, desc='tasks'):
-            result = task()
+        for task_entry in progress_step(self.queued_tasks, desc='tasks'):
+            result = task_entry['task']()
             self.result_list.append(result)
         #
         return self.result_list
 
+    def _order_tasks(self):
+        # tasks are popped from the right end of queued_tasks.
+        # without any cost given, the order is not changed (same as before)
+        if all(task_entry['task_cost'] is None for task_entry in self.queued_tasks):
+            return
+        #
+        # the costliest at the right end, tasks without cost are run last
+        queued_tasks = sorted(self.queued_tasks, key=lambda t: (t['task_cost'] is not None, t['task_cost'] or 0))
+        self.queued_tasks = collections.deque(queued_tasks)
+
     def _run_parallel(self):
         self.result_list = []
+        self.task_results = dict()
+        self.failure_records = []
         self.num_total_tasks = len(self.queued_tasks)
         self.num_started_tasks = 0
-        self.result_queues_dict = dict()
+        self.result_pipes_dict = dict()
         self.process_dict = dict()
+        self.running_tasks = dict()
+        self.free_slots = list(range(self.parallel_processes))
+        self.task_slots = dict()
+        self.task_memory_dict = dict()
+        self.task_peak_rss_dict = dict()
+        self.task_start_times = dict()
+        self._order_tasks()
         pbar_tasks = progress_step(iterable=range(self.num_total_tasks), desc=self.desc, position=1)
         while len(self.result_list) < self.num_total_tasks:
             try:
@@ -94,13 +154,38 @@ class ParallelRun:
         #
         pbar_tasks.close()
         print('\n')
-        return self.result_list
+        self._print_failures()
+        # the results in the order in which the tasks were queued
+        return [self.task_results.get(task_id, {}) for task_id in range(self.num_total_tasks)]
 
     def _run_parallel_loop(self, pbar_tasks):
         mp_context = multiprocessing.get_context(method="fork") #fork, forkserver, spawn
         last_time = time.time()
 
         while len(self.result_list) < self.num_total_tasks:
+            # start the processes - as many as there are free slots (and as the memory_budget allows)
+            while len(self.process_dict) < self.parallel_processes and len(self.queued_tasks) > 0:
+                task_index = self._select_task()
+                if task_index is None:
+                    break
+                #
+                self._start_task(mp_context, task_index)
+            #
+
+            # block until a result is available or a process has exited
+            # with memory_budget, wake up periodically to sample the memory of the running tasks
+            # also wake up when a task reaches its timeout or when a task waiting for retry can be started
+            wait_objects = {proc.sentinel: task_key for task_key, proc in self.process_dict.items()}
+            wait_objects.update({r_pipe: task_key for task_key, r_pipe in self.result_pipes_dict.items()})
+            wait_timeout = self._get_wait_timeout()
+            if len(wait_objects) > 0:
+                ready_objects = multiprocessing.connection.wait(list(wait_objects.keys()), timeout=wait_timeout)
+            else:
+                time.sleep(wait_timeout)
+                ready_objects = []
+            #
+            self._sample_memory()
+
             cur_time = time.time()
             if self.verbose and (cur_time - last_time) >= self.maxinterval:
                 print(log_color('\nINFO', "parallel_run", f"num_total_tasks:{self.num_total_tasks} "
@@ -109,47 +194,264 @@ class ParallelRun:
                 last_time = cur_time
             #
 
-            # start the processes
-            if len(self.process_dict) < self.parallel_processes and len(self.queued_tasks) > 0:
-                task = self.queued_tasks.pop()
-                result_queue = mp_context.SimpleQueue()
-                proc = mp_context.Process(target=self._worker, args=(task,self.num_started_tasks,result_queue))
-                proc.start()
-                self.result_queues_dict[self.num_started_tasks] = result_queue
-                self.process_dict[self.num_started_tasks] = proc
-                self.num_started_tasks += 1
+            # collect the available results
+            ready_keys = list(dict.fromkeys(wait_objects[r_obj] for r_obj in ready_objects))
+            for task_key in ready_keys:
+                self._collect_task(task_key, pbar_tasks)
+            #
+
+            # kill the tasks that have exceeded the timeout
+            if self.task_timeout is not None:
+                timed_out_keys = [task_key for task_key, start_time in self.task_start_times.items()
+                                  if (cur_time - start_time) > self.task_timeout]
+                for task_key in timed_out_keys:
+                    self._kill_task(task_key)
+                    self._collect_task(task_key, pbar_tasks, timed_out=True)
+                #
             #
+        #
+        return self.result_list
 
-            # collect the available the results
-            result_queues_dict_shallow_copy = copy.copy(self.result_queues_dict)
-            for r_key, r_queue in result_queues_dict_shallow_copy.items():
+    def _get_wait_timeout(self):
+        cur_time = time.time()
+        wait_timeout = self.maxinterval if self.memory_budget is None else min(self.maxinterval, self.memory_sample_interval)
+        if self.task_timeout is not None and len(self.task_start_times) > 0:
+            next_timeout = min(self.task_start_times.values()) + self.task_timeout - cur_time
+            wait_timeout = min(wait_timeout, next_timeout)
+        #
+        retry_times = [task_entry['retry_time'] for task_entry in self.queued_tasks if task_entry['retry_time'] > cur_time]
+        if len(retry_times) > 0 and len(retry_times) == len(self.queued_tasks):
+            wait_timeout = min(wait_timeout, min(retry_times) - cur_time)
+        #
+        return max(wait_timeout, 0.1)
+
+    def _expected_memory(self, task_memory):
+        # tasks without an estimate are expected to need as much as the largest of the completed tasks
+        if task_memory is not None:
+            return task_memory
+        #
+        return max(self.completed_peak_rss) if len(self.completed_peak_rss) > 0 else 0
+
+    def _sample_memory(self):
+        if self.memory_budget is None or len(self.process_dict) == 0:
+            return
+        #
+        pids = {task_key: proc.pid for task_key, proc in self.process_dict.items()}
+        rss_dict = get_process_tree_rss(list(pids.values()))
+        for task_key, pid in pids.items():
+            rss = rss_dict.get(pid, None) or 0
+            self.task_peak_rss_dict[task_key] = max(self.task_peak_rss_dict.get(task_key, 0), rss)
+        #
+
+    def _select_task(self):
+        # index of the queued task to be started next. tasks are taken from the right end (the costliest first).
+        # a task waiting for its retry is skipped till its retry_time.
+        # a task that does not fit in the memory_budget is deferred - a smaller one that fits is started instead.
+        # if nothing is running, the next task is started even if it does not fit, so that it is not deferred forever.
+        cur_time = time.time()
+        task_indices = [task_index for task_index in range(len(self.queued_tasks)-1, -1, -1)
+                        if self.queued_tasks[task_index]['retry_time'] <= cur_time]
+        if len(task_indices) == 0:
+            return None
+        elif self.memory_budget is None or len(self.process_dict) == 0:
+            return task_indices[0]
+        #
+        running_memory = sum(max(self.task_peak_rss_dict.get(task_key, 0), self._expected_memory(task_memory))
+                             for task_key, task_memory in self.task_memory_dict.items())
+        for task_index in task_indices:
+            task_memory = self.queued_tasks[task_index]['task_memory']
+            if running_memory + self._expected_memory(task_memory) <= self.memory_budget:
+                return task_index
+            #
+        #
+        return None
+
+    def _start_task(self, mp_context, task_index=None):
+        task_index = (len(self.queued_tasks) - 1) if task_index is None else task_index
+        task_entry = self.queued_tasks[task_index]
+        del self.queued_tasks[task_index]
+        if task_entry['attempt'] == 0:
+            # the failure record of an earlier run is not valid anymore
+            self._remove_failure_record(task_entry)
+        #
+        task_key = self.num_started_tasks
+        # the slot is the position of the process among the running ones - its cpu_set is not used by the others
+        task_slot = self.free_slots.pop(0)
+        cpu_set = self.cpu_sets[task_slot] if self.cpu_sets is not None else None
+        r_pipe, w_pipe = mp_context.Pipe(duplex=False)
+        proc = mp_context.Process(target=self._worker, args=(task_entry['task'],task_key,w_pipe,cpu_set))
+        proc.start()
+        # close the parent's copy of the write end, so that the read end sees EOF if the process dies
+        w_pipe.close()
+        self.result_pipes_dict[task_key] = r_pipe
+        self.process_dict[task_key] = proc
+        self.running_tasks[task_key] = task_entry
+        self.task_slots[task_key] = task_slot
+        self.task_memory_dict[task_key] = task_entry['task_memory']
+        self.task_start_times[task_key] = time.time()
+        self.num_started_tasks += 1
+
+    def _kill_task(self, task_key):
+        # the processes that the task has started (prefetch, shards) are killed as well -
+        # they are collected first, as they are re-parented once the task process is gone.
+        proc = self.process_dict[task_key]
+        descendant_pids = get_descendant_pids(proc.pid)
+        proc.terminate()
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.kill()
+        #
+        for pid in descendant_pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            #
+        #
+
+    def _collect_task(self, task_key, pbar_tasks, timed_out=False):
+        r_pipe = self.result_pipes_dict[task_key]
+        proc = self.process_dict[task_key]
+        result = {}
+        exception_e = None
+        received = False
+        if not timed_out and r_pipe.poll():
+            try:
+                (result, exception_e) = r_pipe.recv()
+                received = True
+            except EOFError:
+                # the process has exited without sending the result
                 result = {}
-                exception_e = None
-                if not r_queue.empty():
-                    (result, exception_e) = r_queue.get()
-                    self.result_list.append(result)
-                    self.result_queues_dict.pop(r_key)
-                    proc = self.process_dict.pop(r_key)
-                    proc.join()
-                    pbar_tasks.update(1)
-                elif not self.process_dict[r_key].is_alive():
-                    self.result_list.append(result)
-                    self.result_queues_dict.pop(r_key)
-                    proc = self.process_dict.pop(r_key)
-                    proc.terminate() # something has happened with the process, terminate it.
-                    proc.join()
-                    pbar_tasks.update(1)
+            #
+        elif not timed_out and proc.is_alive():
+            return
+        #
+        self.result_pipes_dict.pop(task_key)
+        self.process_dict.pop(task_key)
+        task_entry = self.running_tasks.pop(task_key)
+        self.free_slots.append(self.task_slots.pop(task_key))
+        self.task_memory_dict.pop(task_key, None)
+        elapsed_time = time.time() - self.task_start_times.pop(task_key)
+        task_peak_rss = self.task_peak_rss_dict.pop(task_key, None)
+        if task_peak_rss:
+            self.completed_peak_rss.append(task_peak_rss)
+        #
+        proc.join(timeout=self.maxinterval)
+        if proc.is_alive():
+            proc.terminate() # something has happened with the process, terminate it.
+            proc.join()
+        #
+        r_pipe.close()
+
+        # a task that timed out or exited without a result (crash, signal) is retried. an exception is not.
+        if timed_out:
+            failure_type = 'timeout'
+        elif not received:
+            failure_type = 'crash'
+        elif exception_e is not None:
+            failure_type = 'exception'
+        else:
+            failure_type = None
+        #
+        if failure_type is not None:
+            retry = failure_type != 'exception' and task_entry['attempt'] < self.task_retries
+            self._record_failure(task_entry, failure_type, proc.exitcode, elapsed_time, exception_e, retry)
+            if retry:
+                task_entry['retry_time'] = time.time() + self.retry_backoff * (2 ** task_entry['attempt'])
+                task_entry['attempt'] += 1
+                self.queued_tasks.append(task_entry)
+                return
+            #
+        #
+        self.result_list.append(result)
+        self.task_results[task_entry['task_id']] = result
+        pbar_tasks.update(1)
+
+    def _record_failure(self, task_entry, failure_type, exit_code, elapsed_time, exception_e, retry):
+        # exit code is negative if the process was ended by a signal
+        exit_signal = signal.Signals(-exit_code).name if (exit_code is not None and exit_code < 0) else None
+        failure_record = dict(task_id=task_entry['task_id'], task_dirs=list(task_entry['task_dirs']), failure_type=failure_type,
+                              attempt=task_entry['attempt'], retry=retry, exit_code=exit_code, exit_signal=exit_signal,
+                              elapsed_sec=round(elapsed_time, 3), timeout_sec=self.task_timeout,
+                              exception=(str(exception_e) if exception_e is not None else None),
+                              time=time.strftime('%Y-%m-%d %H:%M:%S'))
+        failure_record['log_lines'] = {task_dir: self._read_log_tail(os.path.join(task_dir, self.task_log_name))
+                                       for task_dir in task_entry['task_dirs']}
+        self.failure_records.append(failure_record)
+        task_names = ', '.join(os.path.basename(task_dir) for task_dir in task_entry['task_dirs']) or f'task {task_entry["task_id"]}'
+        retry_str = f' - retry {task_entry["attempt"]+1}/{self.task_retries}' if retry else ''
+        print(log_color('\nWARNING', 'parallel_run', f'{task_names} failed ({failure_type}, exit_code:{exit_code}, '
+                        f'signal:{exit_signal}, elapsed_sec:{elapsed_time:.1f}){retry_str}'))
+        # the failure record goes into each of the task_dirs, with the earlier attempts of the same task
+        for task_dir in task_entry['task_dirs']:
+            task_records = []
+            for r in self.failure_records:
+                if r['task_id'] == task_entry['task_id']:
+                    task_record = {k: v for k, v in r.items() if k != 'log_lines'}
+                    task_record['last_log_lines'] = r['log_lines'].get(task_dir, [])
+                    task_records.append(task_record)
+                #
+            #
+            try:
+                os.makedirs(task_dir, exist_ok=True)
+                with open(os.path.join(task_dir, 'failure.yaml'), 'w') as fp:
+                    yaml.safe_dump({'failures': task_records}, fp, sort_keys=False)
                 #
+            except OSError as e:
+                print(log_color('\nWARNING', 'parallel_run', f'could not write the failure record into {task_dir}: {e}'))
             #
+        #
 
-            time.sleep(0.1)
+    def _read_log_tail(self, log_file, num_lines=50):
+        if not os.path.isfile(log_file):
+            return []
         #
-        return self.result_list
+        try:
+            with open(log_file, 'rb') as fp:
+                fp.seek(max(os.path.getsize(log_file) - 64*1024, 0))
+                lines = fp.read().decode('utf-8', errors='replace').splitlines()
+            #
+        except OSError:
+            return []
+        #
+        return [line.rstrip() for line in lines[-num_lines:]]
+
+    def _remove_failure_record(self, task_entry):
+        for task_dir in task_entry['task_dirs']:
+            failure_file = os.path.join(task_dir, 'failure.yaml')
+            if os.path.isfile(failure_file):
+                os.remove(failure_file)
+            #
+        #
+
+    def _print_failures(self):
+        if len(self.failure_records) == 0:
+            return
+        #
+        # the last failure of each task - the retried ones that succeeded later are counted separately
+        final_failures = dict()
+        for failure_record in self.failure_records:
+            final_failures[failure_record['task_id']] = failure_record
+        #
+        final_failures = [r for r in final_failures.values() if not r['retry']]
+        num_recovered = len(set(r['task_id'] for r in self.failure_records)) - len(final_failures)
+        print(log_color('\nWARNING', 'parallel_run', f'failed tasks: {len(final_failures)}, '
+                        f'tasks that succeeded after a retry: {num_recovered}'))
+        for failure_record in final_failures:
+            task_names = ', '.join(failure_record['task_dirs']) or f'task {failure_record["task_id"]}'
+            print(f"  {failure_record['failure_type']:10s} exit_code:{failure_record['exit_code']} "
+                  f"signal:{failure_record['exit_signal']} attempts:{failure_record['attempt']+1} "
+                  f"elapsed_sec:{failure_record['elapsed_sec']} - {task_names}")
+        #
+        sys.stdout.flush()
 
-    def _worker(self, task, task_index, result_queue):
+    def _worker(self, task, task_index, result_pipe, cpu_set=None):
         result = {}
         exception_e = None
         try:
+            if cpu_set is not None:
+                set_thread_budget(cpu_set)
+            #
             if self.parallel_devices is not None:
                 num_devices = len(self.parallel_devices)
                 parallel_device = self.parallel_devices[task_index%num_devices]
@@ -162,6 +464,5 @@ class ParallelRun:
             traceback.print_exc()
             exception_e = e
         #
-        result_queue.put((result,exception_e))
-
-
+        result_pipe.send((result,exception_e))
+        result_pipe.close()
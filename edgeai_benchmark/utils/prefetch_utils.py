@@ -0,0 +1,109 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import itertools
+import multiprocessing
+import concurrent.futures
+
+__all__ = ['PrefetchIterator']
+
+
+# the function to be run in the prefetch worker processes.
+# it is set in the initializer - so that it is not pickled for every task.
+_prefetch_process_func = None
+
+
+def _prefetch_process_initializer(func):
+    global _prefetch_process_func
+    _prefetch_process_func = func
+
+
+def _prefetch_process_worker(index):
+    return _prefetch_process_func(index)
+
+
+class PrefetchIterator:
+    """
+    Iterates over func(index) for each index in indices.
+    With num_workers > 0, upto queue_size items are computed ahead of the consumer
+    using a pool of threads or processes. The results are always returned in the order of indices.
+    """
+    def __init__(self, func, indices, num_workers=0, mode='thread', queue_size=None):
+        assert mode in ('thread', 'process'), f'prefetch mode must be one of thread or process. got {mode}'
+        self.func = func
+        self.indices = indices
+        self.num_workers = num_workers or 0
+        self.mode = mode
+        self.queue_size = queue_size or (2 * self.num_workers)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        if self.num_workers <= 0:
+            for index in self.indices:
+                yield self.func(index)
+            #
+            return
+        #
+        executor, worker_func = self._create_executor()
+        indices_iter = iter(self.indices)
+        pending = collections.deque()
+        try:
+            for index in itertools.islice(indices_iter, self.queue_size):
+                pending.append(executor.submit(worker_func, index))
+            #
+            while len(pending) > 0:
+                result = pending.popleft().result()
+                # keep the queue full - submit the next one before handing out the result
+                for index in itertools.islice(indices_iter, 1):
+                    pending.append(executor.submit(worker_func, index))
+                #
+                yield result
+            #
+        finally:
+            for future in pending:
+                future.cancel()
+            #
+            executor.shutdown(wait=True)
+        #
+
+    def _create_executor(self):
+        if self.mode == 'process':
+            # fork is used so that the func and the objects that it refers to (dataset, transforms)
+            # are inherited by the worker processes instead of being pickled.
+            mp_context = multiprocessing.get_context(method='fork')
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp_context,
+                initializer=_prefetch_process_initializer, initargs=(self.func,))
+            worker_func = _prefetch_process_worker
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+            worker_func = self.func
+        #
+        return executor, worker_func
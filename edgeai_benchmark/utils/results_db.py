@@ -0,0 +1,158 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import time
+import sqlite3
+import contextlib
+import yaml
+
+from .logger_utils import *
+
+__all__ = ['ResultsDatabase', 'get_results_db_file']
+
+
+# an indexed store (sqlite) of the param/result of the pipelines, so that a report need not
+# parse the result.yaml of every run_dir. the run_dirs are expected to be in the layout
+# <benchmark_dir>/<target_device>/<work_dir>/<run_dir> and the entries are keyed by
+# target_device, work_dir and artifact_id (model_id + session_name).
+class ResultsDatabase():
+    def __init__(self, db_file, timeout=60.0):
+        self.db_file = db_file
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS results (
+                target_device TEXT NOT NULL, work_dir TEXT NOT NULL, artifact_id TEXT NOT NULL,
+                run_dir TEXT NOT NULL, result_mtime REAL, update_time REAL, param_result TEXT,
+                PRIMARY KEY (target_device, work_dir, artifact_id))''')
+        #
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_file, timeout=self.timeout)
+        try:
+            # multiple pipelines running in parallel may write at the same time
+            connection.execute('PRAGMA journal_mode=WAL')
+            # commits on success and rolls back on exception
+            with connection:
+                yield connection
+            #
+        finally:
+            connection.close()
+        #
+
+    @staticmethod
+    def get_keys(run_dir, param_result):
+        work_dir = os.path.dirname(os.path.abspath(run_dir))
+        target_device = os.path.basename(os.path.dirname(work_dir))
+        session = param_result['session']
+        artifact_id = f"{session['model_id']}_{session['session_name']}"
+        return target_device, os.path.basename(work_dir), artifact_id
+
+    def upsert(self, run_dir, param_result, result_mtime=None):
+        self.upsert_many([(run_dir, param_result, result_mtime)])
+
+    def upsert_many(self, entries):
+        rows = []
+        for run_dir, param_result, result_mtime in entries:
+            target_device, work_dir, artifact_id = self.get_keys(run_dir, param_result)
+            rows.append((target_device, work_dir, artifact_id, os.path.abspath(run_dir), result_mtime, time.time(),
+                         json.dumps(param_result, default=str)))
+        #
+        with self._connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?,?)', rows)
+        #
+
+    def sync_work_dir(self, work_dir):
+        # bring the entries of a work_dir up to date with the result.yaml files in it.
+        # only the result.yaml files that are not yet in the store or that have changed are parsed.
+        # returns True if anything changed.
+        work_dir = os.path.abspath(work_dir)
+        target_device = os.path.basename(os.path.dirname(work_dir))
+        work_dir_name = os.path.basename(work_dir)
+        with self._connect() as connection:
+            cursor = connection.execute('SELECT run_dir, result_mtime FROM results WHERE target_device=? AND work_dir=?',
+                                        (target_device, work_dir_name))
+            stored_mtimes = {run_dir: result_mtime for run_dir, result_mtime in cursor}
+        #
+        entries = []
+        existing_run_dirs = set()
+        for run_dir_name in os.listdir(work_dir):
+            run_dir = os.path.join(work_dir, run_dir_name)
+            result_yaml = os.path.join(run_dir, 'result.yaml')
+            try:
+                result_mtime = os.stat(result_yaml).st_mtime
+            except OSError:
+                continue
+            #
+            existing_run_dirs.add(run_dir)
+            if stored_mtimes.get(run_dir, None) == result_mtime:
+                continue
+            #
+            try:
+                with open(result_yaml) as fp:
+                    param_result = yaml.safe_load(fp)
+                #
+                self.get_keys(run_dir, param_result)
+            except (OSError, yaml.YAMLError, KeyError, TypeError) as e:
+                print(log_color('\nWARNING', 'results_db', f'skipping {run_dir} - could not read its result.yaml: {e}'))
+                continue
+            #
+            entries.append((run_dir, param_result, result_mtime))
+        #
+        removed_run_dirs = [(r,) for r in stored_mtimes.keys() if r not in existing_run_dirs]
+        if len(entries) > 0:
+            self.upsert_many(entries)
+        #
+        if len(removed_run_dirs) > 0:
+            with self._connect() as connection:
+                connection.executemany('DELETE FROM results WHERE run_dir=?', removed_run_dirs)
+            #
+        #
+        return len(entries) > 0 or len(removed_run_dirs) > 0
+
+    def query(self, target_device, work_dir):
+        # returns the param_result of the artifacts in a work_dir, sorted by artifact_id
+        with self._connect() as connection:
+            cursor = connection.execute('SELECT artifact_id, param_result FROM results WHERE target_device=? AND work_dir=?',
+                                        (target_device, work_dir))
+            results = {artifact_id: json.loads(param_result) for artifact_id, param_result in cursor}
+        #
+        return {k:results[k] for k in sorted(results.keys())}
+
+
+def get_results_db_file(settings):
+    if settings.results_db_file:
+        return settings.results_db_file
+    #
+    # modelartifacts_path is <benchmark_dir>/<target_device> - the same benchmark_dir that run_report uses
+    benchmark_dir = settings.modelartifacts_path if settings.target_device is None \
+        else os.path.dirname(settings.modelartifacts_path)
+    return os.path.join(benchmark_dir, 'results.db')
@@ -0,0 +1,109 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import pickle
+import collections.abc
+import numpy as np
+
+from .file_utils import write_file_atomic
+
+__all__ = ['TensorCache', 'CachedTensorList']
+
+
+class TensorCache:
+    """
+    On disk cache of the (preprocessed) input tensors of a dataset, one entry per frame index.
+    The tensor is stored as .npy and is memory mapped when read, the info_dict is pickled alongside it.
+    The entries are written atomically (write to a temporary file and rename),
+    so that the pipelines running in parallel can share the cache.
+    """
+    def __init__(self, cache_path, cache_key, exclude_keys=('data',)):
+        self.cache_dir = os.path.join(cache_path, cache_key)
+        # info_dict entries that are not stored (for example the decoded input image)
+        self.exclude_keys = exclude_keys
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def contains(self, index):
+        tensor_file, info_file = self._get_files(index)
+        return os.path.exists(tensor_file)
+
+    def get(self, index):
+        if not self.contains(index):
+            return None
+        #
+        tensor_file, info_file = self._get_files(index)
+        try:
+            with open(info_file, 'rb') as fp:
+                info_dict = pickle.load(fp)
+            #
+            # copy on write mapping - a consumer that modifies the tensor does not modify the cache
+            tensor = np.load(tensor_file, mmap_mode='c', allow_pickle=False)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        #
+        return tensor, info_dict
+
+    def put(self, index, tensor, info_dict):
+        if not isinstance(tensor, np.ndarray) or tensor.dtype.hasobject:
+            return False
+        #
+        info_dict = {k: v for k, v in info_dict.items() if k not in self.exclude_keys}
+        tensor_file, info_file = self._get_files(index)
+        try:
+            # the info_dict is written first - get() looks for the tensor_file
+            write_file_atomic(info_file, lambda fp: pickle.dump(info_dict, fp, protocol=pickle.HIGHEST_PROTOCOL))
+            write_file_atomic(tensor_file, lambda fp: np.save(fp, tensor, allow_pickle=False))
+        except (OSError, TypeError, AttributeError, pickle.PicklingError):
+            return False
+        #
+        return True
+
+    def _get_files(self, index):
+        return os.path.join(self.cache_dir, f'{index}.npy'), os.path.join(self.cache_dir, f'{index}.pkl')
+
+
+class CachedTensorList(collections.abc.Sequence):
+    """
+    A read only list of the tensors of the given indices in a TensorCache.
+    The tensors are read (memory mapped) when they are accessed, so that they need not be held in memory together.
+    """
+    def __init__(self, tensor_cache, indices):
+        self.tensor_cache = tensor_cache
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CachedTensorList(self.tensor_cache, self.indices[index])
+        #
+        cached_frame = self.tensor_cache.get(self.indices[index])
+        assert cached_frame is not None, f'tensor {self.indices[index]} is missing in the cache {self.tensor_cache.cache_dir}'
+        return cached_frame[0]
@@ -0,0 +1,90 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+
+__all__ = ['get_available_cpus', 'get_cpu_sets', 'set_thread_budget', 'get_thread_budget']
+
+
+# the number of threads that the thread pools in this process may use - set by set_thread_budget()
+_thread_budget = None
+
+# environment variables read by the thread pools of openmp, the blas libraries and tvm when they start up
+THREAD_BUDGET_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                          'VECLIB_MAXIMUM_THREADS', 'TVM_NUM_THREADS')
+
+
+def get_available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    else:
+        return list(range(os.cpu_count() or 1))
+    #
+
+
+def get_cpu_sets(num_sets, cpus_per_set='auto', cpus=None):
+    # disjoint sets of cpus, one for each of num_sets workers.
+    # cpus_per_set='auto' divides the available cpus equally, otherwise each set gets cpus_per_set cpus (if there are enough)
+    cpus = get_available_cpus() if cpus is None else list(cpus)
+    if cpus_per_set == 'auto':
+        cpus_per_set = len(cpus) // num_sets
+    #
+    cpus_per_set = min(int(cpus_per_set), len(cpus) // num_sets)
+    if cpus_per_set <= 0:
+        return None
+    #
+    return [set(cpus[set_index*cpus_per_set:(set_index+1)*cpus_per_set]) for set_index in range(num_sets)]
+
+
+def set_thread_budget(cpu_set):
+    # restrict this process to the given cpus and size the thread pools to match, so that the parallel workers
+    # do not oversubscribe the machine. the thread pools that are created later (onnxruntime, tflite) use get_thread_budget()
+    global _thread_budget
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_set)
+    #
+    _thread_budget = len(cpu_set)
+    for env_var in THREAD_BUDGET_ENV_VARS:
+        os.environ[env_var] = str(_thread_budget)
+    #
+    # these libraries may have been loaded (and their thread pools created) already
+    if 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(_thread_budget)
+    #
+    try:
+        import threadpoolctl
+        threadpoolctl.threadpool_limits(limits=_thread_budget)
+    except ImportError:
+        pass
+    #
+    return _thread_budget
+
+
+def get_thread_budget():
+    return _thread_budget
@@ -28,6 +28,7 @@
 
 import time
 import sys
+import numpy as np
 from colorama import Fore
 
 
@@ -52,6 +53,28 @@ def process_timer(func, *args, repeats=1, **kwargs):
     return results, elapsed_process_time
 
 
+# distribution of per frame latency values.
+# the first warmup_frames values and the invalid (nan) values are not included.
+def latency_stats(values, warmup_frames=0, histogram_bins=10):
+    values = np.asarray(values, dtype=np.float64)[warmup_frames:]
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return {}
+    #
+    p50, p90, p95, p99 = np.percentile(values, (50, 90, 95, 99))
+    counts, bin_edges = np.histogram(values, bins=histogram_bins)
+    stats_dict = {
+        'p50': float(p50),
+        'p90': float(p90),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(values.max()),
+        'std': float(values.std()),
+        'histogram': {'bin_edges': bin_edges.tolist(), 'counts': counts.tolist()}
+    }
+    return stats_dict
+
+
 def delta_time(seconds):
     days, seconds = divmod(seconds,(60*60*24))
     hours, seconds = divmod(seconds,(60*60))
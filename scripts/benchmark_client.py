@@ -0,0 +1,103 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import sys
+import json
+import socket
+import tempfile
+import argparse
+
+# only the standard library is used here, so that the client starts quickly.
+# the arguments other than the ones below are those of benchmark_modelzoo.py - they are parsed by the daemon.
+# example:
+#   python3 ./scripts/benchmark_daemon.py &
+#   python3 ./scripts/benchmark_client.py settings_import_on_pc.yaml --model_selection cl-6360
+
+
+def get_daemon_socket_path():
+    # same as interfaces.get_daemon_socket_path()
+    return os.path.join(tempfile.gettempdir(), f'edgeai_benchmark_daemon_{os.getuid()}.sock')
+
+
+def send_request(daemon_socket, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+        client_socket.connect(daemon_socket)
+        client_socket.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with client_socket.makefile('r', encoding='utf-8') as fp:
+            for line in fp:
+                message = json.loads(line)
+                if message['type'] == 'log':
+                    stream = sys.stderr if message['stream'] == 'stderr' else sys.stdout
+                    stream.write(message['text'])
+                    stream.flush()
+                elif message['type'] == 'done':
+                    return message
+                #
+            #
+        #
+    #
+    return dict(status=1, error='the daemon closed the connection')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--daemon_socket', type=str, default=get_daemon_socket_path())
+    parser.add_argument('--daemon_command', type=str, default='run', choices=('run', 'ping', 'shutdown'))
+    cmds, argv = parser.parse_known_args()
+
+    # the cwd of the run must be the root of the respository
+    cwd = os.getcwd()
+    if os.path.split(cwd)[-1] == 'scripts':
+        cwd = os.path.dirname(cwd)
+    #
+
+    request = dict(command=cmds.daemon_command, argv=argv, cwd=cwd)
+    try:
+        response = send_request(cmds.daemon_socket, request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'could not connect to the daemon at: {cmds.daemon_socket} - start it with: python3 ./scripts/benchmark_daemon.py')
+        sys.exit(2)
+    except KeyboardInterrupt:
+        # the daemon completes the request anyway
+        sys.exit(130)
+    #
+
+    if 'error' in response:
+        print(f'error: {response["error"]}')
+    #
+    for result_summary in response.get('results', []):
+        print(f'result: {result_summary["run_dir"]} {json.dumps(result_summary["result"])}')
+    #
+    if cmds.daemon_command == 'run':
+        print(f'elapsed_sec: {response.get("elapsed_sec", None)}')
+    elif cmds.daemon_command == 'ping':
+        print(f'daemon: {json.dumps(response)}')
+    #
+    sys.exit(response.get('status', 1))
@@ -32,13 +32,7 @@ import argparse
 from edgeai_benchmark import *
 
 
-if __name__ == '__main__':
-    print(f'argv: {sys.argv}')
-    # the cwd must be the root of the respository
-    if os.path.split(os.getcwd())[-1] == 'scripts':
-        os.chdir('../')
-    #
-
+def get_arg_parser():
     parser = argparse.ArgumentParser(argument_default=argparse.SUPPRESS)
     parser.add_argument('settings_file', type=str, default=None)
     parser.add_argument('--target_device', type=str)
@@ -54,11 +48,17 @@ if __name__ == '__main__':
     parser.add_argument('--calibration_iterations', type=int)
     parser.add_argument('--run_import', type=utils.str_to_bool)
     parser.add_argument('--run_inference', type=utils.str_to_bool)
+    parser.add_argument('--run_rescore', type=utils.str_to_bool)
     parser.add_argument('--modelartifacts_path', type=str)
     parser.add_argument('--dataset_loading', type=str, nargs='*')
     parser.add_argument('--parallel_devices', type=utils.int_or_none)
     parser.add_argument('--parallel_processes', type=int)
-    cmds = parser.parse_args()
+    return parser
+
+
+def main(argv=None):
+    # argv is given by scripts/benchmark_daemon.py - it is taken from sys.argv otherwise
+    cmds = get_arg_parser().parse_args(argv)
 
     kwargs = vars(cmds)
     if 'session_type_dict' in kwargs:
@@ -72,4 +72,14 @@ if __name__ == '__main__':
     print(f'work_dir: {work_dir}')
 
     # run the accuracy pipeline
-    interfaces.run_accuracy(settings, work_dir)
+    return interfaces.run_accuracy(settings, work_dir)
+
+
+if __name__ == '__main__':
+    print(f'argv: {sys.argv}')
+    # the cwd must be the root of the respository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+
+    main()